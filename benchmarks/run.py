@@ -0,0 +1,347 @@
+"""
+Benchmark the upload pipeline and the commands on synthetic carrier workbooks.
+
+    python -m benchmarks.run --rows 10000 100000 1000000 --output benchmarks/results/latest.json \
+        --baseline benchmarks/results/baseline.json
+
+Run from the repository root, the normalizer reads its configs from config/.
+Every stage of the upload is timed per carrier workbook: reading, each Normalizer step and
+the store write; then every command is timed on the store holding the three workbooks.
+The results are written as JSON, and compared with a baseline run using the tolerances of
+benchmarks/thresholds.yaml. The exit status is 1 when a stage regressed.
+"""
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import yaml
+
+# `python benchmarks/run.py` puts benchmarks/ on the path instead of the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import CARRIERS, CARRIER_CONFIGS, ensure_workbooks
+
+DEFAULT_ROWS = [10_000]
+DEFAULT_REPEAT = 3
+DEFAULT_DATA_DIR = 'benchmarks/data'
+DEFAULT_THRESHOLDS_PATH = 'benchmarks/thresholds.yaml'
+# the Normalizer steps run by normalize_dataframe, timed separately
+NORMALIZER_STEPS = ('convert_to_datetime', 'apply_config', 'match_earner_type', 'align_data_types')
+# (stage name, command, args) of the timed commands
+COMMANDS = [
+    ('find_top_k_carrier', 'find_top_k_carrier', {'k': 3}),
+    ('find_top_k_plan', 'find_top_k_plan', {'k': 10}),
+    ('find_top_k_earner', 'find_top_k_earner', {'k': 10, 'period': '2024-06'}),
+    ('find_top_k_earner.range', 'find_top_k_earner', {'k': 10, 'from': '2024-01', 'to': '2024-12'}),
+    ('list_carriers', 'list_carriers', {}),
+    ('sql_query', 'sql_query', {'query': 'SELECT Carrier_Name, SUM(Commission_Amount) AS total '
+                                         'FROM df GROUP BY Carrier_Name'}),
+]
+
+
+class StageTimer:
+    """
+    Accumulate the wall time spent in named stages.
+    """
+    def __init__(self):
+        self.seconds = defaultdict(float)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    def iterate(self, name, iterable):
+        """
+        Iterate, counting the time spent producing the items as the stage.
+        :param name:
+        :param iterable:
+        :return: generator of the items
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    @contextlib.contextmanager
+    def patched(self, cls, method_name, stage_name, generator=False):
+        """
+        Time every call of a method of a class while the context is active.
+        :param cls:
+        :param method_name:
+        :param stage_name:
+        :param generator: whether the method returns an iterator, whose items are timed too
+        :return:
+        """
+        original = getattr(cls, method_name)
+
+        def timed(*args, **kwargs):
+            if generator:
+                return self.iterate(stage_name, original(*args, **kwargs))
+            with self.stage(stage_name):
+                return original(*args, **kwargs)
+
+        setattr(cls, method_name, timed)
+        try:
+            yield
+        finally:
+            setattr(cls, method_name, original)
+
+
+def time_upload(store, workbook, config_path, chunk_size=None):
+    """
+    Upload one workbook, timing each stage.
+    :param store:
+    :param workbook:
+    :param config_path:
+    :param chunk_size:
+    :return: dict of stage name to seconds
+    """
+    from src.excel_reader import ExcelReader
+    from src.normalizer import Normalizer
+    from src.pipeline import normalize_file_chunks
+
+    timer = StageTimer()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(timer.patched(ExcelReader, 'iter_chunks', 'read', generator=True))
+        for step in NORMALIZER_STEPS:
+            stack.enter_context(timer.patched(Normalizer, step, f'normalize.{step}'))
+        # the pipeline prints every column mapping of every chunk
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        with timer.stage('upload'):
+            chunks = normalize_file_chunks(workbook, config_path, chunk_size, display=False)
+            store.upsert_chunks(timer.iterate('read_and_normalize', chunks))
+
+    read_and_normalize = timer.seconds['read_and_normalize']
+    seconds = {'read': timer.seconds['read']}
+    seconds.update({f'normalize.{step}': timer.seconds[f'normalize.{step}'] for step in NORMALIZER_STEPS})
+    seconds['normalize'] = read_and_normalize - timer.seconds['read']
+    seconds['store_write'] = timer.seconds['upload'] - read_and_normalize
+    seconds['upload'] = timer.seconds['upload']
+    return seconds
+
+
+def time_commands(store):
+    """
+    Run each benchmarked command once on the store, as the CLI does without the result cache.
+    :param store:
+    :return: dict of stage name to seconds
+    """
+    from src.command import prepare_command
+
+    seconds = {}
+    for stage, name, args in COMMANDS:
+        command, parameters = prepare_command(name, args)
+        started = time.perf_counter()
+        command.run(store, **parameters)
+        seconds[f'command.{stage}'] = time.perf_counter() - started
+    return seconds
+
+
+def open_benchmark_store(backend, directory):
+    """
+    Open an empty store in a scratch directory.
+    :param backend: 'sqlite' or 'parquet'
+    :param directory:
+    :return:
+    """
+    if backend == 'sqlite':
+        from src.store import SQLiteStore
+        return SQLiteStore(os.path.join(directory, 'normalized.db'))
+    if backend == 'parquet':
+        from src.parquet_store import ParquetStore
+        return ParquetStore(os.path.join(directory, 'parquet'))
+    raise ValueError(f"Unknown store backend '{backend}'.")
+
+
+def run_size(n_rows, carriers, backend, data_dir, chunk_size=None, repeat=DEFAULT_REPEAT):
+    """
+    Benchmark one workbook size, keeping the fastest time of each stage over the repeats.
+    :param n_rows: rows per carrier workbook
+    :param carriers:
+    :param backend:
+    :param data_dir: directory of the generated workbooks, reused between runs
+    :param chunk_size:
+    :param repeat:
+    :return: list of result records
+    """
+    workbooks = ensure_workbooks(data_dir, carriers, n_rows)
+    best = {}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            store = open_benchmark_store(backend, directory)
+            try:
+                timings = {}
+                for carrier in carriers:
+                    for stage, seconds in time_upload(store, workbooks[carrier], CARRIER_CONFIGS[carrier],
+                                                      chunk_size).items():
+                        timings[(carrier, stage)] = seconds
+                stored_rows = store.count()
+                for stage, seconds in time_commands(store).items():
+                    timings[('all', stage)] = seconds
+            finally:
+                store.close()
+        for key, seconds in timings.items():
+            best[key] = min(seconds, best.get(key, seconds))
+
+    return [{'rows': n_rows,
+             'carrier': carrier,
+             'stage': stage,
+             'seconds': round(seconds, 6),
+             'rows_per_second': round((stored_rows if carrier == 'all' else n_rows) / seconds) if seconds else None}
+            for (carrier, stage), seconds in best.items()]
+
+
+def stage_tolerance(stage, thresholds):
+    """
+    Get the tolerance of a stage, the first matching pattern of the thresholds file wins.
+    :param stage:
+    :param thresholds:
+    :return: allowed slowdown, e.g. 0.25 for 25% slower than the baseline
+    """
+    for pattern, tolerance in (thresholds.get('stages') or {}).items():
+        if fnmatch.fnmatchcase(stage, pattern):
+            return tolerance
+    return thresholds.get('tolerance', 0.25)
+
+
+def find_regressions(results, baseline, thresholds):
+    """
+    Compare results with a baseline run of the same sizes.
+    Stages missing from the baseline, or faster than min_seconds there, are not compared.
+    :param results: result records
+    :param baseline: results JSON of an earlier run
+    :param thresholds: dict loaded from the thresholds file
+    :return: list of regression records
+    """
+    baseline_seconds = {(record['rows'], record['carrier'], record['stage']): record['seconds']
+                        for record in baseline.get('results', [])}
+    min_seconds = thresholds.get('min_seconds', 0.0)
+    regressions = []
+    for record in results:
+        expected = baseline_seconds.get((record['rows'], record['carrier'], record['stage']))
+        if expected is None or expected < min_seconds:
+            continue
+        tolerance = stage_tolerance(record['stage'], thresholds)
+        if record['seconds'] > expected * (1 + tolerance):
+            regressions.append({'rows': record['rows'], 'carrier': record['carrier'], 'stage': record['stage'],
+                                'seconds': record['seconds'], 'baseline_seconds': expected,
+                                'ratio': round(record['seconds'] / expected, 3), 'tolerance': tolerance})
+    return regressions
+
+
+def environment():
+    """
+    Describe the machine and library versions, results of different machines are not comparable.
+    :return:
+    """
+    import numpy as np
+    import pandas as pd
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpu_count': os.cpu_count(),
+            'commit': commit}
+
+
+def run_suite(rows=None, carriers=CARRIERS, backend='sqlite', data_dir=DEFAULT_DATA_DIR, chunk_size=None,
+              repeat=DEFAULT_REPEAT, baseline_path=None, thresholds_path=DEFAULT_THRESHOLDS_PATH):
+    """
+    Run the benchmarks of every size.
+    :param rows: list of rows per carrier workbook
+    :param carriers:
+    :param backend:
+    :param data_dir:
+    :param chunk_size:
+    :param repeat:
+    :param baseline_path: results JSON to compare with, None to skip the comparison
+    :param thresholds_path:
+    :return: results dict, as written to the output file
+    """
+    rows = rows or DEFAULT_ROWS
+    results = []
+    for n_rows in rows:
+        print(f"Benchmarking {n_rows} rows per carrier...", flush=True)
+        results.extend(run_size(n_rows, carriers, backend, data_dir, chunk_size, repeat))
+
+    report = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'parameters': {'rows': rows, 'carriers': list(carriers), 'store': backend, 'chunk_size': chunk_size,
+                       'repeat': repeat},
+        'results': results,
+    }
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        with open(thresholds_path) as file:
+            thresholds = yaml.safe_load(file) or {}
+        report['baseline'] = baseline_path
+        report['regressions'] = find_regressions(results, baseline, thresholds)
+    return report
+
+
+def print_report(report):
+    print(f"{'rows':>10}  {'carrier':<12} {'stage':<36} {'seconds':>10} {'rows/s':>12}")
+    for record in report['results']:
+        print(f"{record['rows']:>10}  {record['carrier']:<12} {record['stage']:<36} "
+              f"{record['seconds']:>10.4f} {record['rows_per_second'] or '':>12}")
+    for regression in report.get('regressions', []):
+        print(f"REGRESSION {regression['stage']} ({regression['carrier']}, {regression['rows']} rows): "
+              f"{regression['seconds']:.4f}s vs {regression['baseline_seconds']:.4f}s baseline, "
+              f"x{regression['ratio']} > x{1 + regression['tolerance']:.2f}")
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the upload pipeline and the commands.')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help='Rows per synthetic carrier workbook, e.g. 10000 100000 1000000 10000000')
+    parser.add_argument('--carriers', nargs='+', choices=CARRIERS, default=list(CARRIERS),
+                        help='Carrier layouts to generate')
+    parser.add_argument('--store', choices=('sqlite', 'parquet'), default='sqlite', help='Store backend')
+    parser.add_argument('--chunk_size', type=int, help='Rows read and normalized at a time')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='Runs per size, the fastest time of each stage is kept')
+    parser.add_argument('--data_dir', default=DEFAULT_DATA_DIR, help='Directory of the generated workbooks')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='Results JSON of an earlier run to compare with')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS_PATH, help='Regression tolerances')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    report = run_suite(args.rows, args.carriers, args.store, args.data_dir, args.chunk_size, args.repeat,
+                       args.baseline, args.thresholds)
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {args.output}")
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
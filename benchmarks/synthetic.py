@@ -0,0 +1,297 @@
+"""
+Synthetic commission workbooks with the column layouts of the carrier files in data/,
+mapped by the configs in yaml/.
+The sheet XML is streamed straight into the xlsx zip, which is orders of magnitude faster
+than building the workbook through openpyxl, so workbooks of millions of rows can be written.
+Dates are stored as Excel serial numbers with a date format, as in the real files.
+"""
+import datetime
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+CARRIERS = ('healthfirst', 'emblem', 'centene')
+CARRIER_CONFIGS = {
+    'healthfirst': 'yaml/healthfirst_config.yaml',
+    'emblem': 'yaml/emblem_config.yaml',
+    'centene': 'yaml/cenetene_config.yaml',
+}
+BLOCK_ROWS = 10_000
+
+_FIRST_NAMES = ['John', 'Blake', 'Kristen', 'Tyler', 'Maria', 'Ethan', 'Courtney', 'Dylan', 'Priya', 'Wei',
+                'Ana', 'Kevin', 'Chelsea', 'Omar', 'Grace', 'Luis']
+_LAST_NAMES = ['Sanchez', 'Sandoval', 'Roth', 'Rogers', 'Parker', 'Robbins', 'Rivera', 'Ward', 'Hudson',
+               'Chen', 'Baker', 'Butler', 'Parks', 'Hall', 'Nguyen', 'Kim', 'Leach']
+_AGENCIES = ['Delta Care Corporation', 'Senior Services Corp', 'Carter-Thomas Agency', 'Metro Benefits LLC',
+             'Harbor Insurance Group']
+_EXCEL_EPOCH = datetime.date(1899, 12, 30)
+
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = '</sheetData></worksheet>'
+_WORKBOOK_PARTS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>',
+    'xl/workbook.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/></Relationships>',
+    # cell style 1 is the built-in m/d/yyyy date format
+    'xl/styles.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font/></fonts><fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders><cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0"/><xf numFmtId="14" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>',
+}
+
+
+def _text_cells(values):
+    return np.array([f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>' for value in values],
+                    dtype=object)
+
+
+def _choice(rng, values, n):
+    """
+    Pick n cells among a few distinct values, each value is rendered once.
+    """
+    return _text_cells(values)[rng.integers(0, len(values), n)]
+
+
+def _labels(prefix, codes):
+    distinct, inverse = np.unique(codes, return_inverse=True)
+    return _text_cells([f'{prefix} {code}' for code in distinct])[inverse]
+
+
+def _names(rng, n):
+    first = rng.integers(0, len(_FIRST_NAMES), n)
+    last = rng.integers(0, len(_LAST_NAMES), n)
+    names = [f'{first_name} {last_name}' for first_name in _FIRST_NAMES for last_name in _LAST_NAMES]
+    return _text_cells(names)[first * len(_LAST_NAMES) + last]
+
+
+def _ints(values):
+    return np.char.mod('<c><v>%d</v></c>', values).astype(object)
+
+
+def _amounts(values):
+    return np.char.mod('<c><v>%.2f</v></c>', np.round(values, 2)).astype(object)
+
+
+def _dates(dates):
+    serials = (dates - np.datetime64(_EXCEL_EPOCH)).astype('timedelta64[D]').astype(np.int64)
+    return np.char.mod('<c s="1"><v>%d</v></c>', serials).astype(object)
+
+
+def _empty(n):
+    return np.full(n, '<c/>', dtype=object)
+
+
+def _months(rows):
+    """
+    First day of the commission month of each row, one of the twelve months of 2024.
+    Consecutive rows of a member fall in consecutive months, so (member, month) is unique.
+    """
+    return np.datetime64('2024-01', 'M') + (rows % 12)
+
+
+def _common(rng, rows, n_rows):
+    n = len(rows)
+    n_earners = max(10, min(5_000, n_rows // 30))
+    earners = rng.zipf(1.3, n) % n_earners
+    return {
+        'member': 10_000_000 + rows // 12,
+        'month': _months(rows).astype('datetime64[D]'),
+        'earner': earners,
+        'agency': earners % len(_AGENCIES) == 0,
+        'plan': rng.integers(0, 40, n),
+        'effective': np.datetime64('2022-01-01') + rng.integers(0, 900, n).astype('timedelta64[D]'),
+        'amount': np.where(rng.random(n) < 0.05, -1, 1) * rng.gamma(2.0, 40.0, n),
+    }
+
+
+def _earner_names(values, earners):
+    agency_names = _text_cells(_AGENCIES)[earners % len(_AGENCIES)]
+    return np.where(values['agency'], agency_names, _labels('Earner', earners))
+
+
+def _healthfirst_block(rng, rows, n_rows):
+    values = _common(rng, rows, n_rows)
+    n = len(rows)
+    periods = np.datetime_as_string(_months(rows), unit='M')
+    return [
+        ('Member ID', _ints(values['member'])),
+        ('Member Name', _names(rng, n)),
+        ('Member Effective Date', _dates(values['effective'])),
+        ('Period', _text_cells([f'{period[5:]}/{period[:4]}' for period in np.unique(periods)])[
+            np.unique(periods, return_inverse=True)[1]]),
+        ('Product', _labels('Healthfirst Plan', values['plan'])),
+        ('Chargeback', _choice(rng, ['N', 'N', 'N', 'Y'], n)),
+        ('Enrollment Type', _choice(rng, ['Monthly Renewal', 'New Enrollment', 'Chargeback'], n)),
+        ('Producer Type', np.where(values['agency'], _text_cells(['FMO'])[0], _text_cells(['Agent'])[0])),
+        ('Producer Name', _earner_names(values, values['earner'])),
+        ('Disenrollement Reason', _empty(n)),
+        ('Disenrolled Date', _empty(n)),
+        ('Adjustment Description', _empty(n)),
+        ('Amount', _amounts(values['amount'])),
+    ]
+
+
+def _emblem_block(rng, rows, n_rows):
+    values = _common(rng, rows, n_rows)
+    n = len(rows)
+    term_dates = values['month'] + np.timedelta64(30, 'D')
+    return [
+        ('Payee Name', _earner_names(values, values['earner'])),
+        ('Payee ID', _ints(60_000_000 + values['earner'])),
+        ('Rep Name', _names(rng, n)),
+        ('Rep ID', _ints(30_000_000 + rng.integers(0, 2_000, n))),
+        ('Effective Date', _dates(values['month'])),
+        ('Term Date', np.where(rng.random(n) < 0.3, _dates(term_dates), _empty(n))),
+        ('Plan Group', _empty(n)),
+        ('Plan Group Name', _empty(n)),
+        ('Plan', _labels('VIP Plan', values['plan'])),
+        ('OSB', _empty(n)),
+        ('Member HIC', _labels('HIC', values['member'])),
+        ('Member ID', _ints(values['member'])),
+        ('Member First Name', _choice(rng, _FIRST_NAMES, n)),
+        ('Member Last Name', _choice(rng, _LAST_NAMES, n)),
+        ('Member Year', _ints(rng.integers(1, 6, n))),
+        ('Cycle Year', _ints(rng.integers(1, 6, n))),
+        ('Prior Plan', _choice(rng, ['Yes', 'No'], n)),
+        ('Payment', _amounts(values['amount'])),
+    ]
+
+
+def _centene_block(rng, rows, n_rows):
+    values = _common(rng, rows, n_rows)
+    n = len(rows)
+    cycle_years = _ints(rng.integers(1, 6, n))
+    return [
+        ('Payment Type', _choice(rng, ['Initial - NOT New to CMS', 'Renewal', 'Initial - New to CMS'], n)),
+        ('Payment Description', _choice(rng, ['Override', 'Commission'], n)),
+        ('Writing Broker NPN', _ints(20_000_000 + rng.integers(0, 2_000, n))),
+        ('Writing Broker Name', _names(rng, n)),
+        ('Earner NPN', _ints(50_000_000 + values['earner'])),
+        ('Earner Name', _earner_names(values, values['earner'])),
+        ('Pay Period', _dates(values['month'])),
+        ('Payment Amount', _ints(np.round(values['amount']))),
+        ('Medicare Beneficiary Identifier (MBI)', _labels('MBI', values['member'])),
+        ('Member Name', _names(rng, n)),
+        ('Signed Date', _dates(values['effective'] - np.timedelta64(10, 'D'))),
+        ('Effective Date', _dates(values['effective'])),
+        ('Cycle Year', np.where(rng.random(n) < 0.1, _text_cells(['Pending'])[0], cycle_years)),
+        ('Prior Plan Type', _choice(rng, ['PDP', 'MAPD', ''], n)),
+        ('Policy State', _choice(rng, ['NY', 'NJ', 'CT'], n)),
+        ('Plan Type', _choice(rng, ['MAPD', 'PDP'], n)),
+        ('Plan Name', _labels('Wellcare Plan', values['plan'])),
+        ('Original Effective Date', _dates(values['effective'])),
+        ('Member Term Date', np.where(rng.random(n) < 0.2, _dates(values['month'] + np.timedelta64(30, 'D')),
+                                      _empty(n))),
+        ('CMS Contract', _choice(rng, ['H4868', 'H2775', 'H3361'], n)),
+        ('PBP', _ints(rng.integers(1, 200, n))),
+        ('Description', _empty(n)),
+        ('Centene ID', _ints(80_000_000 + values['member'])),
+        ('QIS Level', _empty(n)),
+    ]
+
+
+_BLOCK_WRITERS = {
+    'healthfirst': _healthfirst_block,
+    'emblem': _emblem_block,
+    'centene': _centene_block,
+}
+
+
+def workbook_path(data_dir, carrier, n_rows, seed=0):
+    """
+    Path of a synthetic workbook. The file name starts with the carrier name,
+    which the Excel reader takes as the Carrier column.
+    :param data_dir:
+    :param carrier:
+    :param n_rows:
+    :param seed:
+    :return:
+    """
+    return os.path.join(data_dir, f'{carrier}%20synthetic%20{n_rows}%20{seed}.xlsx')
+
+
+def write_carrier_workbook(path, carrier, n_rows, seed=0):
+    """
+    Write a synthetic workbook in the column layout of a carrier.
+    The rows depend only on the carrier, the number of rows and the seed.
+    :param path:
+    :param carrier: one of CARRIERS
+    :param n_rows:
+    :param seed:
+    :return: path
+    """
+    if carrier not in _BLOCK_WRITERS:
+        raise ValueError(f"Unknown carrier '{carrier}', expected one of {CARRIERS}.")
+    rng = np.random.default_rng([seed, CARRIERS.index(carrier)])
+    partial_path = f'{path}.partial'
+    with zipfile.ZipFile(partial_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as workbook:
+        for name, content in _WORKBOOK_PARTS.items():
+            workbook.writestr(name, content)
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(_SHEET_HEAD.encode())
+            header_written = False
+            for start in range(0, n_rows, BLOCK_ROWS):
+                columns = _BLOCK_WRITERS[carrier](rng, np.arange(start, min(start + BLOCK_ROWS, n_rows)), n_rows)
+                if not header_written:
+                    sheet.write(('<row>' + ''.join(_text_cells([name for name, _ in columns])) + '</row>').encode())
+                    header_written = True
+                cells = [cells for _, cells in columns]
+                sheet.write(''.join(f'<row>{"".join(row)}</row>' for row in zip(*cells)).encode())
+            sheet.write(_SHEET_TAIL.encode())
+    os.replace(partial_path, path)
+    return path
+
+
+def ensure_workbooks(data_dir, carriers, n_rows, seed=0):
+    """
+    Write the synthetic workbooks that are not in data_dir yet.
+    :param data_dir:
+    :param carriers:
+    :param n_rows: rows per workbook
+    :param seed:
+    :return: dict of carrier to workbook path
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {}
+    for carrier in carriers:
+        path = workbook_path(data_dir, carrier, n_rows, seed)
+        if not os.path.exists(path):
+            write_carrier_workbook(path, carrier, n_rows, seed)
+        paths[carrier] = path
+    return paths
@@ -1,11 +1,9 @@
-import os
-import yaml
-from src.excel_reader import ExcelReader
-from src.normalizer import Normalizer
 import argparse
-import pandas as pd
-from src.command import CommandMeta
-import sqlite3
+from src import tracing
+from src.command import COMMAND_MANIFEST, load_command
+from src.pipeline import load_config, parse_upload_targets, normalize_file_chunks, normalize_files_by_target
+
+# pandas and the stores are imported when a command runs, not at startup
 
 def parse_type(type_str):
     """
@@ -17,28 +15,54 @@ def parse_type(type_str):
         return str
     return str
 
+
+def add_command_argument(cmd_parser, arg, help_info):
+    """
+    Add an argument of the manifest to the parser of its command, 'bool' arguments are flags.
+    """
+    if arg['type'] == 'bool':
+        cmd_parser.add_argument(f'--{arg["name"]}', action='store_true', help=arg.get('help', help_info))
+    else:
+        cmd_parser.add_argument(f'--{arg["name"]}', type=parse_type(arg['type']), help=arg.get('help', help_info))
+
 def parse_arguments():
     """
     Parse the command-line arguments.
     """
     parser = argparse.ArgumentParser(description='Process commands.')
+    parser.add_argument('--trace', type=str,
+                        help='Record the time, CPU, peak memory and rows of each stage to '
+                             '<TRACE>.jsonl and the Chrome trace <TRACE>.trace.json')
     subparsers = parser.add_subparsers(
         title="Available commands",
         dest="command",
         help="List of available commands"
     )
 
-    upload_parser = subparsers.add_parser('upload', help='Upload and process Excel files')
-    upload_parser.add_argument('file', type=str, help='Path to the Excel file to upload')
+    upload_parser = subparsers.add_parser('upload', help='Upload and process Excel, CSV, JSON Lines or Parquet files')
+    upload_parser.add_argument('files', type=str, nargs='*',
+                               help="Paths of the data files to upload, optionally as 'file:config' pairs")
     upload_parser.add_argument('--config', type=str, help='Path to the YAML configuration file')
-
-    for cmd in CommandMeta.get_commands().values():
-        cmd_parser = subparsers.add_parser(cmd.get_name(), help=cmd.get_help_info())
-        if args := cmd.get_args():
+    upload_parser.add_argument('--manifest', type=str,
+                               help='Path to a YAML or JSON manifest listing file and config pairs')
+    upload_parser.add_argument('--workers', type=int,
+                               help='Number of processes normalizing files, or the sheets of a single workbook, '
+                                    'in parallel, one per CPU core by default')
+    upload_parser.add_argument('--chunk_size', type=int,
+                               help='Number of rows read and normalized at a time, 50000 by default')
+    upload_parser.add_argument('--no_parse_cache', action='store_true',
+                               help='Parse the workbooks again instead of reading them from the parse cache')
+
+    serve_parser = subparsers.add_parser('serve', help='Keep the data in memory and answer JSON line queries')
+    serve_parser.add_argument('--socket', type=str, help='Path of the Unix socket to listen on')
+    serve_parser.add_argument('--host', type=str, default='127.0.0.1', help='Host to listen on without --socket')
+    serve_parser.add_argument('--port', type=int, default=8765, help='Port to listen on without --socket')
+
+    for name, cmd in COMMAND_MANIFEST.items():
+        cmd_parser = subparsers.add_parser(name, help=cmd['help'])
+        if args := cmd['args']:
             for arg in args:
-                cmd_parser.add_argument(f'--{arg["name"]}',
-                                        type=parse_type(arg["type"]),
-                                        help=cmd.get_help_info())
+                add_command_argument(cmd_parser, arg, cmd['help'])
 
 
     parsed_args = parser.parse_args()
@@ -51,89 +75,102 @@ def parse_arguments():
     # default='data/Emblem%2006.2024%20Commission.xlsx',
     # default='data/Centene%2006.2024%20Commission.xlsx',
 
-def load_config(config_path):
+def print_trace_summary(tracer):
     """
-    Load the YAML configuration file if provided.
+    Print the totals of the traced stages.
+    :param tracer:
+    :return:
     """
-    try:
-        with open(config_path, 'r') as file:
-            config = yaml.safe_load(file)
-            return config
-    except Exception as e:
-        print(f"Error loading config: {e}")
-        return None
-
-def validate_primary_key(df, primary_key):
-    if not primary_key:
-        raise ValueError("No valid Primary Key found or generated.")
-
-    missing_keys = [key for key in primary_key if key not in df.columns]
-    if missing_keys:
-        raise ValueError(f"Primary Key column(s) not found in the dataframe: {missing_keys}")
-
-    print("Primary Key validation passed.")
+    print(f"{'stage':<36} {'count':>6} {'wall s':>9} {'cpu s':>9} {'rows':>10} {'peak MB':>9}")
+    for name, total in tracer.summary().items():
+        print(f"{name:<36} {total['count']:>6} {total['wall_seconds']:>9.3f} {total['cpu_seconds']:>9.3f} "
+              f"{total['rows']:>10} {total['peak_memory_bytes'] / 2 ** 20:>9.1f}")
 
 
-def save_to_database(df, file_path='database/normalized.csv', sqlite_db_path='database/normalized.db'):
-    if 'Primary_Key' not in df.columns:
-        raise ValueError("Merged 'Primary_Key' column not found in the dataframe.")
-
-    if os.path.exists(file_path):
-        existing_df = pd.read_csv(file_path)
-        if 'Primary_Key' not in existing_df.columns:
-            raise ValueError("Primary_Key not found in existing database.")
-
-        combined_df = pd.concat([existing_df, df]).drop_duplicates(subset='Primary_Key', keep='last')
-    else:
-        combined_df = df
+def main():
+    args = parse_arguments()
+    if not args.trace:
+        run(args)
+        return
 
-    combined_df.to_csv(file_path, mode='w', header=True, index=False)
-    print(f"Data saved to {file_path}")
+    tracer = tracing.enable()
+    try:
+        run(args)
+    finally:
+        tracing.disable()
+        print_trace_summary(tracer)
+        jsonl_path, chrome_path = tracer.write(args.trace)
+        print(f"Trace written to {jsonl_path} and {chrome_path}")
 
-    # conn = sqlite3.connect(sqlite_db_path)
-    # df.to_sql('normalized_data', conn, if_exists='replace', index=False)
-    # print(f"Data saved to {sqlite_db_path} SQLite database")
-    #
-    # conn.close()
 
-def main():
-    args = parse_arguments()
+def run(args):
     command_name = args.command
 
+    from src.store import open_store
     if command_name == 'upload':
-        excel_reader = ExcelReader(args.file)
-        excel_reader.display_dataframe()
-        df = excel_reader.dataframe
-        normalizer = Normalizer(df)
-        if args.config:
-            config = load_config(args.config)
-            if config:
-                normalized_df, primary_key = normalizer.normalize_dataframe(config)
-                validate_primary_key(normalized_df, primary_key)
-                save_to_database(normalized_df)
-            else:
-                raise ValueError("Error loading config.")
+        targets = parse_upload_targets(args.files, args.config, args.manifest)
+        if len(targets) == 1:
+            # a single file is streamed chunk by chunk with bounded memory
+            uploads = [(targets[0], normalize_file_chunks(*targets[0], chunk_size=args.chunk_size,
+                                                          parse_cache=not args.no_parse_cache,
+                                                          workers=args.workers))]
         else:
-            raise ValueError("Metadata configuration is required for uploading data.")
-
+            uploads = ((target, [df]) for target, df
+                       in normalize_files_by_target(targets, chunk_size=args.chunk_size, workers=args.workers,
+                                                    parse_cache=not args.no_parse_cache))
+        store = open_store()
+        try:
+            with tracing.span('upload', files=len(targets)) as span:
+                # each file is one upload of the ingestion ledger, applied as the delta to its previous upload
+                rows = 0
+                for (file_path, config_path), chunks in uploads:
+                    summary = store.ledger.ingest(chunks, file_path, config_path)
+                    rows += summary['inserted'] + summary['changed'] + summary['deleted']
+                    print(f"Upload {summary['upload_id']} of '{summary['source']}': {summary['rows']} rows, "
+                          f"{summary['inserted']} inserted, {summary['changed']} changed, "
+                          f"{summary['deleted']} deleted, {summary['unchanged']} unchanged")
+                span.set(rows=rows)
+        finally:
+            store.close()
+        print(f"{rows} rows applied to the {type(store).__name__}")
+        return
 
-    normalized_csv_path = 'database/normalized.csv'
+    if command_name == 'serve':
+        from src.server import serve
+        store = open_store()
+        try:
+            serve(store, socket_path=args.socket, host=args.host, port=args.port)
+        finally:
+            store.close()
+        return
 
-    if not os.path.exists(normalized_csv_path):
-        print(f"Error: The normalized CSV at '{normalized_csv_path}' does not exist. Please process an input file first.")
+    command_cls = load_command(command_name)
+    if not command_cls:
+        print("Command not found. Use --help for available commands.")
         return
 
-    normalized_dataframe = pd.read_csv(normalized_csv_path)
-    command_mapping = {cls.get_name(): cls for cls in CommandMeta.get_commands().values()}
-    command_cls = command_mapping.get(command_name)
+    command_args = vars(args)
+    command_parameters = command_cls.get_parameters(command_args)
+    command_instance = command_cls()
 
-    if command_cls:
-        command_args = vars(args)
-        command_parameters = command_cls.get_parameters(command_args)
-        command_instance = command_cls()
-        command_instance.execute(normalized_dataframe, **command_parameters)
-    else:
-        print("Command not found. Use --help for available commands.")
+    store = None
+    if COMMAND_MANIFEST[command_name].get('loads_data', True):
+        store = open_store()
+        if not store.count():
+            print("Error: The database is empty. Please process an input file first.")
+            store.close()
+            return
+
+    from src.result_cache import ResultCache
+    cache = ResultCache.open()
+    try:
+        with tracing.span(f'command.{command_name}'):
+            command_instance.run(store, cache=cache, **command_parameters)
+    finally:
+        if cache is not None:
+            cache.close()
+        if store is not None:
+            store.close()
 
 if __name__ == "__main__":
     main()
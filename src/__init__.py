@@ -1,2 +1,13 @@
-from src.excel_reader import ExcelReader
-from src.normalizer import Normalizer
\ No newline at end of file
+import importlib
+
+# imported on first access so that importing src stays cheap
+_LAZY_ATTRIBUTES = {
+    'ExcelReader': 'src.reader',
+    'Normalizer': 'src.normalizer',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,163 @@
+import os
+import threading
+import weakref
+
+import pandas as pd
+
+from src import tracing
+
+# rows per chunk streamed from the store, the partial sums cost more per row with smaller chunks
+AGGREGATION_CHUNK_SIZE = 50_000
+# partial sums collected by a stream before they are merged into one frame
+MERGE_EVERY = 16
+
+# (id(dataframe), keys, value) -> summed dataframe, dropped when the dataframe is garbage collected
+_sums = {}
+_sums_lock = threading.Lock()
+_key_locks = {}
+
+
+def _forget(frame_id):
+    with _sums_lock:
+        for entry in [entry for entry in _sums if entry[0] == frame_id]:
+            del _sums[entry]
+        for entry in [entry for entry in _key_locks if entry[0] == frame_id]:
+            del _key_locks[entry]
+
+
+def sum_by(dataframe, keys, value='Commission_Amount'):
+    """
+    Sum a column grouped by one or more key columns.
+    The result is computed once per dataframe and keys, so the commands of a batch or of
+    the server that group the same data by the same keys share one groupby.
+    Dataframes must not be modified after they were aggregated.
+    :param dataframe:
+    :param keys: column or list of columns
+    :param value:
+    :return: dataframe indexed by the keys with the summed value column
+    """
+    keys = tuple(keys) if isinstance(keys, (list, tuple)) else (keys,)
+    entry = (id(dataframe), keys, value)
+    with _sums_lock:
+        if entry in _sums:
+            return _sums[entry]
+        if not any(existing[0] == entry[0] for existing in _key_locks):
+            weakref.finalize(dataframe, _forget, entry[0])
+        key_lock = _key_locks.setdefault(entry, threading.Lock())
+
+    # concurrent callers wait for the first one instead of computing the same groupby
+    with key_lock:
+        with _sums_lock:
+            if entry in _sums:
+                return _sums[entry]
+        sums = dataframe.groupby(list(keys), observed=True)[[value]].sum()
+        with _sums_lock:
+            _sums[entry] = sums
+        return sums
+
+
+def top_k(sums, k, value='Commission_Amount'):
+    """
+    Get the k largest groups of summed values.
+    :param sums: dataframe returned by sum_by
+    :param k:
+    :param value:
+    :return:
+    """
+    return sums.sort_values(value, ascending=False).head(k)[[value]]
+
+
+def empty_sums(keys, value='Commission_Amount'):
+    """
+    Sums of no rows, shaped like the result of sum_by.
+    :param keys: list of key columns
+    :param value:
+    :return:
+    """
+    if len(keys) == 1:
+        index = pd.Index([], name=keys[0])
+    else:
+        index = pd.MultiIndex.from_arrays([[] for _ in keys], names=keys)
+    return pd.DataFrame({value: pd.Series(dtype='float64')}, index=index)
+
+
+def merge_sums(partials, keys, value='Commission_Amount'):
+    """
+    Merge partial sums of the same keys into one sum per group.
+    :param partials: list of dataframes indexed by the keys
+    :param keys: list of key columns
+    :param value:
+    :return: dataframe indexed by the keys with the summed value column, sorted by the keys
+    """
+    partials = [partial for partial in partials if not partial.empty]
+    if not partials:
+        return empty_sums(keys, value)
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials).groupby(level=list(range(len(keys))), observed=True)[[value]].sum()
+
+
+def _sum_stream(chunks, keys, value):
+    partials = []
+    for chunk in chunks:
+        with tracing.span('aggregate.chunk', rows=len(chunk)):
+            partials.append(chunk.groupby(keys, observed=True)[[value]].sum())
+        if len(partials) >= MERGE_EVERY:
+            partials = [merge_sums(partials, keys, value)]
+    return merge_sums(partials, keys, value)
+
+
+def stream_sum_by(store, keys, value='Commission_Amount', filters=None, chunk_size=None, workers=None):
+    """
+    Sum a column grouped by one or more key columns, streaming the store in chunks instead of loading it.
+    Each chunk is reduced to its partial sums, which are merged as they come, so memory holds a few
+    chunks and the groups rather than the data. The store is split into streams summed by worker threads.
+    :param store:
+    :param keys: column or list of columns
+    :param value:
+    :param filters: (column, operator, value) filters pushed down to the store
+    :param chunk_size: rows per chunk, AGGREGATION_CHUNK_SIZE by default
+    :param workers: number of streams summed concurrently, defaults to one per CPU core
+    :return: dataframe indexed by the keys with the summed value column, like sum_by
+    """
+    keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+    workers = workers or os.cpu_count() or 1
+    streams = store.chunk_streams(columns=keys + [value], filters=filters,
+                                  chunk_size=chunk_size or AGGREGATION_CHUNK_SIZE, parts=workers)
+    if len(streams) <= 1:
+        return merge_sums([_sum_stream(stream, keys, value) for stream in streams], keys, value)
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(workers, len(streams))) as executor:
+        partials = list(executor.map(lambda stream: _sum_stream(stream, keys, value), streams))
+    return merge_sums(partials, keys, value)
+
+
+def store_sum_by(store, keys, value='Commission_Amount', filters=None):
+    """
+    Sum a column of the store grouped by key columns, from its rollup cube when the keys and filters are
+    dimensions of the cube, else by streaming the store (stream_sum_by).
+    :param store:
+    :param keys: column or list of columns
+    :param value:
+    :param filters: (column, operator, value) filters
+    :return: dataframe indexed by the keys with the summed value column, like sum_by
+    """
+    from src.rollup import ROLLUP_DIMENSIONS, ROLLUP_VALUE
+
+    key_list = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+    columns = key_list + [column for column, _, _ in filters or []]
+    if value == ROLLUP_VALUE and all(column in ROLLUP_DIMENSIONS for column in columns):
+        try:
+            rollup = store.rollup
+        except NotImplementedError:
+            rollup = None
+        if rollup is not None:
+            with tracing.span('aggregate', source='rollup') as span:
+                sums = rollup.sum_by(key_list, filters)
+                span.set(groups=len(sums))
+            return sums
+    with tracing.span('aggregate', source='stream') as span:
+        sums = stream_sum_by(store, key_list, value, filters)
+        span.set(groups=len(sums))
+    return sums
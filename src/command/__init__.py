@@ -1,8 +1,58 @@
+import importlib
+
 from .base_command import Command
 from .command_meta import CommandMeta
-from .find_top_k_carrier import FindTopKCarrier
-from .find_top_k_earner import FindTopKEarnerByCommissionPeriod
-from .find_top_k_plan import FindTopKPlan
-from .list_carriers import ListAllCarriersCommand
-from .sql_query import SqlQuery
-from .export_csv import ExportCsv
+from .manifest import COMMAND_MANIFEST
+
+# command classes are imported on first access, e.g. 'from src.command import FindTopKCarrier'
+_COMMAND_MODULES = {info['class']: info['module'] for info in COMMAND_MANIFEST.values()}
+
+__all__ = ['Command', 'CommandMeta', 'COMMAND_MANIFEST', 'load_command', 'prepare_command', 'run_command',
+           *_COMMAND_MODULES]
+
+
+def load_command(name):
+    """
+    Import the class of a command listed in the manifest.
+    :param name: command name, e.g. 'find_top_k_carrier'
+    :return: None if the command does not exist
+    """
+    info = COMMAND_MANIFEST.get(name)
+    if info is None:
+        return None
+    return getattr(importlib.import_module(info['module']), info['class'])
+
+
+def prepare_command(name, args=None):
+    """
+    Create a quiet instance of a command and validate its arguments.
+    Arguments missing from args are None, as when they are not given on the command line.
+    :param name: command name, e.g. 'find_top_k_carrier'
+    :param args: dict of command arguments
+    :return: (command, parameters)
+    """
+    command_cls = load_command(name)
+    if command_cls is None:
+        raise ValueError(f"Unknown command '{name}'.")
+    command_args = {arg['name']: None for arg in COMMAND_MANIFEST[name]['args']}
+    command_args.update(args or {})
+    return command_cls(quiet=True), command_cls.get_parameters(command_args)
+
+
+def run_command(name, args, dataframe, store=None):
+    """
+    Run a command quietly on data that is already loaded.
+    :param name: command name
+    :param args: dict of command arguments
+    :param dataframe: loaded normalized data
+    :param store: store the data was loaded from, used by commands that query the store
+    :return: command result
+    """
+    command, parameters = prepare_command(name, args)
+    return command.run_loaded(dataframe, store, **parameters)
+
+
+def __getattr__(name):
+    if name in _COMMAND_MODULES:
+        return getattr(importlib.import_module(_COMMAND_MODULES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,23 @@
 from abc import abstractmethod, ABC
+
+from src import tracing
 from .command_meta import CommandMeta
 
 class Command(metaclass=CommandMeta):
     """
     Base command class
     """
+    # whether results can be served from the result cache until the next upload
+    cacheable = False
+    # whether the command runs on the store's query engine instead of the loaded data
+    queries_store = False
+
+    def __init__(self, quiet=False):
+        """
+        :param quiet: skip printing results, e.g. when the results are sent to a client
+        """
+        self.quiet = quiet
+
     @classmethod
     @abstractmethod
     def get_name(cls) -> str:
@@ -49,4 +62,89 @@ class Command(metaclass=CommandMeta):
         :param command_args:
         :return:
         """
-        raise NotImplementedError("Each command must implement a get_parameters method.")
\ No newline at end of file
+        raise NotImplementedError("Each command must implement a get_parameters method.")
+
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        """
+        Get the columns the command reads, None to read every column.
+        The loader only reads these columns from the store.
+        :return:
+        """
+        return None
+
+    @classmethod
+    def get_filters(cls, parameters) -> list[tuple]:
+        """
+        Get the (column, operator, value) filters the command applies to the data.
+        The loader pushes them down so only the matching rows and partitions are read.
+        :param parameters: parameters returned by get_parameters
+        :return:
+        """
+        return []
+
+    def display(self, result, **kwargs):
+        """
+        Print a result of the command
+        :param result:
+        :param kwargs: parameters returned by get_parameters
+        :return:
+        """
+        print(result)
+
+    def show(self, result, **kwargs):
+        """
+        Display a result unless the command is quiet
+        :param result:
+        :param kwargs: parameters returned by get_parameters
+        :return:
+        """
+        if not self.quiet:
+            self.display(result, **kwargs)
+
+    def run_loaded(self, dataframe, store=None, **kwargs):
+        """
+        Execute the command on data that is already loaded, e.g. by the batch command or the server.
+        :param dataframe: loaded normalized data, with at least the columns of get_columns
+        :param store: store the data was loaded from
+        :param kwargs: parameters returned by get_parameters
+        :return:
+        """
+        return self.execute(dataframe, **kwargs)
+
+    def run(self, store, cache=None, **kwargs):
+        """
+        Load the slice of the store the command needs and execute it.
+        Results of cacheable commands are reused while the dataset version of the same store is unchanged.
+        :param store:
+        :param cache: ResultCache, None to always execute
+        :param kwargs: parameters returned by get_parameters
+        :return:
+        """
+        if cache is None or not self.cacheable:
+            return self.load_and_execute(store, **kwargs)
+
+        key = cache.make_key(f'{type(store).__name__}:{store.get_location()}.{self.get_name()}', kwargs,
+                             store.get_version())
+        with tracing.span('cache.get') as span:
+            result = cache.get(key)
+            span.set(hit=result is not None)
+        if result is not None:
+            self.show(result, **kwargs)
+            return result
+        result = self.load_and_execute(store, **kwargs)
+        cache.put(key, self.get_name(), result)
+        return result
+
+    def load_and_execute(self, store, **kwargs):
+        """
+        Load the columns and rows of the store the command reads, and execute the command on them.
+        :param store:
+        :param kwargs: parameters returned by get_parameters
+        :return:
+        """
+        with tracing.span('load') as span:
+            dataframe = store.load(columns=self.get_columns(), filters=self.get_filters(kwargs))
+            span.set(rows=len(dataframe))
+        with tracing.span('execute', rows=len(dataframe)):
+            return self.execute(dataframe, **kwargs)
@@ -0,0 +1,193 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import tracing
+from src.command import COMMAND_MANIFEST, prepare_command
+from src.command.base_command import Command
+
+DEFAULT_BATCH_WORKERS = 4
+
+
+class Batch(Command):
+    """
+    Run a list of command invocations against one load of the normalized data.
+    """
+
+    @classmethod
+    def get_name(cls) -> str:
+        return 'batch'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return \
+        [
+            {
+                'name': 'file',
+                'type': 'str',
+                'required': True,
+                'help': 'YAML or JSON list of {command, args} invocations'
+            },
+            {
+                'name': 'output',
+                'type': 'str',
+                'required': False,
+                'help': 'JSON file to write the results to, printed when omitted'
+            },
+            {
+                'name': 'workers',
+                'type': 'int',
+                'required': False,
+                'help': 'Number of commands run concurrently'
+            }
+        ]
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return "Run the commands listed in a YAML or JSON file against one load of the data"
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        file = command_args.get('file')
+        if not file:
+            raise ValueError("You must provide the file listing the commands to run.")
+        workers = command_args.get('workers') or DEFAULT_BATCH_WORKERS
+        if workers <= 0:
+            raise ValueError("workers must be greater than 0.")
+        return {'file': file, 'output': command_args.get('output'), 'workers': workers}
+
+    @classmethod
+    def read_invocations(cls, file):
+        """
+        Read the command invocations of a batch file, e.g.
+            - command: find_top_k_earner
+              args: {k: 3, period: 2024-06}
+            - {name: carriers, command: list_carriers}
+        A JSON list, or a mapping with the list under 'commands', is accepted too.
+        :param file:
+        :return: list of dicts with 'name', 'command' and 'args'
+        """
+        from src.pipeline import load_config
+        invocations = load_config(file)
+        if isinstance(invocations, dict):
+            invocations = invocations.get('commands')
+        if not isinstance(invocations, list):
+            raise ValueError(f"{file} must contain a list of commands.")
+
+        parsed = []
+        for position, invocation in enumerate(invocations):
+            if not isinstance(invocation, dict) or 'command' not in invocation:
+                raise ValueError(f"Entry {position} of {file} must be a mapping with a 'command'.")
+            command = invocation['command']
+            if command == cls.get_name() or COMMAND_MANIFEST.get(command, {}).get('loads_data') is False:
+                raise ValueError(f"Command '{command}' cannot run in a batch.")
+            parsed.append({'name': str(invocation.get('name', f'{position}:{command}')),
+                           'command': command,
+                           'args': dict(invocation.get('args') or {})})
+        return parsed
+
+    @staticmethod
+    def get_batch_columns(commands):
+        """
+        Get the union of the columns the commands read, None when one of them reads every column.
+        Commands that query the store do not need the loaded data.
+        :param commands: command instances
+        :return:
+        """
+        columns = set()
+        for command in commands:
+            if command.queries_store:
+                continue
+            command_columns = command.get_columns()
+            if command_columns is None:
+                return None
+            columns.update(command_columns)
+        return sorted(columns)
+
+    def run(self, store, cache=None, **kwargs):
+        """
+        Load the columns needed by all commands once and run the commands concurrently on that data.
+        Commands on the same data share their aggregations, e.g. the monthly earner sums of
+        find_top_k_earner are computed once for every period of the batch.
+        :param store:
+        :param cache:
+        :param kwargs: parameters returned by get_parameters
+        :return: list of result entries, in the order of the batch file
+        """
+        invocations = self.read_invocations(kwargs['file'])
+        prepared, entries = [], []
+        for invocation in invocations:
+            entry = dict(invocation)
+            try:
+                prepared.append(prepare_command(invocation['command'], invocation['args']))
+            except Exception as e:
+                prepared.append(None)
+                entry.update(ok=False, error=str(e))
+            entries.append(entry)
+
+        commands = [command for command, _ in filter(None, prepared)]
+        version = store.get_version()
+        dataframe = None
+        if any(not command.queries_store for command in commands):
+            with tracing.span('load') as span:
+                dataframe = store.load(columns=self.get_batch_columns(commands))
+                span.set(rows=len(dataframe))
+
+        def run_one(position):
+            command, parameters = prepared[position]
+            started = time.perf_counter()
+            try:
+                with tracing.span(f"command.{command.get_name()}", batch_entry=entries[position]['name']):
+                    result = command.run_loaded(dataframe, store, **parameters)
+                entries[position].update(ok=True, result=result)
+            except Exception as e:
+                entries[position].update(ok=False, error=str(e))
+            entries[position]['seconds'] = round(time.perf_counter() - started, 6)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=kwargs['workers']) as executor:
+            list(executor.map(run_one, [position for position, item in enumerate(prepared) if item]))
+        seconds = time.perf_counter() - started
+
+        if kwargs.get('output'):
+            self.write_results(kwargs['output'], version, entries)
+        elif not self.quiet:
+            for entry, item in zip(entries, prepared):
+                print(f"== {entry['name']}")
+                if entry['ok']:
+                    item[0].display(entry['result'], **item[1])
+                else:
+                    print(f"Error: {entry['error']}")
+
+        failed = sum(not entry['ok'] for entry in entries)
+        rows = 0 if dataframe is None else len(dataframe)
+        print(f"Ran {len(entries)} commands ({failed} failed) on {rows} loaded rows in {seconds:.3f}s")
+        return entries
+
+    @staticmethod
+    def write_results(path, version, entries):
+        """
+        Write the batch results as JSON, dataframes in pandas' 'split' layout.
+        :param path:
+        :param version: dataset version the results were computed from
+        :param entries:
+        :return:
+        """
+        from src.results import to_json_value
+        results = [{key: to_json_value(value) if key == 'result' else value for key, value in entry.items()}
+                   for entry in entries]
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'version': version, 'results': results}, file, indent=2, default=str)
+        print(f"Batch results written to {path}")
+
+    def execute(self, dataframe, **kwargs):
+        """
+        A batch loads its own data, see run
+        :param dataframe:
+        :return:
+        """
+        raise ValueError("The batch command runs against the store, not a loaded dataframe.")
@@ -0,0 +1,47 @@
+from src.command.base_command import Command
+
+
+class CacheStats(Command):
+    """
+    Show the statistics of the result cache.
+    """
+    @classmethod
+    def get_name(cls) -> str:
+        return 'cache_stats'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return []
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return "Show the hits, misses, evictions and size of the result cache"
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        return {}
+
+    def run(self, store, cache=None, **kwargs):
+        """
+        The statistics come from the cache alone, no data is loaded
+        :param store:
+        :param cache:
+        :return:
+        """
+        return self.execute(None, cache=cache)
+
+    def execute(self, dataframe, **kwargs):
+        """
+        Print the cache statistics
+        :param dataframe:
+        :return:
+        """
+        cache = kwargs.get('cache')
+        if cache is None:
+            print("The result cache is disabled.")
+            return None
+        stats = cache.stats()
+        print('Result cache:')
+        for name, value in stats.items():
+            print(f'  {name}: {value}')
+        return stats
@@ -23,7 +23,6 @@ class CommandMeta(ABCMeta):
         command_class = super().__new__(cls, name, bases, attrs)
         if not isabstract(command_class):
             cls._registry[name] = command_class
-            print(f"Registered command: {name}")
         return command_class
 
     def __class_getitem__(cls, item) -> type[Command]:
@@ -37,7 +36,8 @@ class CommandMeta(ABCMeta):
     @classmethod
     def get_commands(mcs) -> dict[str, type[Command]]:
         """
-        Get all registered commands
+        Get all registered commands, i.e. the command classes imported so far.
+        Use src.command.load_command to import a command by name.
         :return:
         """
         return mcs._registry
\ No newline at end of file
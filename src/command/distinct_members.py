@@ -0,0 +1,102 @@
+from src.command.base_command import Command
+
+
+class CountDistinctMembers(Command):
+    """
+    Estimate the distinct members per carrier and/or plan from the HyperLogLog sketches the uploads maintain.
+    """
+    cacheable = True
+    queries_store = True
+    # comma-separated filter arguments and the column each one filters
+    FILTER_ARGS = {'carrier': 'Carrier_Name', 'plan': 'Plan_Name'}
+
+    @classmethod
+    def get_name(cls) -> str:
+        return 'distinct_members'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return [
+            {'name': 'by', 'type': 'str', 'required': False,
+             'help': 'Carrier_Name, Plan_Name or both comma-separated; all members when omitted'},
+            {'name': 'carrier', 'type': 'str', 'required': False, 'help': 'Comma-separated carriers to count'},
+            {'name': 'plan', 'type': 'str', 'required': False, 'help': 'Comma-separated plans to count'},
+        ]
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return ("Estimate the distinct Member_ID per carrier and/or plan from HyperLogLog sketches, "
+                "without scanning the data")
+
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        from src.sketches import DISTINCT_BY, DISTINCT_COLUMN
+        return DISTINCT_BY + [DISTINCT_COLUMN]
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        from src.sketches import DISTINCT_BY
+
+        parameters = {'by': []}
+        if command_args.get('by'):
+            parameters['by'] = [value.strip() for value in command_args['by'].split(',') if value.strip()]
+        unknown = [column for column in parameters['by'] if column not in DISTINCT_BY]
+        if unknown:
+            raise ValueError(f"Cannot count distinct members by {unknown}, use {DISTINCT_BY}.")
+        for name in cls.FILTER_ARGS:
+            if command_args.get(name):
+                parameters[name] = [value.strip() for value in command_args[name].split(',') if value.strip()]
+        return parameters
+
+    def get_sketch_filters(self, parameters):
+        return {column: set(parameters[name]) for name, column in self.FILTER_ARGS.items() if parameters.get(name)}
+
+    def run_loaded(self, dataframe, store=None, **kwargs):
+        """
+        Read the store's sketches when there is a store, e.g. in a batch or the server,
+        instead of sketching the loaded data again for every request
+        :param dataframe:
+        :param store:
+        :param kwargs:
+        :return:
+        """
+        if store is None:
+            return self.execute(dataframe, **kwargs)
+        with store.lock:
+            return self.load_and_execute(store, **kwargs)
+
+    def load_and_execute(self, store, **kwargs):
+        """
+        Merge the persisted sketches of the carriers and plans, without reading the rows
+        :param store:
+        :return:
+        """
+        from src.sketches import DISTINCT_COLUMN, distinct_members
+
+        sketches = store.sketches
+        result = distinct_members(sketches.load(DISTINCT_COLUMN), kwargs['by'], self.get_sketch_filters(kwargs),
+                                  sketches.options['precision'])
+        self.show(result, **kwargs)
+        return result
+
+    def execute(self, dataframe, sketch_config=None, **kwargs):
+        """
+        Sketch already loaded rows, when there is no store to read the sketches of.
+        :param dataframe:
+        :param sketch_config: 'sketches' section of the store config
+        :return:
+        """
+        from src.sketches import DISTINCT_COLUMN, SketchSet, build_sketches, distinct_members
+
+        options = SketchSet.options_from_config(sketch_config)
+        sketches = build_sketches([dataframe], [DISTINCT_COLUMN], **options)
+        result = distinct_members(sketches[DISTINCT_COLUMN], kwargs['by'], self.get_sketch_filters(kwargs),
+                                  options['precision'])
+        self.show(result, **kwargs)
+        return result
+
+    def display(self, result, **kwargs):
+        by = ', '.join(kwargs['by']) or 'total'
+        error = result.attrs.get('relative_error')
+        print(f"Estimated distinct members by {by}" + (f" (standard error {error:.1%}):" if error else ":"))
+        print(result)
@@ -1,54 +1,158 @@
 import os
+
 from src.command import Command
+from src.commission_month import parse_period
+
 
 class ExportCsv(Command):
     """
-    Export the dataframe to a CSV file.
+    Export the normalized data to CSV or Parquet, streamed from the store chunk by chunk.
     """
+    # exports stream from the store, a batch does not load the data for them
+    queries_store = True
     @classmethod
     def get_name(cls) -> str:
         return 'export_csv'
 
     @classmethod
     def get_args(cls) -> list[dict]:
-        return \
-        [
-            {
-                'name': 'path',
-                'type': 'str',
-                'required': True
-            }
+        return [
+            {'name': 'path', 'type': 'str', 'required': True},
+            {'name': 'format', 'type': 'str', 'required': False, 'help': 'csv (the default) or parquet'},
+            {'name': 'compression', 'type': 'str', 'required': False, 'help': 'gzip or zstd'},
+            {'name': 'columns', 'type': 'str', 'required': False,
+             'help': 'Comma-separated columns to export, all columns by default'},
+            {'name': 'carrier', 'type': 'str', 'required': False, 'help': 'Comma-separated carriers to export'},
+            {'name': 'from', 'type': 'str', 'required': False, 'help': 'First period to export, YYYY-MM'},
+            {'name': 'to', 'type': 'str', 'required': False, 'help': 'Last period to export, YYYY-MM'},
+            {'name': 'partition_by', 'type': 'str', 'required': False,
+             'help': 'Column to write one file per value of, e.g. Carrier_Name'},
+            {'name': 'workers', 'type': 'int', 'required': False,
+             'help': 'Number of partition files written in parallel'},
+            {'name': 'chunk_size', 'type': 'int', 'required': False, 'help': 'Rows read and written at a time'},
         ]
 
     @classmethod
     def get_help_info(cls) -> str:
-        return "Export the normalized CSV to the specified path."
+        return ("Export the normalized data to the specified path as CSV or Parquet, "
+                "optionally filtered, compressed and partitioned")
 
-    def execute(self, dataframe, **kwargs):
+    @classmethod
+    def get_filters(cls, parameters) -> list[tuple]:
         """
-        Export the dataframe to a CSV file.
-        :param dataframe: The dataframe to export.
-        :param kwargs: Additional arguments (in this case, the path).
+        Only the rows of the requested carriers and months are read.
+        :param parameters:
+        :return:
+        """
+        filters = []
+        if parameters.get('carrier'):
+            filters.append(('Carrier_Name', 'in', parameters['carrier']))
+        if parameters.get('from'):
+            filters.append(('Commission_Month', '>=', parse_period(parameters['from'])))
+        if parameters.get('to'):
+            filters.append(('Commission_Month', '<=', parse_period(parameters['to'])))
+        return filters
+
+    def get_output_path(self, path, **kwargs):
+        """
+        Resolve the export file, a directory receives an exported_data file named after the format.
+        :param path:
         :return:
         """
-        path = kwargs.get('path')
+        from src.export import file_name, DEFAULT_FILE_NAME
+
         if os.path.isdir(path):
-            path = os.path.join(path, "exported_data.csv")
+            path = os.path.join(path, file_name(DEFAULT_FILE_NAME, kwargs['format'], kwargs.get('compression')))
             print(f"Provided path is a directory. Saving as: {path}")
 
         dir_path = os.path.dirname(path)
-
-        if not os.path.exists(dir_path):
+        if dir_path and not os.path.exists(dir_path):
             os.makedirs(dir_path)
             print(f"Directory '{dir_path}' created.")
+        return path
 
-        dataframe.to_csv(path, index=False)
+    def run_loaded(self, dataframe, store=None, **kwargs):
+        """
+        Stream from the store when there is one, the loaded data is not copied
+        :param dataframe:
+        :param store:
+        :param kwargs:
+        :return:
+        """
+        if store is None:
+            return self.execute(dataframe, **kwargs)
+        return self.run(store, **kwargs)
+
+    def run(self, store, cache=None, **kwargs):
+        """
+        Stream the filtered rows from the store into the export files, so memory stays flat
+        whatever the size of the data
+        :param store:
+        :param cache: result cache, unused, exports are written every time
+        :return: number of rows exported
+        """
+        from src.export import write_chunks, export_partitions
+        from src.store import DEFAULT_BATCH_SIZE
+
+        filters = self.get_filters(kwargs)
+        if kwargs.get('partition_by'):
+            rows, files = export_partitions(store, kwargs['path'], kwargs['partition_by'],
+                                            columns=kwargs.get('columns'), filters=filters,
+                                            file_format=kwargs['format'], compression=kwargs.get('compression'),
+                                            chunk_size=kwargs.get('chunk_size'), workers=kwargs.get('workers'))
+            print(f"{rows} rows exported to {len(files)} files in {kwargs['path']}")
+            return rows
+
+        path = self.get_output_path(**kwargs)
+        chunks = store.iter_chunks(columns=kwargs.get('columns'), filters=filters,
+                                   chunk_size=kwargs.get('chunk_size') or DEFAULT_BATCH_SIZE)
+        rows = write_chunks(chunks, path, kwargs['format'], kwargs.get('compression'))
+        print(f"{rows} rows exported to {path}")
+        return rows
+
+    def execute(self, dataframe, **kwargs):
+        """
+        Export an already loaded dataframe, e.g. in a batch.
+        :param dataframe: The dataframe to export.
+        :param kwargs: parameters returned by get_parameters
+        :return: number of rows exported
+        """
+        from src.export import write_chunks
+        from src.store import apply_filters
+
+        filters = [condition for condition in self.get_filters(kwargs) if condition[0] in dataframe.columns]
+        dataframe = apply_filters(dataframe, filters)
+        if kwargs.get('columns'):
+            dataframe = dataframe[[col for col in kwargs['columns'] if col in dataframe.columns]]
+        path = self.get_output_path(**kwargs)
+        rows = write_chunks([dataframe], path, kwargs['format'], kwargs.get('compression'))
         print(f"Dataframe exported to {path}")
-        return
+        return rows
 
     @classmethod
     def get_parameters(cls, command_args):
+        from src.export import check_format
+
         path = command_args.get('path')
         if not path:
             raise ValueError("You must provide a path to export the CSV.")
-        return {'path': path}
+        file_format = (command_args.get('format') or 'csv').lower()
+        compression = (command_args.get('compression') or '').lower() or None
+        check_format(file_format, compression)
+        parameters = {'path': path, 'format': file_format, 'compression': compression}
+
+        for name in ('columns', 'carrier'):
+            if command_args.get(name):
+                parameters[name] = [value.strip() for value in command_args[name].split(',') if value.strip()]
+        for name in ('from', 'to', 'partition_by'):
+            if command_args.get(name):
+                parameters[name] = command_args[name]
+        if parameters.get('from') and parameters.get('to') \
+                and parse_period(parameters['from']) > parse_period(parameters['to']):
+            raise ValueError("from must not be after to.")
+        for name in ('workers', 'chunk_size'):
+            if command_args.get(name) is not None:
+                if command_args[name] <= 0:
+                    raise ValueError(f"{name} must be greater than 0.")
+                parameters[name] = command_args[name]
+        return parameters
@@ -1,9 +1,12 @@
+from src.aggregation import sum_by, store_sum_by, top_k
 from src.command.base_command import Command
 
 class FindTopKCarrier(Command):
     """
     Find the top K carriers based on commission.
     """
+    cacheable = True
+
     @classmethod
     def get_name(cls) -> str:
         return 'find_top_k_carrier'
@@ -23,6 +26,10 @@ class FindTopKCarrier(Command):
     def get_help_info(cls) -> str:
         return "Find the top K carriers based on commission, first parameter is the number of plans to return, type int"
 
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        return ['Carrier_Name', 'Commission_Amount']
+
 
     @classmethod
     def get_parameters(cls, args) -> dict:
@@ -41,11 +48,22 @@ class FindTopKCarrier(Command):
         :param dataframe:
         :return:
         """
-        k = kwargs['k']
-        top_carriers = dataframe.groupby('Carrier_Name').agg(
-            {'Commission_Amount': 'sum'}
-        ).sort_values('Commission_Amount', ascending=False).head(k)[['Commission_Amount']]
-        print(f'Top {k} carriers based on total commission:')
-        print(top_carriers)
-
-        return top_carriers
\ No newline at end of file
+        top_carriers = top_k(sum_by(dataframe, 'Carrier_Name'), kwargs['k'])
+        self.show(top_carriers, **kwargs)
+
+        return top_carriers
+
+    def load_and_execute(self, store, **kwargs):
+        """
+        Sum the commissions of each carrier from the rollup cube, or while streaming the store, without loading it
+        :param store:
+        :return:
+        """
+        sums = store_sum_by(store, 'Carrier_Name')
+        top_carriers = top_k(sums, kwargs['k'])
+        self.show(top_carriers, **kwargs)
+        return top_carriers
+
+    def display(self, result, **kwargs):
+        print(f"Top {kwargs['k']} carriers based on total commission:")
+        print(result)
@@ -1,10 +1,13 @@
+from src.aggregation import sum_by, store_sum_by, top_k
 from src.command.base_command import Command
-import pandas as pd
+from src.commission_month import add_commission_month, parse_period, month_bounds
 
 class FindTopKEarnerByCommissionPeriod(Command):
     """
     Find the top K earners based on commission for a given period.
     """
+    cacheable = True
+
     @classmethod
     def get_name(cls) -> str:
         return 'find_top_k_earner'
@@ -21,7 +24,17 @@ class FindTopKEarnerByCommissionPeriod(Command):
                 {
                     'name': 'period',
                     'type': 'str',
-                    'required': True
+                    'required': False
+                },
+                {
+                    'name': 'from',
+                    'type': 'str',
+                    'required': False
+                },
+                {
+                    'name': 'to',
+                    'type': 'str',
+                    'required': False
                 }
             ]
 
@@ -29,7 +42,36 @@ class FindTopKEarnerByCommissionPeriod(Command):
     def get_help_info(cls) -> str:
         return ("Find the top K earners based on commission for a given period, "
                 "first parameter is the number of earners to return, type int, "
-                "second parameter is the period of time, type str")
+                "second parameter is the period of time, type str, "
+                "or --from and --to for an inclusive range of periods, type str")
+
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        return ['Earner_Name', 'Commission_Amount', 'Commission_Month']
+
+    @classmethod
+    def get_month_range(cls, parameters) -> tuple[int, int]:
+        """
+        Get the first and last Commission_Month of the query, e.g. '2024-06' -> (202406, 202406).
+        :param parameters:
+        :return:
+        """
+        if parameters.get('period'):
+            month = parse_period(parameters['period'])
+            return month, month
+        return parse_period(parameters['from']), parse_period(parameters['to'])
+
+    @classmethod
+    def get_filters(cls, parameters) -> list[tuple]:
+        """
+        Only the partitions and rows of the requested months are read.
+        :param parameters:
+        :return:
+        """
+        start, end = cls.get_month_range(parameters)
+        if start == end:
+            return [('Commission_Month', '==', start)]
+        return [('Commission_Month', '>=', start), ('Commission_Month', '<=', end)]
 
     @classmethod
     def get_parameters(cls, args) -> dict:
@@ -41,26 +83,55 @@ class FindTopKEarnerByCommissionPeriod(Command):
         k = args['k']
         if k <= 0:
             raise ValueError("k must be greater than 0.")
-        period = args['period']
-        if not period:
-            raise ValueError("period must be provided.")
-        return {'k': k, 'period': period}
+        period, start, end = args.get('period'), args.get('from'), args.get('to')
+        if period and (start or end):
+            raise ValueError("Use either period or from/to, not both.")
+        if period:
+            parameters = {'k': k, 'period': period}
+        elif start or end:
+            parameters = {'k': k, 'from': start or end, 'to': end or start}
+        else:
+            raise ValueError("period or from/to must be provided.")
+        start, end = cls.get_month_range(parameters)
+        if start > end:
+            raise ValueError("from must not be after to.")
+        return parameters
 
     def execute(self, dataframe, **kwargs):
         """
-        Find the top k earners based on their total commission for a given period
+        Find the top k earners based on their total commission for a given period or range of periods.
+        Commissions are summed by month and earner once per dataframe, and the months of the
+        period are found by binary search in the sorted monthly sums.
         :param dataframe:
         :return:
         """
-        k = kwargs['k']
-        period = kwargs['period']
-        dataframe['Commission_Period'] = pd.to_datetime(dataframe['Commission_Period'], errors='coerce')
-        filtered_df = dataframe[dataframe['Commission_Period'].dt.strftime('%Y-%m') == period]
+        if 'Commission_Month' not in dataframe.columns:
+            dataframe = add_commission_month(dataframe)
+        return self.top_earners(sum_by(dataframe, ['Commission_Month', 'Earner_Name']), **kwargs)
+
+    def load_and_execute(self, store, **kwargs):
+        """
+        Sum the commissions of the requested months by month and earner from the rollup cube,
+        or while streaming the store, without loading it
+        :param store:
+        :return:
+        """
+        monthly = store_sum_by(store, ['Commission_Month', 'Earner_Name'], filters=self.get_filters(kwargs))
+        return self.top_earners(monthly, **kwargs)
 
-        top_earners = filtered_df.groupby('Earner_Name').agg(
-            {'Commission_Amount': 'sum'}
-        ).sort_values('Commission_Amount', ascending=False).head(k)[['Commission_Amount']]
+    def top_earners(self, monthly, **kwargs):
+        """
+        Find the top k earners of the period in commissions summed by month and earner
+        :param monthly: sums indexed by Commission_Month and Earner_Name, sorted by month
+        :return:
+        """
+        first, stop = month_bounds(monthly.index.get_level_values('Commission_Month'), *self.get_month_range(kwargs))
+        top_earners = top_k(monthly.iloc[first:stop].groupby(level='Earner_Name', observed=True).sum(), kwargs['k'])
 
-        print(f'Top {k} earners based on total commission for period {period}:')
-        print(top_earners)
+        self.show(top_earners, **kwargs)
         return top_earners
+
+    def display(self, result, **kwargs):
+        period = kwargs.get('period') or f"{kwargs['from']} to {kwargs['to']}"
+        print(f"Top {kwargs['k']} earners based on total commission for period {period}:")
+        print(result)
@@ -1,3 +1,4 @@
+from src.aggregation import sum_by, store_sum_by, top_k
 from src.command.base_command import Command
 
 
@@ -5,6 +6,8 @@ class FindTopKPlan(Command):
     """
     Find the top K plans based on commission.
     """
+    cacheable = True
+
     @classmethod
     def get_name(cls) -> str:
         return 'find_top_k_plan'
@@ -24,6 +27,10 @@ class FindTopKPlan(Command):
     def get_help_info(cls) -> str:
         return "Find the top K plans based on commission, first parameter is the number of plans to return, type int"
 
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        return ['Plan_Name', 'Commission_Amount']
+
     @classmethod
     def get_parameters(cls, args) -> dict:
         """
@@ -42,10 +49,21 @@ class FindTopKPlan(Command):
         :param dataframe:
         :return:
         """
-        k = kwargs['k']
-        top_plans = dataframe.groupby('Plan_Name').agg(
-            {'Commission_Amount': 'sum'}
-        ).sort_values('Commission_Amount', ascending=False).head(k)[['Commission_Amount']]
-        print(f'Top {k} plans based on total commission:')
-        print(top_plans)
-        return top_plans
\ No newline at end of file
+        top_plans = top_k(sum_by(dataframe, 'Plan_Name'), kwargs['k'])
+        self.show(top_plans, **kwargs)
+        return top_plans
+
+    def load_and_execute(self, store, **kwargs):
+        """
+        Sum the commissions of each plan from the rollup cube, or while streaming the store, without loading it
+        :param store:
+        :return:
+        """
+        sums = store_sum_by(store, 'Plan_Name')
+        top_plans = top_k(sums, kwargs['k'])
+        self.show(top_plans, **kwargs)
+        return top_plans
+
+    def display(self, result, **kwargs):
+        print(f"Top {kwargs['k']} plans based on total commission:")
+        print(result)
@@ -0,0 +1,91 @@
+from src.command.base_command import Command
+
+
+class FindHeavyHitters(Command):
+    """
+    Estimate the earners or agents with the largest total commissions from the Count-Min sketches
+    the uploads maintain.
+    """
+    cacheable = True
+    queries_store = True
+
+    @classmethod
+    def get_name(cls) -> str:
+        return 'heavy_hitters'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return [
+            {'name': 'k', 'type': 'int', 'required': True},
+            {'name': 'column', 'type': 'str', 'required': False, 'help': 'Earner_Name (the default) or Agent_ID'},
+        ]
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return ("Estimate the top K earners or agents by total commission over the whole history "
+                "from Count-Min sketches, without scanning the data")
+
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        from src.sketches import HEAVY_HITTER_COLUMNS, WEIGHT_COLUMN
+        return HEAVY_HITTER_COLUMNS + [WEIGHT_COLUMN]
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        from src.sketches import HEAVY_HITTER_COLUMNS
+
+        k = command_args['k']
+        if k is None or k <= 0:
+            raise ValueError("k must be greater than 0.")
+        column = command_args.get('column') or HEAVY_HITTER_COLUMNS[0]
+        if column not in HEAVY_HITTER_COLUMNS:
+            raise ValueError(f"No heavy-hitter sketch of '{column}', use one of {HEAVY_HITTER_COLUMNS}.")
+        return {'k': k, 'column': column}
+
+    def run_loaded(self, dataframe, store=None, **kwargs):
+        """
+        Read the store's sketches when there is a store, e.g. in a batch or the server,
+        instead of sketching the loaded data again for every request
+        :param dataframe:
+        :param store:
+        :param kwargs:
+        :return:
+        """
+        if store is None:
+            return self.execute(dataframe, **kwargs)
+        with store.lock:
+            return self.load_and_execute(store, **kwargs)
+
+    def load_and_execute(self, store, **kwargs):
+        """
+        Estimate the sums of the persisted candidates, without reading the rows
+        :param store:
+        :return:
+        """
+        from src.sketches import top_hitters
+
+        result = top_hitters(store.sketches.load(kwargs['column']), kwargs['column'], kwargs['k'])
+        self.show(result, **kwargs)
+        return result
+
+    def execute(self, dataframe, sketch_config=None, **kwargs):
+        """
+        Sketch already loaded rows, when there is no store to read the sketches of.
+        :param dataframe:
+        :param sketch_config: 'sketches' section of the store config
+        :return:
+        """
+        from src.sketches import SketchSet, build_sketches, top_hitters
+
+        sketches = build_sketches([dataframe], [kwargs['column']], **SketchSet.options_from_config(sketch_config))
+        result = top_hitters(sketches[kwargs['column']], kwargs['column'], kwargs['k'])
+        self.show(result, **kwargs)
+        return result
+
+    def display(self, result, **kwargs):
+        # negative commissions, e.g. chargebacks, can make an estimate fall short too
+        bounds = [f"{direction}-estimated by at most {bound:,.2f}" for direction, bound
+                  in (('over', result.attrs.get('error')), ('under', result.attrs.get('under_error'))) if bound]
+        print(f"Estimated top {kwargs['k']} {kwargs['column']} by total commission"
+              + (f" (each {' and '.join(bounds)} with high probability):" if bounds else ":"))
+        print(result)
@@ -5,6 +5,8 @@ class ListAllCarriersCommand(Command):
     """
     List all carriers.
     """
+    cacheable = True
+
     @classmethod
     def get_name(cls) -> str:
         return 'list_carriers'
@@ -17,13 +19,21 @@ class ListAllCarriersCommand(Command):
     def get_help_info(cls) -> str:
         return "List all carriers"
 
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        return ['Carrier_Name']
 
-    def execute(self, dataframe):
-        carriers = dataframe['Carrier_Name'].unique()
-        print(f'All carriers:')
-        print(carriers)
+
+    def execute(self, dataframe, **kwargs):
+        # the categorical column would print its categories too
+        carriers = dataframe['Carrier_Name'].astype(object).unique()
+        self.show(carriers)
         return carriers
 
+    def display(self, result, **kwargs):
+        print(f'All carriers:')
+        print(result)
+
     @classmethod
     def get_parameters(cls, command_args):
         return {}
\ No newline at end of file
@@ -0,0 +1,54 @@
+from src.command.base_command import Command
+
+
+class ListUploads(Command):
+    """
+    List the uploads recorded by the ingestion ledger.
+    """
+    @classmethod
+    def get_name(cls) -> str:
+        return 'list_uploads'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return []
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return "List the uploads with their status and inserted, changed, unchanged and deleted rows"
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        return {}
+
+    def run(self, store, cache=None, **kwargs):
+        """
+        The uploads come from the ledger alone, no data is loaded
+        :param store: opened from the store config when None
+        :param cache: result cache, unused
+        :return:
+        """
+        if store is not None:
+            return self.execute(None, store=store, **kwargs)
+        from src.store import open_store
+        store = open_store()
+        try:
+            return self.execute(None, store=store, **kwargs)
+        finally:
+            store.close()
+
+    def execute(self, dataframe, **kwargs):
+        """
+        List the uploads, latest first
+        :param dataframe:
+        :return:
+        """
+        uploads = kwargs['store'].ledger.uploads()
+        self.show(uploads, **kwargs)
+        return uploads
+
+    def display(self, result, **kwargs):
+        if result.empty:
+            print("No uploads recorded.")
+            return
+        print(result.to_string())
@@ -0,0 +1,173 @@
+"""
+Static manifest of the CLI commands.
+The CLI builds its parser from this manifest and only imports the module of the command
+that runs, so startup does not pay for pandas and every command module.
+Each entry must match the name, help info and args of its command class
+(checked by tests/test_command_registry.py). Args of type 'bool' are flags.
+Commands with 'loads_data' False run without opening the store.
+"""
+
+COMMAND_MANIFEST = {
+    'find_top_k_carrier': {
+        'module': 'src.command.find_top_k_carrier',
+        'class': 'FindTopKCarrier',
+        'help': "Find the top K carriers based on commission, "
+                "first parameter is the number of plans to return, type int",
+        'args': [
+            {'name': 'k', 'type': 'int', 'required': True},
+        ],
+    },
+    'find_top_k_earner': {
+        'module': 'src.command.find_top_k_earner',
+        'class': 'FindTopKEarnerByCommissionPeriod',
+        'help': "Find the top K earners based on commission for a given period, "
+                "first parameter is the number of earners to return, type int, "
+                "second parameter is the period of time, type str, "
+                "or --from and --to for an inclusive range of periods, type str",
+        'args': [
+            {'name': 'k', 'type': 'int', 'required': True},
+            {'name': 'period', 'type': 'str', 'required': False},
+            {'name': 'from', 'type': 'str', 'required': False},
+            {'name': 'to', 'type': 'str', 'required': False},
+        ],
+    },
+    'find_top_k_plan': {
+        'module': 'src.command.find_top_k_plan',
+        'class': 'FindTopKPlan',
+        'help': "Find the top K plans based on commission, "
+                "first parameter is the number of plans to return, type int",
+        'args': [
+            {'name': 'k', 'type': 'int', 'required': True},
+        ],
+    },
+    'list_carriers': {
+        'module': 'src.command.list_carriers',
+        'class': 'ListAllCarriersCommand',
+        'help': "List all carriers",
+        'args': [],
+    },
+    'sql_query': {
+        'module': 'src.command.sql_query',
+        'class': 'SqlQuery',
+        'help': "Execute a SQL query on the dataframe",
+        'args': [
+            {'name': 'query', 'type': 'str', 'required': True, 'help': 'SQL query to execute'},
+        ],
+    },
+    'export_csv': {
+        'module': 'src.command.export_csv',
+        'class': 'ExportCsv',
+        'help': "Export the normalized data to the specified path as CSV or Parquet, "
+                "optionally filtered, compressed and partitioned",
+        'args': [
+            {'name': 'path', 'type': 'str', 'required': True},
+            {'name': 'format', 'type': 'str', 'required': False, 'help': 'csv (the default) or parquet'},
+            {'name': 'compression', 'type': 'str', 'required': False, 'help': 'gzip or zstd'},
+            {'name': 'columns', 'type': 'str', 'required': False,
+             'help': 'Comma-separated columns to export, all columns by default'},
+            {'name': 'carrier', 'type': 'str', 'required': False, 'help': 'Comma-separated carriers to export'},
+            {'name': 'from', 'type': 'str', 'required': False, 'help': 'First period to export, YYYY-MM'},
+            {'name': 'to', 'type': 'str', 'required': False, 'help': 'Last period to export, YYYY-MM'},
+            {'name': 'partition_by', 'type': 'str', 'required': False,
+             'help': 'Column to write one file per value of, e.g. Carrier_Name'},
+            {'name': 'workers', 'type': 'int', 'required': False,
+             'help': 'Number of partition files written in parallel'},
+            {'name': 'chunk_size', 'type': 'int', 'required': False, 'help': 'Rows read and written at a time'},
+        ],
+    },
+    'rollup': {
+        'module': 'src.command.rollup',
+        'class': 'Rollup',
+        'help': "Sum the commissions grouped by and filtered on carrier, plan, earner, earner type "
+                "and month, from the rollup cube maintained by the uploads",
+        'args': [
+            {'name': 'by', 'type': 'str', 'required': False,
+             'help': 'Comma-separated dimensions to group by, among Carrier_Name, Plan_Name, Earner_Name, '
+                     'Earner_Type and Commission_Month; the grand total when omitted'},
+            {'name': 'carrier', 'type': 'str', 'required': False, 'help': 'Comma-separated carriers to sum'},
+            {'name': 'plan', 'type': 'str', 'required': False, 'help': 'Comma-separated plans to sum'},
+            {'name': 'earner', 'type': 'str', 'required': False, 'help': 'Comma-separated earners to sum'},
+            {'name': 'earner_type', 'type': 'str', 'required': False,
+             'help': 'Comma-separated earner types to sum'},
+            {'name': 'from', 'type': 'str', 'required': False, 'help': 'First period to sum, YYYY-MM'},
+            {'name': 'to', 'type': 'str', 'required': False, 'help': 'Last period to sum, YYYY-MM'},
+            {'name': 'k', 'type': 'int', 'required': False, 'help': 'Only show the k largest groups'},
+            {'name': 'rebuild', 'type': 'bool', 'required': False,
+             'help': 'Rebuild the cube from the stored rows first'},
+        ],
+    },
+    'distinct_members': {
+        'module': 'src.command.distinct_members',
+        'class': 'CountDistinctMembers',
+        'help': "Estimate the distinct Member_ID per carrier and/or plan from HyperLogLog sketches, "
+                "without scanning the data",
+        'args': [
+            {'name': 'by', 'type': 'str', 'required': False,
+             'help': 'Carrier_Name, Plan_Name or both comma-separated; all members when omitted'},
+            {'name': 'carrier', 'type': 'str', 'required': False, 'help': 'Comma-separated carriers to count'},
+            {'name': 'plan', 'type': 'str', 'required': False, 'help': 'Comma-separated plans to count'},
+        ],
+    },
+    'heavy_hitters': {
+        'module': 'src.command.heavy_hitters',
+        'class': 'FindHeavyHitters',
+        'help': "Estimate the top K earners or agents by total commission over the whole history "
+                "from Count-Min sketches, without scanning the data",
+        'args': [
+            {'name': 'k', 'type': 'int', 'required': True},
+            {'name': 'column', 'type': 'str', 'required': False, 'help': 'Earner_Name (the default) or Agent_ID'},
+        ],
+    },
+    'memory_report': {
+        'module': 'src.command.memory_report',
+        'class': 'MemoryReport',
+        'help': "Report the bytes per column and per row of the normalized data, "
+                "with the compact schema types and with plain object/float64 columns",
+        'args': [],
+    },
+    'cache_stats': {
+        'module': 'src.command.cache_stats',
+        'class': 'CacheStats',
+        'help': "Show the hits, misses, evictions and size of the result cache",
+        'args': [],
+        'loads_data': False,
+    },
+    'parse_cache': {
+        'module': 'src.command.parse_cache',
+        'class': 'ParseCacheCommand',
+        'help': "Show the statistics and workbooks of the parse cache, or clear it",
+        'args': [
+            {'name': 'stats', 'type': 'bool', 'required': False, 'help': 'Show the statistics (the default)'},
+            {'name': 'clear', 'type': 'bool', 'required': False, 'help': 'Remove every cached workbook'},
+        ],
+        'loads_data': False,
+    },
+    'list_uploads': {
+        'module': 'src.command.list_uploads',
+        'class': 'ListUploads',
+        'help': "List the uploads with their status and inserted, changed, unchanged and deleted rows",
+        'args': [],
+        'loads_data': False,
+    },
+    'rollback': {
+        'module': 'src.command.rollback',
+        'class': 'Rollback',
+        'help': "Undo an upload, deleting the rows it inserted and restoring the rows it changed or deleted",
+        'args': [
+            {'name': 'upload_id', 'type': 'int', 'required': True, 'help': 'Id of the upload, see list_uploads'},
+        ],
+        'loads_data': False,
+    },
+    'batch': {
+        'module': 'src.command.batch',
+        'class': 'Batch',
+        'help': "Run the commands listed in a YAML or JSON file against one load of the data",
+        'args': [
+            {'name': 'file', 'type': 'str', 'required': True,
+             'help': 'YAML or JSON list of {command, args} invocations'},
+            {'name': 'output', 'type': 'str', 'required': False,
+             'help': 'JSON file to write the results to, printed when omitted'},
+            {'name': 'workers', 'type': 'int', 'required': False, 'help': 'Number of commands run concurrently'},
+        ],
+    },
+}
@@ -0,0 +1,40 @@
+from src.command.base_command import Command
+from src.schema_types import memory_report
+
+
+class MemoryReport(Command):
+    """
+    Report the in-memory size of the normalized data.
+    """
+    @classmethod
+    def get_name(cls) -> str:
+        return 'memory_report'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return []
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return ("Report the bytes per column and per row of the normalized data, "
+                "with the compact schema types and with plain object/float64 columns")
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        return {}
+
+    def execute(self, dataframe, **kwargs):
+        """
+        Print the memory report of the dataframe
+        :param dataframe:
+        :return:
+        """
+        report = memory_report(dataframe)
+        self.show(report, rows=len(dataframe))
+        return report
+
+    def display(self, result, **kwargs):
+        total = result.loc['Total']
+        print(f"Memory usage of {kwargs['rows']} rows:")
+        print(result.to_string())
+        print(f"Bytes per row: {total['before_bytes_per_row']} before, {total['after_bytes_per_row']} after")
@@ -0,0 +1,66 @@
+from src.command.base_command import Command
+
+
+class ParseCacheCommand(Command):
+    """
+    Show or clear the cache of parsed workbooks.
+    """
+    @classmethod
+    def get_name(cls) -> str:
+        return 'parse_cache'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return [
+            {'name': 'stats', 'type': 'bool', 'required': False, 'help': 'Show the statistics (the default)'},
+            {'name': 'clear', 'type': 'bool', 'required': False, 'help': 'Remove every cached workbook'},
+        ]
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return "Show the statistics and workbooks of the parse cache, or clear it"
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        return {'clear': bool(command_args.get('clear'))}
+
+    def run(self, store, cache=None, **kwargs):
+        """
+        The parse cache is opened from the store config, no data is loaded
+        :param store:
+        :param cache: result cache, unused
+        :return:
+        """
+        from src.parse_cache import ParseCache
+
+        parse_cache = ParseCache.open()
+        try:
+            return self.execute(None, parse_cache=parse_cache, **kwargs)
+        finally:
+            if parse_cache is not None:
+                parse_cache.close()
+
+    def execute(self, dataframe, **kwargs):
+        """
+        Print the cache statistics and workbooks, or clear the cache
+        :param dataframe:
+        :return:
+        """
+        parse_cache = kwargs.get('parse_cache')
+        if parse_cache is None:
+            print("The parse cache is disabled.")
+            return None
+        if kwargs.get('clear'):
+            removed = parse_cache.clear()
+            print(f"Removed {removed} workbooks from the parse cache.")
+            return {'removed': removed}
+
+        stats = parse_cache.stats()
+        print('Parse cache:')
+        for name, value in stats.items():
+            print(f'  {name}: {value}')
+        entries = parse_cache.entries()
+        for entry in entries:
+            print(f"  {entry['key'][:12]}  {entry['rows']:>10} rows  {entry['bytes']:>12} bytes  "
+                  f"{entry['created']}  {entry['source']}")
+        return dict(stats, workbooks=entries)
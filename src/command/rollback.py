@@ -0,0 +1,57 @@
+from src.command.base_command import Command
+
+
+class Rollback(Command):
+    """
+    Roll an upload back through the ingestion ledger.
+    """
+    @classmethod
+    def get_name(cls) -> str:
+        return 'rollback'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return [
+            {'name': 'upload_id', 'type': 'int', 'required': True, 'help': 'Id of the upload, see list_uploads'},
+        ]
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return "Undo an upload, deleting the rows it inserted and restoring the rows it changed or deleted"
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        upload_id = command_args['upload_id']
+        if upload_id is None or upload_id <= 0:
+            raise ValueError("upload_id must be greater than 0.")
+        return {'upload_id': upload_id}
+
+    def run(self, store, cache=None, **kwargs):
+        """
+        Rolls back on the store directly, no data is loaded
+        :param store: opened from the store config when None
+        :param cache: result cache, unused, the rollback bumps the dataset version
+        :return:
+        """
+        if store is not None:
+            return self.execute(None, store=store, **kwargs)
+        from src.store import open_store
+        store = open_store()
+        try:
+            return self.execute(None, store=store, **kwargs)
+        finally:
+            store.close()
+
+    def execute(self, dataframe, **kwargs):
+        """
+        Roll the upload back
+        :param dataframe:
+        :return:
+        """
+        result = kwargs['store'].ledger.rollback(kwargs['upload_id'])
+        self.show(result, **kwargs)
+        return result
+
+    def display(self, result, **kwargs):
+        print(f"Rolled back upload {result['upload_id']}: {result['deleted']} rows deleted, "
+              f"{result['restored']} rows restored.")
@@ -0,0 +1,148 @@
+from src.command.base_command import Command
+from src.commission_month import add_commission_month, parse_period
+
+
+class Rollup(Command):
+    """
+    Sum the commissions over any mix of carrier, plan, earner, earner type and month, read from
+    the rollup cube the uploads maintain instead of the stored rows.
+    """
+    cacheable = True
+    queries_store = True
+    # comma-separated filter arguments and the dimension each one filters
+    FILTER_ARGS = {'carrier': 'Carrier_Name', 'plan': 'Plan_Name', 'earner': 'Earner_Name',
+                   'earner_type': 'Earner_Type'}
+
+    @classmethod
+    def get_name(cls) -> str:
+        return 'rollup'
+
+    @classmethod
+    def get_args(cls) -> list[dict]:
+        return [
+            {'name': 'by', 'type': 'str', 'required': False,
+             'help': 'Comma-separated dimensions to group by, among Carrier_Name, Plan_Name, Earner_Name, '
+                     'Earner_Type and Commission_Month; the grand total when omitted'},
+            {'name': 'carrier', 'type': 'str', 'required': False, 'help': 'Comma-separated carriers to sum'},
+            {'name': 'plan', 'type': 'str', 'required': False, 'help': 'Comma-separated plans to sum'},
+            {'name': 'earner', 'type': 'str', 'required': False, 'help': 'Comma-separated earners to sum'},
+            {'name': 'earner_type', 'type': 'str', 'required': False,
+             'help': 'Comma-separated earner types to sum'},
+            {'name': 'from', 'type': 'str', 'required': False, 'help': 'First period to sum, YYYY-MM'},
+            {'name': 'to', 'type': 'str', 'required': False, 'help': 'Last period to sum, YYYY-MM'},
+            {'name': 'k', 'type': 'int', 'required': False, 'help': 'Only show the k largest groups'},
+            {'name': 'rebuild', 'type': 'bool', 'required': False,
+             'help': 'Rebuild the cube from the stored rows first'},
+        ]
+
+    @classmethod
+    def get_help_info(cls) -> str:
+        return ("Sum the commissions grouped by and filtered on carrier, plan, earner, earner type "
+                "and month, from the rollup cube maintained by the uploads")
+
+    @classmethod
+    def get_columns(cls) -> list[str]:
+        from src.rollup import ROLLUP_DIMENSIONS, ROLLUP_VALUE
+        return ROLLUP_DIMENSIONS + [ROLLUP_VALUE]
+
+    @classmethod
+    def get_filters(cls, parameters) -> list[tuple]:
+        """
+        Only the cells of the requested dimension values and months are read.
+        :param parameters:
+        :return:
+        """
+        filters = [(column, 'in', parameters[name]) for name, column in cls.FILTER_ARGS.items()
+                   if parameters.get(name)]
+        if parameters.get('from'):
+            filters.append(('Commission_Month', '>=', parse_period(parameters['from'])))
+        if parameters.get('to'):
+            filters.append(('Commission_Month', '<=', parse_period(parameters['to'])))
+        return filters
+
+    @classmethod
+    def get_parameters(cls, command_args):
+        from src.rollup import ROLLUP_DIMENSIONS
+
+        parameters = {'by': []}
+        if command_args.get('by'):
+            parameters['by'] = [value.strip() for value in command_args['by'].split(',') if value.strip()]
+        unknown = [dimension for dimension in parameters['by'] if dimension not in ROLLUP_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Cannot group by {unknown}, the dimensions are {ROLLUP_DIMENSIONS}.")
+        for name in cls.FILTER_ARGS:
+            if command_args.get(name):
+                parameters[name] = [value.strip() for value in command_args[name].split(',') if value.strip()]
+        for name in ('from', 'to'):
+            if command_args.get(name):
+                parameters[name] = command_args[name]
+        if parameters.get('from') and parameters.get('to') \
+                and parse_period(parameters['from']) > parse_period(parameters['to']):
+            raise ValueError("from must not be after to.")
+        if command_args.get('k') is not None:
+            if command_args['k'] <= 0:
+                raise ValueError("k must be greater than 0.")
+            parameters['k'] = command_args['k']
+        if command_args.get('rebuild'):
+            parameters['rebuild'] = True
+        return parameters
+
+    def run_loaded(self, dataframe, store=None, **kwargs):
+        """
+        Sum the cells of the store's cube when there is a store, e.g. in a batch or the server,
+        instead of summarizing the loaded data again for every request
+        :param dataframe:
+        :param store:
+        :param kwargs:
+        :return:
+        """
+        if store is None:
+            return self.execute(dataframe, **kwargs)
+        with store.lock:
+            return self.load_and_execute(store, **kwargs)
+
+    def load_and_execute(self, store, **kwargs):
+        """
+        Sum the cells of the cube, which is rebuilt first when it is stale or a rebuild is requested
+        :param store:
+        :return:
+        """
+        if kwargs.get('rebuild'):
+            store.rollup.rebuild()
+        result = self.top(store.rollup.rollup(kwargs['by'], self.get_filters(kwargs)), **kwargs)
+        self.show(result, **kwargs)
+        return result
+
+    def execute(self, dataframe, **kwargs):
+        """
+        Sum already loaded rows the way the cube does, when there is no store to read the cube of.
+        :param dataframe:
+        :return:
+        """
+        from src.rollup import RollupCube, summarize
+        from src.store import apply_filters
+
+        if 'Commission_Month' not in dataframe.columns:
+            dataframe = add_commission_month(dataframe)
+        cells = apply_filters(summarize(dataframe), self.get_filters(kwargs))
+        result = self.top(RollupCube.group(cells, kwargs['by']), **kwargs)
+        self.show(result, **kwargs)
+        return result
+
+    @staticmethod
+    def top(result, **kwargs):
+        """
+        Keep the k largest groups when k is given
+        :param result:
+        :return:
+        """
+        from src.rollup import ROLLUP_VALUE
+
+        if not kwargs.get('k'):
+            return result
+        return result.sort_values(ROLLUP_VALUE, ascending=False).head(kwargs['k'])
+
+    def display(self, result, **kwargs):
+        by = ', '.join(kwargs['by']) or 'total'
+        print(f"Commissions by {by}:")
+        print(result)
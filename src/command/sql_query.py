@@ -1,11 +1,11 @@
 from src.command.base_command import Command
-import pandasql as psql
 
 
 class SqlQuery(Command):
     """
     Execute a SQL query.
     """
+    queries_store = True
 
     @classmethod
     def get_name(cls) -> str:
@@ -37,13 +37,41 @@ class SqlQuery(Command):
         query = args['query']
         return {'query': query}
 
+    def run(self, store, cache=None, **kwargs):
+        """
+        Run the query on the store's SQL engine, without loading the data into pandas
+        :param store:
+        :param cache:
+        :param kwargs:
+        :return:
+        """
+        result = store.query(kwargs['query'])
+        self.show(result, **kwargs)
+        return result
+
+    def run_loaded(self, dataframe, store=None, **kwargs):
+        """
+        Run the query on the store's SQL engine when there is a store, the loaded data is not copied
+        :param dataframe:
+        :param store:
+        :param kwargs:
+        :return:
+        """
+        if store is None:
+            return self.execute(dataframe, **kwargs)
+        return self.run(store, **kwargs)
+
     def execute(self, dataframe, **kwargs):
         """
-        Execute the SQL query
+        Execute the SQL query on a dataframe
         :param dataframe:
         :return:
         """
-        query = kwargs['query']
-        print(f"Executing query: {query}")
-        print(psql.sqldf(query, {"df": dataframe}))
-        return psql.sqldf(query, {"df": dataframe})
\ No newline at end of file
+        import pandasql as psql
+        result = psql.sqldf(kwargs['query'], {"df": dataframe})
+        self.show(result, **kwargs)
+        return result
+
+    def display(self, result, **kwargs):
+        print(f"Executing query: {kwargs['query']}")
+        print(result)
@@ -0,0 +1,44 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from src.date_parser import parse_dates
+
+_PERIOD_PATTERN = re.compile(r'^\s*(\d{4})-(\d{1,2})')
+
+
+def add_commission_month(df):
+    """
+    Derive the integer year-month key (e.g. 202406) used to partition and filter by period.
+    :param df:
+    :return: dataframe with a nullable 'Commission_Month' column
+    """
+    if 'Commission_Period' not in df.columns:
+        return df
+    period = parse_dates(df['Commission_Period'])
+    return df.assign(Commission_Month=(period.dt.year * 100 + period.dt.month).astype('Int64'))
+
+
+def parse_period(period):
+    """
+    Convert a 'YYYY-MM' period (a full date such as '2024-06-30' is accepted) to its Commission_Month key.
+    :param period:
+    :return: e.g. 202406
+    """
+    match = _PERIOD_PATTERN.match(str(period))
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"Invalid period '{period}', expected YYYY-MM.")
+    return int(match.group(1)) * 100 + int(match.group(2))
+
+
+def month_bounds(months, start, end):
+    """
+    Find the positions of the months within [start, end] in sorted month keys by binary search.
+    :param months: sorted Commission_Month keys
+    :param start: first month key, e.g. 202401
+    :param end: last month key, e.g. 202406
+    :return: (first, stop) positions, months[first:stop] are the months of the range
+    """
+    months = np.asarray(months, dtype='float64')
+    return int(np.searchsorted(months, start, side='left')), int(np.searchsorted(months, end, side='right'))
@@ -0,0 +1,168 @@
+import datetime
+import logging
+
+import numpy as np
+import pandas as pd
+
+# formats tried in order when a column has no configured format, the first format
+# parsing the most sampled values wins
+CANDIDATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d',
+    '%Y-%m-%dT%H:%M:%S',
+    '%m/%d/%Y',
+    '%m/%d/%y',
+    '%m/%Y',
+    '%Y-%m',
+    '%Y%m%d',
+    '%d-%b-%Y',
+    '%b %Y',
+)
+SAMPLE_SIZE = 64
+# distinct values remembered per column across the chunks of an upload
+MAX_MEMO_SIZE = 100_000
+
+
+def detect_format(values):
+    """
+    Detect the strftime format of date strings from a sample of their distinct values.
+    :param values: distinct date strings
+    :return: None if no candidate format parses any of them
+    """
+    sample = pd.Series(list(values)[:SAMPLE_SIZE], dtype=object)
+    if sample.empty:
+        return None
+    best_format, best_count = None, 0
+    for date_format in CANDIDATE_FORMATS:
+        count = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+            if count == len(sample):
+                break
+    return best_format
+
+
+class DateParser:
+    """
+    Parse date columns once per upload.
+    Each column is parsed through its distinct values: a commission file has many rows but few
+    distinct dates, so each distinct value is parsed once and the results are mapped back to the rows.
+    The format of a column comes from the 'date_formats' of the carrier config, e.g.
+
+        date_formats:
+          Period: '%m/%Y'
+
+    or is detected once from the first values of the column. Values the detected format cannot parse
+    fall back to pandas' per-value inference; with a configured format they become NaT.
+    Parsed values are remembered across the chunks of an upload.
+    """
+    def __init__(self, formats=None, columns=()):
+        """
+        :param formats: dict of source column to strftime format
+        :param columns: further source columns to parse as dates, whatever their name
+        """
+        self.formats = dict(formats or {})
+        self.columns = set(columns) | set(self.formats)
+        self._memo = {}
+
+    @classmethod
+    def from_config(cls, config, data_types=None):
+        """
+        Create the parser of a carrier config.
+        date_formats keys may name a source column or the fixed schema column it is mapped to.
+        Source columns mapped to a datetime schema column are parsed too.
+        :param config: carrier config
+        :param data_types: fixed_schema_data_types of the schema config
+        :return:
+        """
+        mappings = (config or {}).get('mappings') or {}
+        formats = {}
+        for column, date_format in ((config or {}).get('date_formats') or {}).items():
+            source = mappings.get(column)
+            formats[source if isinstance(source, str) else column] = date_format
+        columns = [source for column, source in mappings.items()
+                   if isinstance(source, str) and (data_types or {}).get(column) == 'datetime']
+        return cls(formats, columns)
+
+    def is_date_column(self, column):
+        """
+        Whether a source column holds dates: configured, or named like a date or a period.
+        :param column:
+        :return:
+        """
+        name = str(column).lower()
+        return column in self.columns or 'date' in name or 'period' in name
+
+    def parse(self, series, column=None):
+        """
+        Parse a column to datetime64, unparseable values becoming NaT.
+        :param series:
+        :param column: source column name, selecting the configured format and the memo
+        :return:
+        """
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        if not pd.api.types.is_object_dtype(series) and not pd.api.types.is_string_dtype(series):
+            return pd.to_datetime(series, errors='coerce')
+
+        codes, uniques = pd.factorize(series)
+        memo = self._memo.setdefault(column, {})
+        new_values = [value for value in uniques if value not in memo]
+        if new_values:
+            if len(memo) + len(new_values) > MAX_MEMO_SIZE:
+                memo.clear()
+            memo.update(zip(new_values, self._parse_distinct(new_values, column)))
+        # code -1 (missing) takes the NaT appended last
+        parsed = pd.DatetimeIndex([memo[value] for value in uniques] + [pd.NaT])
+        return pd.Series(parsed.take(codes), index=series.index, name=series.name)
+
+    def _parse_distinct(self, values, column):
+        """
+        Parse distinct raw values, dates and datetimes read from Excel are kept as they are.
+        :param values:
+        :param column:
+        :return: DatetimeIndex aligned with values
+        """
+        values = pd.Series(values, dtype=object)
+        is_text = values.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+        parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+        if (~is_text).any():
+            others = values[~is_text]
+            is_date = others.map(lambda value: isinstance(value, (datetime.date, np.datetime64))).to_numpy(dtype=bool)
+            parsed[others.index] = pd.to_datetime(others.where(is_date, None), errors='coerce')
+            if (~is_date).any():
+                # numbers in a date column, converted as pandas does
+                parsed[others.index[~is_date]] = pd.to_datetime(
+                    pd.to_numeric(others[~is_date], errors='coerce'), errors='coerce')
+        if is_text.any():
+            parsed[values.index[is_text]] = self._parse_text(values[is_text].str.strip(), column).to_numpy()
+        return pd.DatetimeIndex(parsed)
+
+    def _parse_text(self, strings, column):
+        date_format = self.formats.get(column)
+        if date_format:
+            parsed = pd.to_datetime(strings, format=date_format, errors='coerce')
+            failed = parsed.isna() & strings.ne('')
+            if failed.any():
+                logging.warning(f"{failed.sum()} distinct values of '{column}' do not match the "
+                                f"format '{date_format}': {strings[failed].head(3).tolist()}")
+            return parsed
+
+        date_format = detect_format(strings[strings.ne('')])
+        if date_format is None:
+            parsed = pd.Series(pd.NaT, index=strings.index, dtype='datetime64[ns]')
+        else:
+            parsed = pd.to_datetime(strings, format=date_format, errors='coerce')
+        remaining = parsed.isna() & strings.ne('')
+        if remaining.any():
+            parsed[remaining] = pd.to_datetime(strings[remaining], format='mixed', errors='coerce')
+        return parsed
+
+
+def parse_dates(series):
+    """
+    Parse a column to datetime64 through its distinct values, detecting its format.
+    :param series:
+    :return:
+    """
+    return DateParser().parse(series)
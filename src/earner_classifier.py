@@ -0,0 +1,79 @@
+import functools
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import yaml
+
+DEFAULT_EARNER_TYPE = 'Agent'
+
+
+class EarnerTypeClassifier:
+    """
+    Classify earner names into earner types.
+    The names listed for each type are compiled once into a single regex per type.
+    Types are checked in the order of the lookup, the first type with a name contained
+    in the earner name wins, and names matching no type get the default type.
+    """
+    _cache = {}
+
+    def __init__(self, lookup, default_type=DEFAULT_EARNER_TYPE, memo_size=65_536):
+        self.default_type = default_type
+        self.patterns = []
+        for earner_type, names in (lookup or {}).items():
+            names = [str(name).lower().strip() for name in names or []]
+            names = sorted({name for name in names if name}, key=len, reverse=True)
+            if names:
+                self.patterns.append((earner_type, re.compile('|'.join(map(re.escape, names)))))
+        self.earner_types = [earner_type for earner_type, _ in self.patterns]
+        if default_type not in self.earner_types:
+            self.earner_types.append(default_type)
+        self.classify_name = functools.lru_cache(maxsize=memo_size)(self._classify_name)
+
+    @classmethod
+    def load(cls, path='config/earner_type_dict.yaml'):
+        """
+        Load the classifier compiled from an earner type dictionary.
+        Compiled classifiers are cached until the file changes.
+        :param path:
+        :return:
+        """
+        try:
+            cache_key = (os.path.abspath(path), os.path.getmtime(path))
+        except OSError as e:
+            logging.error(f"Error loading YAML file: {e}")
+            return cls({})
+        if cache_key not in cls._cache:
+            with open(path, 'r') as file:
+                config = yaml.safe_load(file) or {}
+            cls._cache[cache_key] = cls(config.get('earner_type_lookup', {}),
+                                        config.get('default_earner_type', DEFAULT_EARNER_TYPE))
+        return cls._cache[cache_key]
+
+    def _classify_name(self, name):
+        """
+        Classify a single earner name.
+        :param name:
+        :return:
+        """
+        name = str(name).lower().strip()
+        for earner_type, pattern in self.patterns:
+            if pattern.search(name):
+                return earner_type
+        return self.default_type
+
+    def classify(self, names):
+        """
+        Classify a column of earner names.
+        Each distinct name is classified once and the result is mapped back by category code.
+        :param names:
+        :return: categorical series of earner types
+        """
+        codes, uniques = pd.factorize(names)
+        type_codes = {earner_type: code for code, earner_type in enumerate(self.earner_types)}
+        unique_type_codes = np.array([type_codes[self.classify_name(name)] for name in uniques]
+                                     + [type_codes[self.default_type]], dtype=np.int32)
+        return pd.Series(pd.Categorical.from_codes(unique_type_codes[codes], categories=self.earner_types),
+                         index=names.index)
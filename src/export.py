@@ -0,0 +1,205 @@
+import gzip
+import io
+import os
+from urllib.parse import quote
+
+import pandas as pd
+
+from src import tracing
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output and zstd compression are disabled without pyarrow
+    pa = pq = None
+
+EXPORT_FORMATS = ('csv', 'parquet')
+COMPRESSIONS = ('gzip', 'zstd')
+_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet'}
+_COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+DEFAULT_FILE_NAME = 'exported_data'
+DEFAULT_PART_NAME = 'data'
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def file_name(name, file_format='csv', compression=None):
+    """
+    Name an export file after its format and compression, e.g. data.csv.gz.
+    Parquet files compress their pages, so their name has no compression suffix.
+    :param name:
+    :param file_format:
+    :param compression:
+    :return:
+    """
+    name += _EXTENSIONS[file_format]
+    if file_format == 'csv' and compression:
+        name += _COMPRESSION_EXTENSIONS[compression]
+    return name
+
+
+def check_format(file_format, compression):
+    """
+    Validate an export format and compression.
+    :param file_format: 'csv' or 'parquet'
+    :param compression: None, 'gzip' or 'zstd'
+    :return:
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{file_format}', use one of {list(EXPORT_FORMATS)}.")
+    if compression and compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}', use one of {list(COMPRESSIONS)}.")
+    if pa is None and (file_format == 'parquet' or compression == 'zstd'):
+        raise ImportError("Parquet output and zstd compression require pyarrow, install it with 'pip install pyarrow'.")
+
+
+def _open_text(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    if compression == 'zstd':
+        return io.TextIOWrapper(pa.CompressedOutputStream(path, 'zstd'), encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def write_csv(chunks, path, compression=None):
+    """
+    Stream chunks into one CSV file, writing the header once.
+    :param chunks: iterable of dataframes with the same columns
+    :param path:
+    :param compression: None, 'gzip' or 'zstd'
+    :return: number of rows written
+    """
+    rows = 0
+    with _open_text(path, compression) as file:
+        for chunk in chunks:
+            with tracing.span('export.write', rows=len(chunk)):
+                chunk.to_csv(file, index=False, header=rows == 0)
+            rows += len(chunk)
+    return rows
+
+
+def _arrow_table(chunk, schema):
+    """
+    Convert a chunk to Arrow, following the schema of the first chunk; columns whose values
+    were all missing in the first chunk are written as strings.
+    :param chunk:
+    :param schema: None for the first chunk
+    :return:
+    """
+    if schema is not None:
+        return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    fields = [pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+              for field in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+
+def write_parquet(chunks, path, compression=None):
+    """
+    Stream chunks into one Parquet file, one row group per chunk.
+    :param chunks: iterable of dataframes with the same columns
+    :param path:
+    :param compression: None for Arrow's default (snappy), 'gzip' or 'zstd'
+    :return: number of rows written
+    """
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            with tracing.span('export.write', rows=len(chunk)):
+                table = _arrow_table(chunk, writer.schema if writer else None)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression=compression or 'snappy')
+                writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_chunks(chunks, path, file_format='csv', compression=None):
+    """
+    Stream chunks into one export file, written next to its final path and moved into place once complete.
+    Filters matching no rows write an empty CSV file and no Parquet file.
+    :param chunks: iterable of dataframes
+    :param path:
+    :param file_format: 'csv' or 'parquet'
+    :param compression: None, 'gzip' or 'zstd'
+    :return: number of rows written
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path) or '.', f'.{os.path.basename(path)}.tmp')
+    try:
+        if file_format == 'parquet':
+            rows = write_parquet(chunks, tmp_path, compression)
+        else:
+            rows = write_csv(chunks, tmp_path, compression)
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def partition_dir(path, column, value):
+    """
+    Directory of one partition of a partitioned export, named like the parquet store's partitions.
+    :param path: export directory
+    :param column: partition column
+    :param value:
+    :return: e.g. <path>/Carrier_Name=emblem
+    """
+    segment = NULL_PARTITION if pd.isna(value) else quote(str(value), safe='')
+    return os.path.join(path, f'{column}={segment}')
+
+
+def export_partitions(store, path, partition_by, columns=None, filters=None, file_format='csv',
+                      compression=None, chunk_size=None, workers=None):
+    """
+    Export one file per value of a column, each streamed from the store by its own worker thread:
+        <path>/<column>=<value>/data.<format>
+    The partition column is kept in the directory names and left out of the files, as in hive layouts.
+    :param store:
+    :param path: export directory
+    :param partition_by: column to partition by, e.g. Carrier_Name
+    :param columns: columns to export, None for all columns
+    :param filters: (column, operator, value) filters
+    :param file_format: 'csv' or 'parquet'
+    :param compression: None, 'gzip' or 'zstd'
+    :param chunk_size: rows per streamed chunk
+    :param workers: number of partitions written concurrently, defaults to one per CPU core
+    :return: (number of rows written, list of written files)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from src.store import DEFAULT_BATCH_SIZE
+
+    chunk_size = chunk_size or DEFAULT_BATCH_SIZE
+    values = store.load(columns=[partition_by], filters=filters)[partition_by]
+    if values.empty:
+        return 0, []
+    keys = values.dropna().drop_duplicates().tolist()
+    has_missing = bool(values.isna().any())
+    if columns:
+        columns = [col for col in columns if col != partition_by] + [partition_by]
+
+    def export_partition(value):
+        if pd.isna(value):
+            # filters cannot select missing values, the rows are filtered while streaming
+            chunks = (chunk[chunk[partition_by].isna()]
+                      for chunk in store.iter_chunks(columns=columns, filters=filters, chunk_size=chunk_size))
+        else:
+            chunks = store.iter_chunks(columns=columns, filters=list(filters or []) + [(partition_by, '==', value)],
+                                       chunk_size=chunk_size)
+        file_path = os.path.join(partition_dir(path, partition_by, value),
+                                 file_name(DEFAULT_PART_NAME, file_format, compression))
+        with tracing.span('export.partition', partition=str(value)) as span:
+            rows = write_chunks((chunk.drop(columns=partition_by) for chunk in chunks), file_path,
+                                file_format, compression)
+            span.set(rows=rows)
+        return rows, file_path
+
+    partitions = keys + ([None] if has_missing else [])
+    workers = min(workers or os.cpu_count() or 1, len(partitions))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(export_partition, partitions))
+    return sum(rows for rows, _ in results), [file_path for _, file_path in results]
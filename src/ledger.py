@@ -0,0 +1,315 @@
+import hashlib
+import logging
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import tracing
+from src.store import VERSION_COLUMN
+
+# columns derived by the store, left out of the row hashes
+DERIVED_COLUMNS = (VERSION_COLUMN, 'Commission_Month')
+# rows per snapshot of superseded rows
+SNAPSHOT_SIZE = 50_000
+_READ_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """
+    Hash the content of a file.
+    :param path:
+    :return: hex digest, None if the file cannot be read
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as file:
+            while block := file.read(_READ_BLOCK_SIZE):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """
+    Hash the content of each normalized row, every column but the key and the derived ones.
+    :param df:
+    :return: numpy array of signed 64-bit hashes, as SQLite stores them
+    """
+    columns = sorted(col for col in df.columns if col != 'Primary_Key' and col not in DERIVED_COLUMNS)
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashes.view(np.int64)
+
+
+class IngestionLedger:
+    """
+    Record of the uploads applied to a store, kept in SQLite tables next to the data:
+        ingestion_uploads    one row per uploaded file: source, file hash, config and row counts
+        ingestion_rows       the upload, source file and content hash of every stored Primary_Key
+        ingestion_changes    the keys each upload inserted, changed or deleted, with their previous state
+        ingestion_snapshots  the stored rows each upload changed or deleted, pickled
+    An upload only writes the rows whose content hash is new or changed, and deletes the rows its
+    source file delivered before but no longer contains, so re-sending a corrected statement costs
+    in proportion to its corrections. Rolling an upload back deletes the rows it inserted and
+    restores the rows it changed or deleted from their snapshots.
+    Rows stored without the ledger, e.g. before it existed, are tracked as a 'baseline' upload.
+    """
+    def __init__(self, store, conn):
+        """
+        :param store: store the uploads are applied to
+        :param conn: SQLite connection holding the ledger tables
+        """
+        self.store = store
+        self.conn = conn
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "ingestion_uploads" '
+                              '("upload_id" INTEGER PRIMARY KEY AUTOINCREMENT, "source" TEXT, "file_hash" TEXT, '
+                              '"config" TEXT, "config_hash" TEXT, "created" REAL, "status" TEXT, "rows" INTEGER, '
+                              '"inserted" INTEGER, "changed" INTEGER, "unchanged" INTEGER, "deleted" INTEGER)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "ingestion_rows" '
+                              '("Primary_Key" PRIMARY KEY, "source" TEXT, "row_hash" INTEGER, "upload_id" INTEGER)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "idx_ingestion_rows_source" ON "ingestion_rows" ("source")')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "ingestion_changes" '
+                              '("upload_id" INTEGER, "Primary_Key", "action" TEXT, "previous_hash" INTEGER, '
+                              '"previous_upload_id" INTEGER, "previous_source" TEXT)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "idx_ingestion_changes_upload" '
+                              'ON "ingestion_changes" ("upload_id")')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "idx_ingestion_changes_key" '
+                              'ON "ingestion_changes" ("Primary_Key")')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "ingestion_snapshots" '
+                              '("upload_id" INTEGER, "part" INTEGER, "rows" BLOB)')
+
+    def ingest(self, chunks, source, config_path=None):
+        """
+        Apply the normalized chunks of one uploaded file.
+        :param chunks: iterable of normalized dataframes
+        :param source: path of the uploaded file, files with the same name replace each other's rows
+        :param config_path: carrier config the file was normalized with
+        :return: dict of the upload id and its inserted, changed, unchanged and deleted row counts
+        """
+        self._track_untracked_rows()
+        source_name = os.path.basename(source)
+        with self.conn:
+            upload_id = self.conn.execute(
+                'INSERT INTO "ingestion_uploads" ("source", "file_hash", "config", "config_hash", "created", '
+                '"status") VALUES (?, ?, ?, ?, ?, \'pending\')',
+                (source_name, file_sha256(source), config_path,
+                 file_sha256(config_path) if config_path else None, time.time())).lastrowid
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS "ingestion_seen" ("Primary_Key" PRIMARY KEY)')
+            self.conn.execute('DELETE FROM temp."ingestion_seen"')
+
+        counts = {'rows': 0, 'inserted': 0, 'changed': 0, 'unchanged': 0, 'deleted': 0}
+        try:
+            self.store.upsert_chunks(self._delta_chunks(chunks, upload_id, source_name, counts))
+            if counts['rows']:
+                counts['deleted'] = self._delete_missing_rows(upload_id, source_name)
+            else:
+                logging.warning(f"No rows uploaded from '{source_name}', the rows of its earlier uploads are kept.")
+        except BaseException:
+            with self.conn:
+                self.conn.execute('UPDATE "ingestion_uploads" SET "status" = \'failed\' WHERE "upload_id" = ?',
+                                  (upload_id,))
+            raise
+        with self.conn:
+            self.conn.execute('UPDATE "ingestion_uploads" SET "status" = \'applied\', "rows" = ?, "inserted" = ?, '
+                              '"changed" = ?, "unchanged" = ?, "deleted" = ? WHERE "upload_id" = ?',
+                              (counts['rows'], counts['inserted'], counts['changed'], counts['unchanged'],
+                               counts['deleted'], upload_id))
+        return dict(counts, upload_id=upload_id, source=source_name)
+
+    def _delta_chunks(self, chunks, upload_id, source, counts):
+        """
+        Classify the rows of each chunk against the ledger and pass on the rows to write.
+        :return: generator of the inserted and changed rows of each chunk
+        """
+        for chunk in chunks:
+            with tracing.span('ledger.classify', rows=len(chunk)) as span:
+                chunk = chunk.drop_duplicates(subset='Primary_Key', keep='last')
+                keys = chunk['Primary_Key'].tolist()
+                hashes = row_hashes(chunk)
+                self.conn.executemany('INSERT OR IGNORE INTO temp."ingestion_seen" VALUES (?)',
+                                      ((key,) for key in keys))
+                previous = self._previous_state(keys)
+
+                known = previous['known'].to_numpy(dtype=bool)
+                unchanged = known & (previous['row_hash'].to_numpy() == hashes)
+                # rows already written by this upload, from an earlier chunk, have no previous state to keep
+                rewritten = known & ~unchanged & (previous['upload_id'].to_numpy() == upload_id)
+                inserted = ~known
+                changed = known & ~unchanged & ~rewritten
+                write = ~unchanged
+
+                self._record_changes(upload_id, previous[inserted | changed], np.where(inserted, 'inserted', 'changed')
+                                     [inserted | changed])
+                self._snapshot(upload_id, [key for key, is_changed in zip(keys, changed) if is_changed])
+                self.conn.executemany('INSERT OR REPLACE INTO "ingestion_rows" VALUES (?, ?, ?, ?)',
+                                      ((key, source, int(row_hash), upload_id)
+                                       for key, row_hash, is_written in zip(keys, hashes, write) if is_written))
+
+                counts['rows'] += len(chunk)
+                counts['inserted'] += int(inserted.sum())
+                counts['changed'] += int(changed.sum())
+                counts['unchanged'] += int(unchanged.sum())
+                span.set(written=int(write.sum()))
+            if write.any():
+                yield chunk[write]
+
+    def _previous_state(self, keys):
+        """
+        Look up the ledger state of keys.
+        :param keys:
+        :return: dataframe aligned with keys: Primary_Key, known, row_hash, upload_id, source
+        """
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS "ingestion_incoming" '
+                          '("position" INTEGER PRIMARY KEY, "Primary_Key")')
+        self.conn.execute('DELETE FROM temp."ingestion_incoming"')
+        self.conn.executemany('INSERT INTO temp."ingestion_incoming" VALUES (?, ?)', enumerate(keys))
+        rows = self.conn.execute('SELECT i."Primary_Key", r."Primary_Key" IS NOT NULL, r."row_hash", r."upload_id", '
+                                 'r."source" FROM temp."ingestion_incoming" AS i '
+                                 'LEFT JOIN "ingestion_rows" AS r ON r."Primary_Key" = i."Primary_Key" '
+                                 'ORDER BY i."position"').fetchall()
+        return pd.DataFrame(rows, columns=['Primary_Key', 'known', 'row_hash', 'upload_id', 'source'])
+
+    def _record_changes(self, upload_id, previous, actions):
+        self.conn.executemany(
+            'INSERT INTO "ingestion_changes" VALUES (?, ?, ?, ?, ?, ?)',
+            ((upload_id, key, action, None if pd.isna(row_hash) else int(row_hash),
+              None if pd.isna(previous_upload) else int(previous_upload), previous_source)
+             for (key, row_hash, previous_upload, previous_source), action
+             in zip(previous[['Primary_Key', 'row_hash', 'upload_id', 'source']].itertuples(index=False), actions)))
+
+    def _snapshot(self, upload_id, keys):
+        """
+        Keep the stored rows of keys an upload is about to change or delete.
+        :param upload_id:
+        :param keys:
+        :return:
+        """
+        for start in range(0, len(keys), SNAPSHOT_SIZE):
+            rows = self.store.load_keys(keys[start:start + SNAPSHOT_SIZE])
+            if rows.empty:
+                continue
+            part = self.conn.execute('SELECT COUNT(*) FROM "ingestion_snapshots" WHERE "upload_id" = ?',
+                                     (upload_id,)).fetchone()[0]
+            self.conn.execute('INSERT INTO "ingestion_snapshots" VALUES (?, ?, ?)',
+                              (upload_id, part, pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def _delete_missing_rows(self, upload_id, source):
+        """
+        Delete the rows an earlier upload of the same source delivered and this upload no longer contains.
+        :param upload_id:
+        :param source:
+        :return: number of deleted rows
+        """
+        with tracing.span('ledger.delete') as span:
+            previous = pd.DataFrame(
+                self.conn.execute('SELECT "Primary_Key", "row_hash", "upload_id", "source" FROM "ingestion_rows" '
+                                  'WHERE "source" = ? AND "Primary_Key" NOT IN '
+                                  '(SELECT "Primary_Key" FROM temp."ingestion_seen")', (source,)).fetchall(),
+                columns=['Primary_Key', 'row_hash', 'upload_id', 'source'])
+            span.set(rows=len(previous))
+            if previous.empty:
+                return 0
+            keys = previous['Primary_Key'].tolist()
+            with self.conn:
+                self._record_changes(upload_id, previous, ['deleted'] * len(previous))
+                self._snapshot(upload_id, keys)
+                self.conn.executemany('DELETE FROM "ingestion_rows" WHERE "Primary_Key" = ?', ((key,) for key in keys))
+            self.store.delete_keys(keys)
+            return len(keys)
+
+    def _track_untracked_rows(self):
+        """
+        Track the stored rows the ledger does not know, e.g. stored before the ledger existed,
+        as a 'baseline' upload that cannot be rolled back; forget the rows no longer stored.
+        Only runs when the row counts of the ledger and the store differ.
+        :return:
+        """
+        tracked = self.conn.execute('SELECT COUNT(*) FROM "ingestion_rows"').fetchone()[0]
+        if tracked == self.store.count():
+            return
+        stored_keys = self.store.load(columns=['Primary_Key'])['Primary_Key'].tolist()
+        with self.conn:
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS "ingestion_stored" ("Primary_Key" PRIMARY KEY)')
+            self.conn.execute('DELETE FROM temp."ingestion_stored"')
+            self.conn.executemany('INSERT OR IGNORE INTO temp."ingestion_stored" VALUES (?)',
+                                  ((key,) for key in stored_keys))
+            self.conn.execute('DELETE FROM "ingestion_rows" WHERE "Primary_Key" NOT IN '
+                              '(SELECT "Primary_Key" FROM temp."ingestion_stored")')
+            baseline_id = self.conn.execute('INSERT INTO "ingestion_uploads" ("created", "status") '
+                                            'VALUES (?, \'baseline\')', (time.time(),)).lastrowid
+            added = self.conn.execute('INSERT OR IGNORE INTO "ingestion_rows" ("Primary_Key", "upload_id") '
+                                      'SELECT "Primary_Key", ? FROM temp."ingestion_stored"', (baseline_id,)).rowcount
+            self.conn.execute('UPDATE "ingestion_uploads" SET "rows" = ?, "inserted" = ? WHERE "upload_id" = ?',
+                              (added, added, baseline_id))
+            self.conn.execute('DELETE FROM temp."ingestion_stored"')
+        logging.info(f"Tracking {added} rows stored without the ingestion ledger as upload {baseline_id}.")
+
+    def rollback(self, upload_id):
+        """
+        Undo an upload: delete the rows it inserted and restore the rows it changed or deleted.
+        Uploads whose rows were changed again by a later upload must wait for that upload's rollback.
+        :param upload_id:
+        :return: dict of the deleted and restored row counts
+        """
+        row = self.conn.execute('SELECT "status" FROM "ingestion_uploads" WHERE "upload_id" = ?',
+                                (upload_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Upload {upload_id} not found.")
+        if row[0] not in ('applied', 'failed', 'pending'):
+            raise ValueError(f"Upload {upload_id} cannot be rolled back, its status is '{row[0]}'.")
+        later = [later_id for (later_id,) in self.conn.execute(
+            'SELECT DISTINCT later."upload_id" FROM "ingestion_changes" AS own '
+            'JOIN "ingestion_changes" AS later ON later."Primary_Key" = own."Primary_Key" '
+            'JOIN "ingestion_uploads" AS upload ON upload."upload_id" = later."upload_id" '
+            'WHERE own."upload_id" = ? AND later."upload_id" > ? AND upload."status" != \'rolled_back\' '
+            'ORDER BY later."upload_id"', (upload_id, upload_id)).fetchall()]
+        if later:
+            raise ValueError(f"Rows of upload {upload_id} were changed by the later uploads {later}, "
+                             f"roll those back first.")
+
+        changes = pd.DataFrame(
+            self.conn.execute('SELECT "Primary_Key", "action", "previous_hash", "previous_upload_id", '
+                              '"previous_source" FROM "ingestion_changes" WHERE "upload_id" = ?',
+                              (upload_id,)).fetchall(),
+            columns=['Primary_Key', 'action', 'previous_hash', 'previous_upload_id', 'previous_source'])
+        inserted = changes.loc[changes['action'] == 'inserted', 'Primary_Key'].tolist()
+        restored = changes[changes['action'] != 'inserted']
+        snapshots = [pickle.loads(blob) for (blob,) in self.conn.execute(
+            'SELECT "rows" FROM "ingestion_snapshots" WHERE "upload_id" = ? ORDER BY "part"', (upload_id,))]
+
+        with tracing.span('ledger.rollback', rows=len(changes)):
+            if inserted:
+                self.store.delete_keys(inserted)
+            if snapshots:
+                self.store.upsert_chunks(snapshots)
+            with self.conn:
+                self.conn.executemany('DELETE FROM "ingestion_rows" WHERE "Primary_Key" = ?',
+                                      ((key,) for key in inserted))
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO "ingestion_rows" VALUES (?, ?, ?, ?)',
+                    ((key, source, None if pd.isna(row_hash) else int(row_hash),
+                      None if pd.isna(previous_upload) else int(previous_upload))
+                     for key, row_hash, previous_upload, source
+                     in restored[['Primary_Key', 'previous_hash', 'previous_upload_id',
+                                  'previous_source']].itertuples(index=False)))
+                self.conn.execute('DELETE FROM "ingestion_snapshots" WHERE "upload_id" = ?', (upload_id,))
+                self.conn.execute('UPDATE "ingestion_uploads" SET "status" = \'rolled_back\' WHERE "upload_id" = ?',
+                                  (upload_id,))
+        return {'upload_id': upload_id, 'deleted': len(inserted), 'restored': sum(len(rows) for rows in snapshots)}
+
+    def uploads(self):
+        """
+        List the uploads, latest first.
+        :return: dataframe
+        """
+        rows = self.conn.execute('SELECT "upload_id", "source", "status", "created", "rows", "inserted", "changed", '
+                                 '"unchanged", "deleted", "config" FROM "ingestion_uploads" '
+                                 'ORDER BY "upload_id" DESC').fetchall()
+        uploads = pd.DataFrame(rows, columns=['upload_id', 'source', 'status', 'created', 'rows', 'inserted',
+                                              'changed', 'unchanged', 'deleted', 'config'])
+        uploads['created'] = pd.to_datetime(uploads['created'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
+        return uploads.set_index('upload_id')
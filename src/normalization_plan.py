@@ -0,0 +1,118 @@
+import hashlib
+import json
+import logging
+import threading
+
+# lineage columns the readers add to the raw rows, e.g. the sheet of a multi-sheet workbook;
+# they are kept as they are and left out of the Primary_Key
+LINEAGE_COLUMNS = ('Source_Sheet',)
+
+
+def config_hash(*configs):
+    """
+    Hash configs by their content, so equal configs loaded from different files share a hash.
+    :param configs: carrier and schema configs
+    :return: hex digest
+    """
+    text = json.dumps(configs, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class NormalizationPlan:
+    """
+    A carrier config compiled against the fixed schema.
+    The plan knows up front which source columns the normalizer uses, so the reader only reads
+    those (usecols), and resolves each fixed schema column to the source column it is renamed
+    from, the source columns merged into it, or nothing (NA), which apply_config then builds as
+    one projection. Earner_Type is always classified from Earner_Name, so its mapping is not read.
+    Plans are cached by the hash of the two configs, every chunk and upload of a carrier reuses one.
+    """
+    _cache = {}
+    _lock = threading.Lock()
+
+    def __init__(self, config, schema_config):
+        if config.get('Primary_Key'):
+            raise ValueError("No primary key found or mapped.")
+        mappings = config.get('mappings') or {}
+        self.fixed_schema = list(schema_config['fixed_schema'])
+        self.data_types = dict(schema_config.get('fixed_schema_data_types') or {})
+        self.sources = {}
+        for fixed_attr in self.fixed_schema:
+            if fixed_attr in mappings and fixed_attr not in ('Primary_Key', 'Earner_Type'):
+                source = mappings[fixed_attr]
+                self.sources[fixed_attr] = list(source) if isinstance(source, list) else source
+        self.hash = config_hash(config, schema_config)
+        self._resolved = {}
+
+        used = set()
+        for fixed_attr, source in self.sources.items():
+            if isinstance(source, list):
+                used.update(source)
+                print(f"Merged {source} into '{fixed_attr}'.")
+            elif source is not None:
+                used.add(source)
+                print(f"Mapped '{source}' to '{fixed_attr}'.")
+        # columns already named like the fixed schema are kept when they are not mapped
+        used.update(self.fixed_schema)
+        self.source_columns = sorted(str(column) for column in used)
+
+    @classmethod
+    def compile(cls, config, schema_config):
+        """
+        Compile the plan of a carrier config, or reuse the plan compiled for an equal config.
+        :param config: carrier config
+        :param schema_config: config/schema_config.yaml
+        :return:
+        """
+        key = config_hash(config, schema_config)
+        with cls._lock:
+            plan = cls._cache.get(key)
+            if plan is None:
+                plan = cls._cache[key] = cls(config, schema_config)
+        return plan
+
+    def resolve(self, columns):
+        """
+        Resolve the fixed schema columns against the columns of a chunk, once per column layout.
+        :param columns: columns of the raw chunk
+        :return: dict of fixed schema column to its source column, list of merged source
+                 columns or None for NA, in fixed schema order without Primary_Key
+        """
+        columns = tuple(columns)
+        projection = self._resolved.get(columns)
+        if projection is not None:
+            return projection
+
+        available = set(columns)
+        projection = {}
+        for fixed_attr in self.fixed_schema:
+            if fixed_attr == 'Primary_Key':
+                continue
+            if fixed_attr == 'Earner_Type':
+                projection[fixed_attr] = None
+            elif fixed_attr in self.sources:
+                source = self.sources[fixed_attr]
+                if isinstance(source, list):
+                    missing = [column for column in source if column not in available]
+                    if missing:
+                        logging.error(f"Error merging columns {source}: {missing} not found in the data.")
+                        raise KeyError(missing)
+                    projection[fixed_attr] = source
+                elif source in available:
+                    projection[fixed_attr] = source
+                else:
+                    logging.warning(f"Column '{source}' not found in the data. Setting '{fixed_attr}' to NaN.")
+                    projection[fixed_attr] = None
+            elif fixed_attr in available:
+                projection[fixed_attr] = fixed_attr
+        self._resolved[columns] = projection
+        return projection
+
+    def key_position(self, projection):
+        """
+        Position of Primary_Key among the projected columns, following the fixed schema order.
+        :param projection:
+        :return:
+        """
+        order = self.fixed_schema.index('Primary_Key') if 'Primary_Key' in self.fixed_schema else len(projection)
+        return sum(1 for column in projection if self.fixed_schema.index(column) < order)
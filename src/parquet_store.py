@@ -0,0 +1,354 @@
+import logging
+import os
+import sqlite3
+import uuid
+from urllib.parse import quote
+
+import pandas as pd
+
+from src import tracing
+from src.schema_types import cast_to_schema_types
+from src.commission_month import add_commission_month
+from src.store import BaseStore, VERSION_COLUMN, DEFAULT_BATCH_SIZE
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+DEFAULT_PARQUET_PATH = 'database/parquet'
+PARTITION_COLUMNS = ['Carrier_Name', 'Commission_Month']
+VERSION_FILE_NAME = '_version'
+LEDGER_FILE_NAME = '_ledger.db'
+
+
+class ParquetStore(BaseStore):
+    """
+    Columnar storage for the normalized data, hive-partitioned by carrier and commission month:
+        <root>/Carrier_Name=<carrier>/Commission_Month=<yyyymm>/data.parquet
+    Loads only open the partitions that match the filters and only read the requested columns.
+    The dataset version is kept in <root>/_version and the ingestion ledger in <root>/_ledger.db,
+    which the dataset scans ignore.
+    """
+    def __init__(self, root=DEFAULT_PARQUET_PATH, schema_config_path='config/schema_config.yaml'):
+        if pa is None:
+            raise ImportError("The parquet store requires pyarrow, install it with 'pip install pyarrow'.")
+        super().__init__(schema_config_path)
+        self.root = root
+        self.ledger_conn = None
+        os.makedirs(root, exist_ok=True)
+
+    def close(self):
+        if self.ledger_conn is not None:
+            self.ledger_conn.close()
+
+    def _arrow_type(self, column, series=None):
+        """
+        Map the schema type of a column to its Arrow type, so every partition file shares one schema.
+        :param column:
+        :param series: column values, used for the Primary_Key whose type depends on primary_key_mode
+        :return:
+        """
+        expected_type = self.data_types.get(column)
+        if column == 'Commission_Month':
+            return pa.int32()
+        if column == VERSION_COLUMN:
+            return pa.int64()
+        if column == 'Primary_Key' and series is not None and pd.api.types.is_integer_dtype(series):
+            return pa.int64()
+        if expected_type == 'datetime':
+            return pa.timestamp('ns')
+        if expected_type == 'category':
+            return pa.dictionary(pa.int32(), pa.string())
+        if expected_type in ('float', 'float64'):
+            return pa.float64()
+        if expected_type == 'float32':
+            return pa.float32()
+        if expected_type in ('int', 'int64', 'Int64'):
+            return pa.int64()
+        if expected_type in ('int32', 'Int32'):
+            return pa.int32()
+        if expected_type in ('int16', 'Int16'):
+            return pa.int16()
+        if expected_type in ('int8', 'Int8'):
+            return pa.int8()
+        return pa.string()
+
+    def _partitioning(self):
+        return ds.partitioning(pa.schema([('Carrier_Name', pa.string()), ('Commission_Month', pa.int32())]),
+                               flavor='hive')
+
+    def _partition_dir(self, carrier, month):
+        carrier_segment = '__HIVE_DEFAULT_PARTITION__' if pd.isna(carrier) else quote(str(carrier), safe='')
+        month_segment = '__HIVE_DEFAULT_PARTITION__' if pd.isna(month) else str(int(month))
+        return os.path.join(self.root, f'Carrier_Name={carrier_segment}', f'Commission_Month={month_segment}')
+
+    def _to_table(self, df):
+        """
+        Convert a partition dataframe to an Arrow table with the fixed schema types.
+        :param df:
+        :return:
+        """
+        df = df.drop(columns=[col for col in PARTITION_COLUMNS if col in df.columns])
+        for col in df.columns:
+            arrow_type = self._arrow_type(col, df[col])
+            if not pd.api.types.is_object_dtype(df[col]):
+                continue
+            if arrow_type == pa.string() or pa.types.is_dictionary(arrow_type):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            elif pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+                converted = pd.to_numeric(df[col], errors='coerce')
+                dropped = int((converted.isna() & df[col].notna()).sum())
+                if dropped:
+                    logging.warning(f"{dropped} value(s) of column '{col}' are not numeric and are stored as null.")
+                df[col] = converted
+        schema = pa.schema([(col, self._arrow_type(col, df[col])) for col in df.columns])
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+    def _write_partition(self, partition_dir, df):
+        """
+        Merge new rows into one partition file, keeping the last row per Primary_Key.
+        :param partition_dir:
+        :param df:
+        :return: the stored rows the new rows replaced, without the partition columns
+        """
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, 'data.parquet')
+        replaced = None
+        if os.path.exists(path):
+            existing = pq.read_table(path).to_pandas()
+            replaced = existing[existing['Primary_Key'].isin(df['Primary_Key'])]
+            df = pd.concat([existing, df.drop(columns=PARTITION_COLUMNS)], ignore_index=True)
+        df = df.drop_duplicates(subset='Primary_Key', keep='last')
+
+        tmp_path = os.path.join(partition_dir, f'.{uuid.uuid4().hex}.tmp')
+        pq.write_table(self._to_table(df), tmp_path)
+        os.replace(tmp_path, path)
+        return replaced
+
+    def upsert_chunks(self, chunks):
+        """
+        Upsert normalized chunks, rewriting only the partitions they touch.
+        Primary keys are deduplicated within a partition; the generated Primary_Key
+        contains the carrier and period, so a key never spans two partitions.
+        :param chunks:
+        :return: number of rows written
+        """
+        rows_written = 0
+        version = self.get_version() + 1
+        summaries, conn = self.summaries, self._ledger_connection()
+        # the summaries stay marked stale until every partition was written and applied to them
+        with conn:
+            maintained, _ = self.begin_summaries(summaries)
+        for chunk in chunks:
+            if 'Primary_Key' not in chunk.columns:
+                raise ValueError("Merged 'Primary_Key' column not found in the dataframe.")
+            with tracing.span('store.write', rows=len(chunk)):
+                chunk = add_commission_month(chunk).assign(**{VERSION_COLUMN: version})
+                for (carrier, month), partition in chunk.groupby(PARTITION_COLUMNS, dropna=False, sort=False,
+                                                                  observed=True):
+                    replaced = self._write_partition(self._partition_dir(carrier, month), partition)
+                    if maintained:
+                        written = partition.drop_duplicates(subset='Primary_Key', keep='last')
+                        replaced = self._with_partition(replaced, carrier, month)
+                        with conn:
+                            for summary in maintained:
+                                summary.apply(added=written, removed=replaced)
+            rows_written += len(chunk)
+        self._write_version(version)
+        with conn:
+            for summary in maintained:
+                summary.commit(version)
+        return rows_written
+
+    @staticmethod
+    def _with_partition(df, carrier, month):
+        if df is None:
+            return None
+        return df.assign(Carrier_Name=carrier, Commission_Month=month)
+
+    def delete_keys(self, keys):
+        """
+        Delete rows by Primary_Key, rewriting only the partitions holding them.
+        :param keys:
+        :return: number of rows deleted
+        """
+        keys = list(keys)
+        if not keys or not os.listdir(self.root):
+            return 0
+        located = self._dataset().to_table(columns=PARTITION_COLUMNS, filter=ds.field('Primary_Key').isin(keys))
+        partitions = located.to_pandas().drop_duplicates()
+        version = self.get_version() + 1
+        summaries, conn = self.summaries, self._ledger_connection()
+        with conn:
+            maintained, _ = self.begin_summaries(summaries)
+        deleted = 0
+        for carrier, month in partitions.itertuples(index=False):
+            path = os.path.join(self._partition_dir(carrier, month), 'data.parquet')
+            existing = pq.read_table(path).to_pandas()
+            removed = existing['Primary_Key'].isin(keys)
+            kept = existing[~removed]
+            deleted += len(existing) - len(kept)
+            with conn:
+                for summary in maintained:
+                    summary.apply(removed=self._with_partition(existing[removed], carrier, month))
+            if kept.empty:
+                os.remove(path)
+                continue
+            tmp_path = os.path.join(os.path.dirname(path), f'.{uuid.uuid4().hex}.tmp')
+            pq.write_table(self._to_table(kept), tmp_path)
+            os.replace(tmp_path, path)
+        self._write_version(version)
+        with conn:
+            for summary in maintained:
+                summary.commit(version)
+        return deleted
+
+    def load_keys(self, keys, columns=None):
+        """
+        Load the rows of Primary_Keys in one dataset scan, the keys are not indexed.
+        :param keys:
+        :param columns: columns to read, None for all columns
+        :return:
+        """
+        keys = list(keys)
+        if not keys:
+            return pd.DataFrame(columns=columns or [])
+        return self.load(columns=columns, filters=[('Primary_Key', 'in', keys)])
+
+    def _ledger_connection(self):
+        if self.ledger_conn is None:
+            self.ledger_conn = sqlite3.connect(os.path.join(self.root, LEDGER_FILE_NAME), check_same_thread=False)
+            self.ledger_conn.execute('PRAGMA journal_mode=WAL')
+        return self.ledger_conn
+
+    def get_version(self):
+        try:
+            with open(os.path.join(self.root, VERSION_FILE_NAME), 'r') as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_version(self, version):
+        tmp_path = os.path.join(self.root, f'.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'w') as file:
+            file.write(str(version))
+        os.replace(tmp_path, os.path.join(self.root, VERSION_FILE_NAME))
+
+    def _dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=self._partitioning(),
+                          exclude_invalid_files=True)
+
+    def get_location(self):
+        return os.path.abspath(self.root)
+
+    def count(self):
+        if not os.listdir(self.root):
+            return 0
+        return self._dataset().count_rows()
+
+    def get_columns(self):
+        if not os.listdir(self.root):
+            return []
+        return self._dataset().schema.names
+
+    def _expression(self, filters):
+        """
+        Translate filters into an Arrow dataset expression used for partition pruning.
+        :param filters:
+        :return:
+        """
+        expression = None
+        for column, op, value in filters or []:
+            field = ds.field(column)
+            if op == 'in':
+                condition = field.isin(list(value))
+            elif op == '==':
+                condition = field == value
+            elif op == '!=':
+                condition = field != value
+            elif op == '<':
+                condition = field < value
+            elif op == '<=':
+                condition = field <= value
+            elif op == '>':
+                condition = field > value
+            elif op == '>=':
+                condition = field >= value
+            else:
+                raise ValueError(f"Unsupported filter operator '{op}'.")
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def _scan_columns(self, dataset, columns):
+        if columns:
+            return [col for col in columns if col in dataset.schema.names]
+        fixed_schema = self.schema_config.get('fixed_schema', [])
+        columns = [col for col in fixed_schema if col in dataset.schema.names]
+        return columns + [col for col in dataset.schema.names if col not in columns and col != VERSION_COLUMN]
+
+    def iter_chunks(self, columns=None, filters=None, chunk_size=DEFAULT_BATCH_SIZE):
+        """
+        Stream the matching partitions as record batches, converted chunk_size rows at a time.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters
+        :param chunk_size: rows per chunk
+        :return: generator of dataframes with the schema types
+        """
+        if not os.listdir(self.root):
+            return
+        yield from self._iter_dataset(self._dataset(), columns, filters, chunk_size)
+
+    def chunk_streams(self, columns=None, filters=None, chunk_size=DEFAULT_BATCH_SIZE, parts=1):
+        """
+        Split the matching partition files into groups of about the same size, each streamed as its own dataset.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters
+        :param chunk_size: rows per chunk
+        :param parts: number of streams wanted
+        :return: list of generators of dataframes
+        """
+        if parts <= 1 or not os.listdir(self.root):
+            return [self.iter_chunks(columns=columns, filters=filters, chunk_size=chunk_size)]
+        dataset = self._dataset()
+        paths = sorted((fragment.path for fragment in dataset.get_fragments(filter=self._expression(filters))),
+                       key=os.path.getsize, reverse=True)
+        groups = [paths[part::parts] for part in range(min(parts, len(paths)))]
+        return [self._iter_dataset(ds.dataset(group, format='parquet', partitioning=self._partitioning(),
+                                              partition_base_dir=self.root, schema=dataset.schema),
+                                   columns, filters, chunk_size)
+                for group in groups]
+
+    def _iter_dataset(self, dataset, columns, filters, chunk_size):
+        batches, rows = [], 0
+        for batch in dataset.to_batches(columns=self._scan_columns(dataset, columns),
+                                        filter=self._expression(filters), batch_size=chunk_size):
+            if not batch.num_rows:
+                continue
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_size:
+                yield self._batches_to_frame(batches)
+                batches, rows = [], 0
+        if batches:
+            yield self._batches_to_frame(batches)
+
+    def _batches_to_frame(self, batches):
+        # partitions may dictionary-encode a column differently, unify them before converting
+        table = pa.Table.from_batches(batches).unify_dictionaries()
+        return cast_to_schema_types(table.to_pandas(), self.data_types, convert_objects=False)
+
+    def load(self, columns=None, filters=None):
+        """
+        Load the normalized data, reading only the matching partitions and requested columns.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters
+        :return:
+        """
+        if not os.listdir(self.root):
+            return pd.DataFrame(columns=columns or [])
+        dataset = self._dataset()
+        table = dataset.to_table(columns=self._scan_columns(dataset, columns), filter=self._expression(filters))
+        return cast_to_schema_types(table.to_pandas(), self.data_types, convert_objects=False)
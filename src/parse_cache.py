@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+from src.reader.base_reader import restore_missing, whole_numbers_as_int
+from src.store import load_yaml, DEFAULT_STORE_CONFIG_PATH
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the cache is disabled without pyarrow
+    pa = pq = None
+
+DEFAULT_PARSE_CACHE_PATH = 'database/parse_cache'
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# part of every key, bump it when the reader parses workbooks differently
+PARSE_CACHE_VERSION = 2
+_INDEX_FILE = 'index.db'
+_READ_BLOCK_SIZE = 1024 * 1024
+
+
+class ParseCache:
+    """
+    Persistent cache of parsed workbooks, keyed by the content of the file.
+    Each workbook is kept as one Parquet file per parsed chunk, with every column of its sheets,
+    so re-uploading an unchanged workbook, e.g. after fixing its YAML config, reads the chunks
+    back instead of parsing the Excel file, and only reads the columns the config uses.
+    A small SQLite index records the entries and the hit/miss statistics. The least recently
+    used workbooks are evicted once the cache holds more than max_entries workbooks or max_bytes.
+    """
+    def __init__(self, path=DEFAULT_PARSE_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        if pq is None:
+            raise ImportError("The parse cache requires pyarrow, install it with 'pip install pyarrow'.")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # upload workers may share the cache, so wait for each other's writes
+        self.conn = sqlite3.connect(os.path.join(path, _INDEX_FILE), timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "entries" '
+                              '("key" TEXT PRIMARY KEY, "source" TEXT, "rows" INTEGER, "chunks" INTEGER, '
+                              '"size" INTEGER, "created" REAL, "last_used" INTEGER)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "stats" ("name" TEXT PRIMARY KEY, "value" INTEGER)')
+
+    @classmethod
+    def open(cls, config_path=DEFAULT_STORE_CONFIG_PATH):
+        """
+        Open the cache described by the 'parse_cache' section of the store config.
+        :param config_path:
+        :return: None if the cache is disabled or pyarrow is not installed
+        """
+        config = load_yaml(config_path).get('parse_cache') or {}
+        if not config.get('enabled', True):
+            return None
+        if pq is None:
+            logging.warning("pyarrow is not installed, workbooks are parsed without the parse cache.")
+            return None
+        return cls(config.get('path', DEFAULT_PARSE_CACHE_PATH),
+                   config.get('max_entries', DEFAULT_MAX_ENTRIES),
+                   config.get('max_bytes', DEFAULT_MAX_BYTES))
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def make_key(file_path, *sheets):
+        """
+        Build the cache key of a workbook from its content and the sheets read from it.
+        :param file_path:
+        :param sheets: names of the parsed sheets
+        :return: hex digest
+        """
+        digest = hashlib.sha256(f'parse-cache-{PARSE_CACHE_VERSION}:'.encode())
+        with open(file_path, 'rb') as file:
+            while block := file.read(_READ_BLOCK_SIZE):
+                digest.update(block)
+        for sheet in sheets:
+            digest.update(f'\0{sheet}'.encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key)
+
+    def _next_tick(self):
+        return self.conn.execute('SELECT COALESCE(MAX("last_used"), 0) + 1 FROM "entries"').fetchone()[0]
+
+    def _count(self, name, value=1):
+        self.conn.execute('INSERT INTO "stats" VALUES (?, ?) '
+                          'ON CONFLICT("name") DO UPDATE SET "value" = "value" + excluded."value"', (name, value))
+
+    def get(self, key, columns=None, chunk_size=None):
+        """
+        Get the chunks of a cached workbook, counting the hit or miss.
+        :param key:
+        :param columns: names of the columns to read, None for every column
+        :param chunk_size: largest number of rows per chunk, larger cached chunks are split
+        :return: generator of dataframes, None on a miss
+        """
+        with self.conn:
+            row = self.conn.execute('SELECT "chunks" FROM "entries" WHERE "key" = ?', (key,)).fetchone()
+            entry_path = self._entry_path(key)
+            if row is not None and not os.path.isdir(entry_path):
+                # removed behind the index's back
+                self.conn.execute('DELETE FROM "entries" WHERE "key" = ?', (key,))
+                row = None
+            self._count('hits' if row else 'misses')
+            if row is None:
+                return None
+            self.conn.execute('UPDATE "entries" SET "last_used" = ? WHERE "key" = ?', (self._next_tick(), key))
+        return self._read_chunks(entry_path, row[0], columns, chunk_size)
+
+    @staticmethod
+    def _read_chunks(entry_path, chunks, columns, chunk_size):
+        for part in range(chunks):
+            part_path = os.path.join(entry_path, f'{part:05d}.parquet')
+            part_columns = None
+            if columns is not None:
+                part_columns = [name for name in pq.read_schema(part_path).names if name in columns]
+            # Parquet gives the missing values of text columns as None, the parser gives NaN,
+            # and stores the whole numbers of a float column as floats again
+            dataframe = pq.read_table(part_path, columns=part_columns).to_pandas()
+            dataframe = whole_numbers_as_int(restore_missing(dataframe))
+            if chunk_size and len(dataframe) > chunk_size:
+                for start in range(0, len(dataframe), chunk_size):
+                    yield dataframe.iloc[start:start + chunk_size].reset_index(drop=True)
+            else:
+                yield dataframe
+
+    def write_through(self, key, chunks, source=None):
+        """
+        Pass parsed chunks through, writing each one to the cache.
+        The entry is only added once every chunk was written, a workbook that is not read to
+        the end or holds values Parquet cannot store (e.g. numbers and text in one column)
+        is not cached.
+        :param key:
+        :param chunks: generator of parsed dataframes
+        :param source: path of the workbook, recorded for the statistics
+        :return: generator of the same dataframes
+        """
+        temp_path = os.path.join(self.path, f'tmp-{uuid.uuid4().hex}')
+        os.makedirs(temp_path)
+        cacheable, rows, count = True, 0, 0
+        try:
+            for chunk in chunks:
+                if cacheable:
+                    try:
+                        pq.write_table(pa.Table.from_pandas(chunk),
+                                       os.path.join(temp_path, f'{count:05d}.parquet'))
+                    except (pa.ArrowException, ValueError, TypeError) as e:
+                        logging.info(f"Not caching the parsed workbook '{source}': {e}")
+                        cacheable = False
+                    rows += len(chunk)
+                    count += 1
+                yield chunk
+            if cacheable:
+                self._add(key, temp_path, source, rows, count)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def _add(self, key, temp_path, source, rows, chunks):
+        """
+        Move a fully written entry into place and evict the least recently used entries.
+        :return:
+        """
+        entry_path = self._entry_path(key)
+        size = sum(entry.stat().st_size for entry in os.scandir(temp_path))
+        with self.conn:
+            if os.path.isdir(entry_path):
+                # written meanwhile by another upload of the same workbook
+                return
+            os.rename(temp_path, entry_path)
+            self.conn.execute('INSERT OR REPLACE INTO "entries" VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (key, source, rows, chunks, size, time.time(), self._next_tick()))
+            self._evict()
+
+    def _evict(self):
+        """
+        Delete the least recently used entries beyond max_entries or max_bytes.
+        :return:
+        """
+        total_bytes, evicted = 0, []
+        rows = self.conn.execute('SELECT "key", "size" FROM "entries" ORDER BY "last_used" DESC').fetchall()
+        for position, (key, size) in enumerate(rows):
+            total_bytes += size
+            if position >= self.max_entries or (position > 0 and total_bytes > self.max_bytes):
+                evicted.append((key,))
+        if evicted:
+            self.conn.executemany('DELETE FROM "entries" WHERE "key" = ?', evicted)
+            self._count('evictions', len(evicted))
+            for (key,) in evicted:
+                shutil.rmtree(self._entry_path(key), ignore_errors=True)
+
+    def stats(self):
+        """
+        Get the hit/miss statistics and the size of the cache.
+        :return:
+        """
+        counters = dict(self.conn.execute('SELECT "name", "value" FROM "stats"').fetchall())
+        entries, rows, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM("rows"), 0), '
+                                                'COALESCE(SUM("size"), 0) FROM "entries"').fetchone()
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'evictions': counters.get('evictions', 0),
+            'entries': entries,
+            'rows': rows,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+        }
+
+    def entries(self):
+        """
+        List the cached workbooks, most recently used first.
+        :return: list of dicts
+        """
+        cursor = self.conn.execute('SELECT "key", "source", "rows", "size", "created" FROM "entries" '
+                                   'ORDER BY "last_used" DESC')
+        return [{'key': key, 'source': source, 'rows': rows, 'bytes': size,
+                 'created': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))}
+                for key, source, rows, size, created in cursor.fetchall()]
+
+    def clear(self):
+        """
+        Remove every cached workbook and reset the statistics.
+        :return: number of removed workbooks
+        """
+        with self.conn:
+            keys = [key for (key,) in self.conn.execute('SELECT "key" FROM "entries"').fetchall()]
+            self.conn.execute('DELETE FROM "entries"')
+            self.conn.execute('DELETE FROM "stats"')
+        for entry in os.scandir(self.path):
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+        return len(keys)
@@ -0,0 +1,196 @@
+import itertools
+import os
+
+from src import tracing
+
+# pandas, the Excel reader and the normalizer are imported when a file is processed,
+# so that main.py can import this module without slowing down the other commands
+
+CONFIG_EXTENSIONS = ('.yaml', '.yml')
+
+
+def load_config(config_path):
+    """
+    Load the YAML configuration file if provided.
+    """
+    import yaml
+    try:
+        with open(config_path, 'r') as file:
+            config = yaml.safe_load(file)
+            return config
+    except Exception as e:
+        print(f"Error loading config: {e}")
+        return None
+
+
+def validate_primary_key(df, primary_key):
+    if not primary_key:
+        raise ValueError("No valid Primary Key found or generated.")
+
+    missing_keys = [key for key in primary_key if key not in df.columns]
+    if missing_keys:
+        raise ValueError(f"Primary Key column(s) not found in the dataframe: {missing_keys}")
+
+    print("Primary Key validation passed.")
+
+
+def validated_chunks(normalized_chunks):
+    """
+    Validate the primary key of each normalized chunk before it is saved.
+    :param normalized_chunks: generator of (normalized_chunk, primary_key) tuples
+    :return: generator of normalized chunks
+    """
+    for normalized_df, primary_key in normalized_chunks:
+        validate_primary_key(normalized_df, primary_key)
+        yield normalized_df
+
+
+def parse_upload_targets(files, config_path=None, manifest_path=None):
+    """
+    Resolve the (file, config) pairs of an upload, in upload order.
+    Files are given either as 'file:config' pairs, or as plain paths sharing --config,
+    and a manifest lists more pairs as {file, config} entries after them.
+    :param files:
+    :param config_path: config of the files given without one
+    :param manifest_path: YAML or JSON manifest
+    :return: list of (file_path, config_path) tuples
+    """
+    targets = []
+    for file in files or []:
+        file_path, _, file_config = file.rpartition(':')
+        if file_path and file_config.lower().endswith(CONFIG_EXTENSIONS):
+            targets.append((file_path, file_config))
+        elif config_path:
+            targets.append((file, config_path))
+        else:
+            raise ValueError(f"No metadata configuration given for '{file}', use 'file:config' or --config.")
+
+    if manifest_path:
+        manifest = load_config(manifest_path)
+        if manifest is None:
+            raise ValueError(f"Error loading manifest '{manifest_path}'.")
+        entries = manifest.get('files', []) if isinstance(manifest, dict) else manifest
+        base_dir = os.path.dirname(manifest_path)
+        for entry in entries:
+            if not entry.get('file') or not (entry.get('config') or config_path):
+                raise ValueError(f"Manifest entry needs a file and a config: {entry}")
+            targets.append((os.path.join(base_dir, entry['file']),
+                            os.path.join(base_dir, entry['config']) if entry.get('config') else config_path))
+
+    if not targets:
+        raise ValueError("No files to upload.")
+    return targets
+
+
+def normalize_file_chunks(file_path, config_path, chunk_size=None, display=True, parse_cache=False, workers=None):
+    """
+    Stream a data file through the normalizer, read by the reader of its file type.
+    :param file_path: Excel, CSV, JSON Lines or Parquet file
+    :param config_path:
+    :param chunk_size: rows per chunk, None for the reader's default
+    :param display: whether to display the first raw chunk
+    :param parse_cache: whether to read workbooks through the parse cache of the store config
+    :param workers: number of threads or processes the reader parses with, e.g. the sheets of a workbook
+                    parsed concurrently, None for the reader's default
+    :return: generator of validated normalized chunks
+    """
+    from src.reader import reader_for, DEFAULT_CHUNK_SIZE
+    from src.normalizer import Normalizer
+
+    config = load_config(config_path)
+    if not config:
+        raise ValueError(f"Error loading config '{config_path}'.")
+
+    normalizer = Normalizer(None)
+    # only the columns the carrier config uses are read
+    plan = normalizer.plan_for(config)
+    reader_cls = reader_for(file_path)
+    cache = None
+    if parse_cache and reader_cls.cacheable:
+        from src.parse_cache import ParseCache
+        cache = ParseCache.open()
+    try:
+        reader = reader_cls(file_path, chunk_size=chunk_size or DEFAULT_CHUNK_SIZE, usecols=plan.source_columns,
+                            parse_cache=cache, carrier=config.get('carrier'), workers=workers,
+                            **reader_cls.options_from_config(config))
+        raw_chunks = tracing.traced_iter('read', reader.iter_chunks())
+        first_chunk = next(raw_chunks, None)
+        if first_chunk is None:
+            print(f"No rows found in '{file_path}'.")
+            return
+        if display:
+            reader.display_dataframe(first_chunk)
+
+        yield from validated_chunks(normalizer.normalize_chunks(itertools.chain([first_chunk], raw_chunks), config))
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def normalize_file(target, chunk_size=None, parse_cache=False):
+    """
+    Read and normalize a whole file, run in a worker process of a parallel upload.
+    :param target: (file_path, config_path) tuple
+    :param chunk_size:
+    :param parse_cache: whether to read the workbook through the parse cache
+    :return: normalized dataframe of the file
+    """
+    import pandas as pd
+
+    file_path, config_path = target
+    with tracing.span('normalize_file', file=file_path) as span:
+        # the file is already read in a worker process, its reader parses on one core
+        chunks = list(normalize_file_chunks(file_path, config_path, chunk_size, display=False, parse_cache=parse_cache,
+                                            workers=1))
+        if not chunks:
+            return pd.DataFrame()
+        df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        span.set(rows=len(df))
+    print(f"Normalized {len(df)} rows from '{file_path}'.")
+    return df
+
+
+def normalize_files_by_target(targets, chunk_size=None, workers=None, parse_cache=False):
+    """
+    Normalize many files in a process pool.
+    Results are yielded in file order whatever order the workers finish in,
+    so applying them gives the rows of later files precedence (last write wins).
+    At most one file per worker is submitted ahead of the file being consumed, so only
+    that many normalized files are held in memory at a time.
+    :param targets: list of (file_path, config_path) tuples
+    :param chunk_size:
+    :param workers: number of worker processes, defaults to one per CPU core
+    :param parse_cache: whether to read the workbooks through the parse cache
+    :return: generator of (target, normalized dataframe) tuples, the dataframe is empty for a file without rows
+    """
+    workers = min(workers or os.cpu_count() or 1, len(targets))
+    if workers <= 1:
+        yield from ((target, normalize_file(target, chunk_size, parse_cache)) for target in targets)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    traced = tracing.enabled()
+
+    def submit(executor, target):
+        if traced:
+            # the workers record their own spans and send them back with their results
+            return executor.submit(tracing.run_traced, normalize_file, target, chunk_size, parse_cache)
+        return executor.submit(normalize_file, target, chunk_size, parse_cache)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = iter(targets)
+        in_flight = deque((target, submit(executor, target)) for target in itertools.islice(pending, workers))
+        while in_flight:
+            target, future = in_flight.popleft()
+            if traced:
+                df, events = future.result()
+                tracing.add_events(events)
+            else:
+                df = future.result()
+            next_target = next(pending, None)
+            if next_target is not None:
+                in_flight.append((next_target, submit(executor, next_target)))
+            yield target, df
+            # the caller is done with the file, it is not held while the next one is awaited
+            del df
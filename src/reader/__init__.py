@@ -0,0 +1,32 @@
+from .reader_meta import ReaderMeta
+from .base_reader import Reader, DEFAULT_CHUNK_SIZE, carrier_from_file_name, restore_missing, whole_numbers_as_int
+from .excel_reader import ExcelReader
+from .arrow_reader import CsvReader, JsonLinesReader, ParquetReader
+
+__all__ = ['Reader', 'ReaderMeta', 'DEFAULT_CHUNK_SIZE', 'ExcelReader', 'CsvReader', 'JsonLinesReader',
+           'ParquetReader', 'carrier_from_file_name', 'restore_missing', 'whole_numbers_as_int', 'reader_for',
+           'open_reader']
+
+
+def reader_for(file_path):
+    """
+    Get the reader class of a file, picked by its extension.
+    :param file_path:
+    :return:
+    """
+    reader_cls = ReaderMeta.for_file(file_path)
+    if reader_cls is None:
+        extensions = sorted(extension for reader in ReaderMeta.get_readers().values()
+                            for extension in reader.get_extensions())
+        raise ValueError(f"No reader for '{file_path}', supported file types: {', '.join(extensions)}.")
+    return reader_cls
+
+
+def open_reader(file_path, **kwargs):
+    """
+    Create the reader of a file, picked by its extension.
+    :param file_path:
+    :param kwargs: chunk_size, usecols, parse_cache and carrier, see Reader
+    :return:
+    """
+    return reader_for(file_path)(file_path, **kwargs)
@@ -0,0 +1,176 @@
+import csv
+import io
+import itertools
+import json
+from abc import abstractmethod
+
+import pandas as pd
+
+from .base_reader import Reader, restore_missing, whole_numbers_as_int
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+except ImportError:  # the CSV, JSON Lines and Parquet readers require pyarrow
+    pa = None
+
+# bytes of a CSV file parsed per block, by Arrow's worker threads
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+_HEADER_BYTES = 64 * 1024
+
+
+class ArrowReader(Reader):
+    """
+    Base class of the readers parsing with Arrow's multithreaded readers.
+    Record batches are regrouped into chunks of chunk_size rows and converted to pandas,
+    with None restored to NaN and whole numbers given as ints, like the Excel reader gives.
+    """
+    def __init__(self, file_path, chunk_size=None, usecols=None, parse_cache=None, carrier=None, workers=None):
+        if pa is None:
+            raise ImportError(f"Reading '{file_path}' requires pyarrow, install it with 'pip install pyarrow'.")
+        super().__init__(file_path, chunk_size, usecols, parse_cache, carrier, workers)
+
+    @property
+    def use_threads(self):
+        # a single worker, e.g. inside an upload worker process, parses on the calling thread
+        return self.workers != 1
+
+    @abstractmethod
+    def _iter_batches(self, chunk_size, usecols):
+        """
+        Read the file as Arrow record batches.
+        :param chunk_size:
+        :param usecols: names of the columns to keep, None for every column
+        :return: generator of record batches
+        """
+        raise NotImplementedError("Each Arrow reader must implement an _iter_batches method.")
+
+    def _to_frame(self, table):
+        return whole_numbers_as_int(restore_missing(table.to_pandas()))
+
+    def _parse_chunks(self, chunk_size, usecols=None):
+        batches, rows = [], 0
+        for batch in self._iter_batches(chunk_size, usecols):
+            if not batch.num_rows:
+                continue
+            batches.append(batch)
+            rows += batch.num_rows
+            while rows >= chunk_size:
+                table = pa.Table.from_batches(batches)
+                yield self._to_frame(table.slice(0, chunk_size))
+                rest = table.slice(chunk_size)
+                batches, rows = rest.to_batches(), rest.num_rows
+        if rows:
+            yield self._to_frame(pa.Table.from_batches(batches))
+
+
+class CsvReader(ArrowReader):
+    """
+    Reader of CSV files, optionally gzip or zstd compressed.
+    Every column is read as text and typed per chunk, as the Excel reader infers the types of
+    its chunks: numbers become int64 or float64 and the rest stays text. A column is only
+    converted when pandas prints each of its numbers exactly as the file writes it, so every
+    value gets the same Primary_Key text whichever chunk it falls in and however that chunk
+    is typed; e.g. IDs with leading zeros, or integers in a chunk with a blank, stay text.
+    """
+    @classmethod
+    def get_extensions(cls) -> tuple[str, ...]:
+        return '.csv', '.csv.gz', '.csv.zst'
+
+    def _read_header(self):
+        with pa.input_stream(self.file_path, compression='detect') as stream:
+            head = stream.read(_HEADER_BYTES).decode('utf-8-sig', errors='replace')
+        return next(csv.reader(io.StringIO(head)), [])
+
+    def _iter_batches(self, chunk_size, usecols):
+        header = self._read_header()
+        if not header:
+            return
+        include = [name for name in header if usecols is None or name in usecols]
+        reader = pa_csv.open_csv(
+            pa.input_stream(self.file_path, compression='detect'),
+            read_options=pa_csv.ReadOptions(use_threads=self.use_threads, block_size=CSV_BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in header},
+                                                  include_columns=include, strings_can_be_null=True))
+        yield from reader
+
+    def _to_frame(self, table):
+        frame = table.to_pandas()
+        for name in frame.columns:
+            frame[name] = self._infer_type(frame[name])
+        return restore_missing(frame)
+
+    @staticmethod
+    def _infer_type(values):
+        """
+        Convert a text column to int64, or float64, when all of its values are numbers that
+        read back as the same text, e.g. '12' or '0.5' but not '012', '0.50' or ' 12'.
+        :param values: series of text values, None for the missing ones
+        :return:
+        """
+        try:
+            numbers = pd.to_numeric(values)
+        except (ValueError, TypeError):
+            return values
+        text = values.dropna()
+        if not text.empty and not (numbers[text.index].astype(str) == text).all():
+            return values
+        return numbers
+
+
+class JsonLinesReader(ArrowReader):
+    """
+    Reader of JSON Lines files, one object per line, optionally gzip or zstd compressed.
+    Each chunk of lines is parsed by Arrow's multithreaded JSON reader. Arrow turns date strings
+    into timestamps, such fields are read again as text, as the other readers give them.
+    Arrow also types the numbers of each chunk by its own lines, integers next to a null or a
+    fraction become floats, so their whole numbers are given as ints again.
+    """
+    @classmethod
+    def get_extensions(cls) -> tuple[str, ...]:
+        return '.jsonl', '.ndjson', '.jsonl.gz', '.jsonl.zst'
+
+    def _iter_batches(self, chunk_size, usecols):
+        read_options = pa_json.ReadOptions(use_threads=self.use_threads)
+        text_fields = {}
+        with pa.input_stream(self.file_path, compression='detect') as stream:
+            lines = io.BufferedReader(stream)
+            while block := b''.join(itertools.islice(lines, chunk_size)):
+                table = self._read_block(block, read_options, text_fields)
+                timestamps = [field.name for field in table.schema if pa.types.is_timestamp(field.type)]
+                if timestamps:
+                    text_fields.update((name, pa.string()) for name in timestamps)
+                    table = self._read_block(block, read_options, text_fields)
+                # explicit fields come first, keep the order of the keys of the first line
+                first_keys = [name for name in json.loads(block.split(b'\n', 1)[0]) if name in table.column_names]
+                names = first_keys + [name for name in table.column_names if name not in first_keys]
+                table = table.select([name for name in names if usecols is None or name in usecols])
+                yield from table.to_batches()
+
+    @staticmethod
+    def _read_block(block, read_options, text_fields):
+        parse_options = pa_json.ParseOptions(explicit_schema=pa.schema(list(text_fields.items())) if text_fields
+                                             else None)
+        return pa_json.read_json(io.BytesIO(block), read_options=read_options, parse_options=parse_options)
+
+
+class ParquetReader(ArrowReader):
+    """
+    Reader of Parquet files, only the used columns are decoded.
+    """
+    @classmethod
+    def get_extensions(cls) -> tuple[str, ...]:
+        return '.parquet',
+
+    def _iter_batches(self, chunk_size, usecols):
+        parquet_file = pq.ParquetFile(self.file_path)
+        try:
+            columns = None
+            if usecols is not None:
+                columns = [name for name in parquet_file.schema_arrow.names if name in usecols]
+            yield from parquet_file.iter_batches(batch_size=chunk_size, columns=columns,
+                                                  use_threads=self.use_threads)
+        finally:
+            parquet_file.close()
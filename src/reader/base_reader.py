@@ -0,0 +1,141 @@
+import os
+from abc import abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from .reader_meta import ReaderMeta
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def carrier_from_file_name(file_path):
+    """
+    Derive the carrier name of a file without a configured carrier,
+    e.g. 'Healthfirst%2006.2024%20Commission.xlsx' -> 'healthfirst'.
+    :param file_path:
+    :return:
+    """
+    return os.path.basename(file_path).split('%')[0].strip().lower().replace(' ', '_')
+
+
+def restore_missing(dataframe):
+    """
+    Arrow gives the missing values of text columns as None, while the Excel parser gives NaN;
+    restore NaN so every reader builds the same keys from the same rows.
+    :param dataframe:
+    :return:
+    """
+    for name in dataframe.columns[dataframe.dtypes == object]:
+        values = dataframe[name].to_numpy()
+        missing = pd.isna(values)
+        if missing.any():
+            values = values.copy()
+            values[missing] = np.nan
+            dataframe[name] = values
+    return dataframe
+
+
+def whole_numbers_as_int(dataframe):
+    """
+    A float column holding whole numbers is typed by the rows that share its chunk: the same cell
+    is 1000 in a chunk of integers and 1000.0 next to a blank or a fraction. Give such columns as
+    Python ints and floats instead, so each number has the same text, e.g. in the Primary_Key,
+    whichever chunk it falls in; columns without whole numbers stay float64.
+    :param dataframe:
+    :return:
+    """
+    for name in dataframe.columns[dataframe.dtypes == 'float64']:
+        values = dataframe[name].to_numpy()
+        whole = (np.abs(values) < 2 ** 53) & (np.floor(values) == values)
+        if whole.any():
+            converted = values.astype(object)
+            converted[whole] = values[whole].astype(np.int64).tolist()
+            dataframe[name] = converted
+    return dataframe
+
+
+class Reader(metaclass=ReaderMeta):
+    """
+    Base reader class.
+    Every reader streams the rows of a file as chunks of raw source columns, with pandas' inferred
+    dtypes, NaN for missing values and a 'Carrier' column, which is the frame the Normalizer consumes.
+    """
+    # whether parsing the file type is slow enough to be worth the parse cache
+    cacheable = False
+
+    def __init__(self, file_path, chunk_size=None, usecols=None, parse_cache=None, carrier=None, workers=None):
+        """
+        :param file_path:
+        :param chunk_size: rows per chunk
+        :param usecols: names of the columns to read, e.g. NormalizationPlan.source_columns;
+                        None reads every column
+        :param parse_cache: ParseCache the chunks of a cacheable reader are read from or written to
+        :param carrier: carrier name from the config, derived from the file name when None
+        :param workers: number of threads or processes the reader may parse with, None for its default
+        """
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.usecols = None if usecols is None else set(usecols)
+        self.parse_cache = parse_cache
+        self.carrier_name = carrier or carrier_from_file_name(file_path)
+        self.workers = workers
+        self.dataframe = None
+
+    @classmethod
+    @abstractmethod
+    def get_extensions(cls) -> tuple[str, ...]:
+        """
+        Get the lower case file extensions the reader handles, e.g. ('.csv',)
+        :return:
+        """
+        raise NotImplementedError("Each reader must implement a get_extensions method.")
+
+    @classmethod
+    def options_from_config(cls, config):
+        """
+        Get the reader options set in a carrier config, e.g. the sheets of a workbook.
+        :param config: carrier config
+        :return: keyword arguments of the reader
+        """
+        return {}
+
+    @abstractmethod
+    def _parse_chunks(self, chunk_size, usecols=None):
+        """
+        Parse the file in row chunks.
+        :param chunk_size:
+        :param usecols: names of the columns to keep, None for every column
+        :return: generator of dataframes, without the Carrier column
+        """
+        raise NotImplementedError("Each reader must implement a _parse_chunks method.")
+
+    def read_chunks(self, chunk_size):
+        """
+        Read the raw chunks of the file, before the Carrier column is added.
+        :param chunk_size:
+        :return:
+        """
+        return self._parse_chunks(chunk_size, self.usecols)
+
+    def iter_chunks(self, chunk_size=None):
+        """
+        Stream the file in row chunks.
+        :param chunk_size: number of rows per chunk
+        :return: generator of dataframes
+        """
+        for chunk in self.read_chunks(chunk_size or self.chunk_size or DEFAULT_CHUNK_SIZE):
+            chunk['Carrier'] = self.carrier_name
+            yield chunk
+
+    def display_dataframe(self, dataframe=None):
+        """
+        Display the dataframes
+        :param dataframe: optional chunk to display instead of the loaded dataframe
+        :return:
+        """
+        dataframe = self.dataframe if dataframe is None else dataframe
+        if dataframe is not None:
+            print(f"DataFrame from {self.file_path}:")
+            print(dataframe.columns)
+            print(dataframe.head())
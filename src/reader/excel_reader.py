@@ -0,0 +1,287 @@
+import logging
+import os
+from queue import Empty
+
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
+
+from src import tracing
+from .base_reader import Reader, whole_numbers_as_int
+
+SHEET_COLUMN = 'Source_Sheet'
+# chunks a sheet parsed in a worker process may get ahead of the reader
+SHEET_QUEUE_CHUNKS = 2
+
+
+def parse_sheet(file_path, sheet, chunk_size, usecols, queue):
+    """
+    Parse one sheet of a workbook in a worker process, when the sheets are parsed concurrently.
+    The chunks are sent through a bounded queue, followed by None, so the worker waits while
+    the reader has not taken its earlier chunks.
+    :param file_path:
+    :param sheet: sheet name
+    :param chunk_size:
+    :param usecols: names of the columns to keep, None for every column
+    :param queue: queue of the chunk dataframes with the Source_Sheet column
+    :return: number of rows
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        with tracing.span('read_sheet', file=file_path, sheet=sheet) as span:
+            rows = 0
+            for chunk in ExcelReader.sheet_chunks(workbook[sheet], chunk_size, usecols):
+                queue.put(chunk)
+                rows += len(chunk)
+            span.set(rows=rows)
+        return rows
+    finally:
+        workbook.close()
+        queue.put(None)
+
+
+def _received_chunks(future, queue):
+    """
+    Take the chunks of a sheet parsed by parse_sheet from its queue.
+    :param future: future of the parse_sheet call, whose error is raised if it fails
+    :param queue:
+    :return: generator of chunk dataframes
+    """
+    while True:
+        try:
+            chunk = queue.get(timeout=1)
+        except Empty:
+            if future.done():
+                # a worker that died, e.g. killed, never sends the end of its sheet
+                future.result()
+            continue
+        if chunk is None:
+            return
+        yield chunk
+
+
+class ExcelReader(Reader):
+    """
+    Reader of .xlsx workbooks.
+    Every sheet holding columns of the carrier config is read, or the sheets listed under
+    'sheets' in the config, and the rows of all sheets are given as one frame with the
+    name of their sheet in a Source_Sheet column.
+    """
+    cacheable = True
+
+    def __init__(self, file_path, chunk_size=None, usecols=None, parse_cache=None, carrier=None, workers=None,
+                 sheets=None):
+        """
+        :param file_path:
+        :param chunk_size: rows per chunk, streams the sheets through iter_chunks() when set
+        :param usecols: names of the columns to read, e.g. NormalizationPlan.source_columns;
+                        None reads every column
+        :param parse_cache: ParseCache the streamed chunks are read from or written to
+        :param carrier: carrier name from the config, derived from the file name when None
+        :param workers: number of sheets parsed concurrently, defaults to one per CPU core
+        :param sheets: names or 0-based positions of the sheets to read, None for every sheet
+                       whose header has a used column
+        """
+        super().__init__(file_path, chunk_size, usecols, parse_cache, carrier, workers)
+        self.sheets = sheets
+        self._sheet_names = None
+        # in streaming mode rows are only materialised through iter_chunks()
+        self.dataframe = None if chunk_size else self.excel_reader()
+
+    @classmethod
+    def get_extensions(cls) -> tuple[str, ...]:
+        return '.xlsx', '.xlsm'
+
+    @classmethod
+    def options_from_config(cls, config):
+        return {'sheets': config.get('sheets')}
+
+    def sheet_names(self):
+        """
+        Select the sheets to read, from the config or by their header.
+        Only the first row of each sheet is parsed to select them.
+        :return: list of sheet names, in workbook order for the discovered sheets
+        """
+        if self._sheet_names is not None:
+            return self._sheet_names
+        workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            names = workbook.sheetnames
+            if self.sheets:
+                selected = []
+                for sheet in self.sheets:
+                    if isinstance(sheet, int) and -len(names) <= sheet < len(names):
+                        sheet = names[sheet]
+                    if sheet not in names:
+                        raise ValueError(f"Sheet '{sheet}' not found in '{self.file_path}', its sheets are {names}.")
+                    selected.append(sheet)
+            elif self.usecols is None or len(names) == 1:
+                selected = names
+            else:
+                selected = [name for name in names if self._has_used_column(workbook[name])]
+                skipped = [name for name in names if name not in selected]
+                if skipped:
+                    logging.info(f"Skipping the sheets of '{self.file_path}' without configured columns: {skipped}")
+                # a workbook without any configured column is read like before, from its first sheet
+                selected = selected or names[:1]
+        finally:
+            workbook.close()
+        self._sheet_names = selected
+        return selected
+
+    def _has_used_column(self, worksheet):
+        header = next(worksheet.iter_rows(max_row=1, values_only=True), ())
+        return any(self._convert_cell(name) in self.usecols for name in header)
+
+    def excel_reader(self):
+        """
+        Read the excel files and create dataframe
+        :return:
+        """
+        try:
+            with tracing.span('read_excel', file=self.file_path) as span:
+                usecols = None if self.usecols is None else self.usecols.__contains__
+                sheets = pd.read_excel(self.file_path, sheet_name=self.sheet_names(), usecols=usecols)
+                dataframe = whole_numbers_as_int(pd.concat([sheet.assign(**{SHEET_COLUMN: name})
+                                                            for name, sheet in sheets.items()], ignore_index=True))
+                span.set(rows=len(dataframe))
+            if not dataframe.empty:
+                print(f"DataFrame for '{self.carrier_name}' has been created.")
+                dataframe['Carrier'] = self.carrier_name
+                return dataframe
+        except Exception as e:
+            print(f"Error while reading the file '{self.carrier_name}'")
+            print(e)
+            return None
+
+    def read_chunks(self, chunk_size):
+        """
+        Stream the selected sheets of the workbook in row chunks.
+        The sheets are opened in openpyxl read-only mode, which parses the XML lazily,
+        so at most one chunk of rows is held in memory at a time when the sheets are read in turn.
+        With a parse cache, a workbook parsed before is read back from the cache instead.
+        :param chunk_size: number of rows per chunk
+        :return: generator of dataframes with the same columns as excel_reader(), without the Carrier column
+        """
+        if self.parse_cache is None:
+            return self._parse_chunks(chunk_size, self.usecols)
+        key = self.parse_cache.make_key(self.file_path, *self.sheet_names())
+        usecols = None if self.usecols is None else self.usecols | {SHEET_COLUMN}
+        chunks = self.parse_cache.get(key, usecols, chunk_size)
+        if chunks is None:
+            # every column is cached, so the workbook is found again after its config changes
+            chunks = self.parse_cache.write_through(key, self._parse_chunks(chunk_size), self.file_path)
+            if usecols is not None:
+                chunks = (chunk.drop(columns=[name for name in chunk.columns if name not in usecols])
+                          for chunk in chunks)
+        return chunks
+
+    def _parse_chunks(self, chunk_size, usecols=None):
+        """
+        Parse the selected sheets of the workbook in row chunks, in sheet order.
+        Parsing a sheet is CPU-bound Python, so several sheets are parsed in worker processes.
+        They stream their chunks back through bounded queues, so at most a few chunks per worker
+        are held in memory, as when the sheets are read in turn.
+        :param chunk_size:
+        :param usecols: names of the columns to keep, None for every column
+        :return: generator of dataframes with the Source_Sheet column, without the Carrier column
+        """
+        sheets = self.sheet_names()
+        workers = min(self.workers or os.cpu_count() or 1, len(sheets))
+        if workers <= 1:
+            workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+            try:
+                for sheet in sheets:
+                    yield from self.sheet_chunks(workbook[sheet], chunk_size, usecols)
+            finally:
+                workbook.close()
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import Manager
+        traced = tracing.enabled()
+        # the queues shut down before the pool, so workers waiting on a reader that stopped early exit too
+        with ProcessPoolExecutor(max_workers=workers) as executor, Manager() as manager:
+            queues = [manager.Queue(maxsize=SHEET_QUEUE_CHUNKS) for _ in sheets]
+            if traced:
+                # the workers record their own spans and send them back with their row counts
+                futures = [executor.submit(tracing.run_traced, parse_sheet, self.file_path, sheet, chunk_size,
+                                           usecols, queue) for sheet, queue in zip(sheets, queues)]
+            else:
+                futures = [executor.submit(parse_sheet, self.file_path, sheet, chunk_size, usecols, queue)
+                           for sheet, queue in zip(sheets, queues)]
+            try:
+                # the pool starts the sheets in order, so the sheet read next is always being parsed
+                for future, queue in zip(futures, queues):
+                    yield from _received_chunks(future, queue)
+                    if traced:
+                        tracing.add_events(future.result()[1])
+                    else:
+                        future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    @classmethod
+    def sheet_chunks(cls, worksheet, chunk_size, usecols=None):
+        """
+        Parse one sheet in row chunks.
+        :param worksheet: read-only worksheet
+        :param chunk_size:
+        :param usecols: names of the columns to keep, None for every column
+        :return: generator of dataframes with the Source_Sheet column
+        """
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [cls._convert_cell(name) for name in header]
+        width = len(columns)
+        # positions of the columns to keep, the other cells are dropped before conversion
+        positions = None
+        if usecols is not None:
+            positions = [i for i, name in enumerate(columns) if name in usecols]
+            columns = [columns[i] for i in positions]
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            if len(row) != width:
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+            if positions is not None:
+                row = [row[i] for i in positions]
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield cls._to_frame(batch, columns).assign(**{SHEET_COLUMN: worksheet.title})
+                batch = []
+        if batch:
+            yield cls._to_frame(batch, columns).assign(**{SHEET_COLUMN: worksheet.title})
+
+    @classmethod
+    def _to_frame(cls, rows, columns):
+        """
+        Build a chunk dataframe from raw sheet rows.
+        Cells go through the same conversion and type inference as pd.read_excel, and whole numbers
+        are kept as ints, so a streamed chunk has the same values as the fully loaded sheet and the
+        same text whatever the chunk size.
+        :param rows:
+        :param columns:
+        :return:
+        """
+        data = [columns]
+        data.extend([cls._convert_cell(value) for value in row] for row in rows)
+        return whole_numbers_as_int(TextParser(data, header=0).read())
+
+    @staticmethod
+    def _convert_cell(value):
+        """
+        Convert a raw cell value the way the pandas openpyxl engine does.
+        :param value:
+        :return:
+        """
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
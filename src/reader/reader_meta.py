@@ -0,0 +1,59 @@
+from __future__ import annotations
+import os
+from abc import ABCMeta
+from typing import TYPE_CHECKING
+from inspect import isabstract
+
+
+class ReaderMeta(ABCMeta):
+    if TYPE_CHECKING:
+        from .base_reader import Reader
+
+    """
+    Metaclass for reader classes
+    """
+
+    _registry = {}
+
+    def __new__(cls, name, bases, attrs):
+        """
+        Create a new reader class
+        :param name:
+        :param bases:
+        :param attrs:
+        """
+        reader_class = super().__new__(cls, name, bases, attrs)
+        if not isabstract(reader_class):
+            cls._registry[name] = reader_class
+        return reader_class
+
+    def __class_getitem__(cls, item) -> type[Reader]:
+        """
+        Get a reader class by name
+        :param item:
+        :return:
+        """
+        return cls._registry[item]
+
+    @classmethod
+    def get_readers(mcs) -> dict[str, type[Reader]]:
+        """
+        Get all registered readers, i.e. the reader classes imported so far.
+        :return:
+        """
+        return mcs._registry
+
+    @classmethod
+    def for_file(mcs, file_path) -> type[Reader] | None:
+        """
+        Get the reader of a file by its extension, e.g. '.xlsx' or '.csv.gz'
+        :param file_path:
+        :return: None if no reader supports the file type
+        """
+        name = os.path.basename(file_path).lower()
+        matches = [(extension, reader) for reader in mcs._registry.values()
+                   for extension in reader.get_extensions() if name.endswith(extension)]
+        if not matches:
+            return None
+        # the longest extension wins, e.g. '.csv.gz' over '.gz'
+        return max(matches, key=lambda match: len(match[0]))[1]
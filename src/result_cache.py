@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+
+from src.store import load_yaml, DEFAULT_STORE_CONFIG_PATH
+
+DEFAULT_CACHE_PATH = 'database/result_cache.db'
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ResultCache:
+    """
+    Persistent cache of command results, kept in a small SQLite file next to the store.
+    Results are keyed by command name, parameters and the dataset version of the store,
+    so an upload, which bumps the version, makes every older entry unreachable.
+    The least recently used entries are evicted once the cache holds more than
+    max_entries results or max_bytes of pickled results.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "entries" '
+                              '("key" TEXT PRIMARY KEY, "command" TEXT, "result" BLOB, '
+                              '"size" INTEGER, "last_used" INTEGER)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS "stats" ("name" TEXT PRIMARY KEY, "value" INTEGER)')
+
+    @classmethod
+    def open(cls, config_path=DEFAULT_STORE_CONFIG_PATH):
+        """
+        Open the cache described by the 'cache' section of the store config.
+        :param config_path:
+        :return: None if the cache is disabled
+        """
+        config = load_yaml(config_path).get('cache') or {}
+        if not config.get('enabled', True):
+            return None
+        return cls(config.get('path', DEFAULT_CACHE_PATH),
+                   config.get('max_entries', DEFAULT_MAX_ENTRIES),
+                   config.get('max_bytes', DEFAULT_MAX_BYTES))
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def make_key(command_name, parameters, version):
+        """
+        Build the cache key of a command call.
+        :param command_name:
+        :param parameters: parameters returned by get_parameters
+        :param version: dataset version of the store
+        :return:
+        """
+        payload = json.dumps([command_name, parameters, version], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _next_tick(self):
+        return self.conn.execute('SELECT COALESCE(MAX("last_used"), 0) + 1 FROM "entries"').fetchone()[0]
+
+    def _count(self, name):
+        self.conn.execute('INSERT INTO "stats" VALUES (?, 1) ON CONFLICT("name") DO UPDATE SET "value" = "value" + 1',
+                          (name,))
+
+    def get(self, key):
+        """
+        Get a cached result, counting the hit or miss.
+        :param key:
+        :return: None on a miss
+        """
+        with self.conn:
+            row = self.conn.execute('SELECT "result" FROM "entries" WHERE "key" = ?', (key,)).fetchone()
+            self._count('hits' if row else 'misses')
+            if row is None:
+                return None
+            self.conn.execute('UPDATE "entries" SET "last_used" = ? WHERE "key" = ?', (self._next_tick(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, command_name, result):
+        """
+        Cache a result and evict the least recently used entries over the limits.
+        :param key:
+        :param command_name:
+        :param result:
+        :return:
+        """
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO "entries" VALUES (?, ?, ?, ?, ?)',
+                              (key, command_name, blob, len(blob), self._next_tick()))
+            self._evict()
+
+    def _evict(self):
+        """
+        Delete the least recently used entries beyond max_entries or max_bytes.
+        :return:
+        """
+        total_bytes, evicted = 0, []
+        rows = self.conn.execute('SELECT "key", "size" FROM "entries" ORDER BY "last_used" DESC').fetchall()
+        for position, (key, size) in enumerate(rows):
+            total_bytes += size
+            if position >= self.max_entries or (position > 0 and total_bytes > self.max_bytes):
+                evicted.append((key,))
+        if evicted:
+            self.conn.executemany('DELETE FROM "entries" WHERE "key" = ?', evicted)
+            self.conn.execute('INSERT INTO "stats" VALUES (\'evictions\', ?) '
+                              'ON CONFLICT("name") DO UPDATE SET "value" = "value" + excluded."value"',
+                              (len(evicted),))
+
+    def stats(self):
+        """
+        Get the hit/miss statistics and the size of the cache.
+        :return:
+        """
+        counters = dict(self.conn.execute('SELECT "name", "value" FROM "stats"').fetchall())
+        entries, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM("size"), 0) FROM "entries"').fetchone()
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'evictions': counters.get('evictions', 0),
+            'entries': entries,
+            'bytes': size,
+        }
+
+    def clear(self):
+        """
+        Remove every cached result and reset the statistics.
+        :return:
+        """
+        with self.conn:
+            self.conn.execute('DELETE FROM "entries"')
+            self.conn.execute('DELETE FROM "stats"')
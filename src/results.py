@@ -0,0 +1,22 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def to_json_value(result):
+    """
+    Convert a command result to a JSON-serializable value.
+    Dataframes use the 'split' layout: {"columns": [...], "index": [...], "data": [[...], ...]}.
+    :param result:
+    :return:
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return json.loads(result.to_json(orient='split', date_format='iso'))
+    if isinstance(result, (np.ndarray, pd.Categorical, pd.Index, pd.api.extensions.ExtensionArray)):
+        return json.loads(pd.Series(result).to_json(orient='values', date_format='iso'))
+    if isinstance(result, dict):
+        return {key: to_json_value(value) for key, value in result.items()}
+    if isinstance(result, np.generic):
+        return result.item()
+    return result
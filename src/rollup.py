@@ -0,0 +1,209 @@
+import json
+import logging
+
+import pandas as pd
+
+from src import tracing
+from src.commission_month import add_commission_month
+from src.store import where_clause
+
+# dimensions of the cube, every rollup is a sum over a subset of them
+ROLLUP_DIMENSIONS = ['Carrier_Name', 'Plan_Name', 'Earner_Name', 'Earner_Type', 'Commission_Month']
+ROLLUP_VALUE = 'Commission_Amount'
+ROWS_COLUMN = 'Rows'
+# rows per chunk read from the store when the cube is rebuilt
+REBUILD_CHUNK_SIZE = 50_000
+
+
+def summarize(df, sign=1):
+    """
+    Sum the commissions and count the rows of normalized rows per cell of the cube.
+    :param df: normalized rows, columns missing from them count as missing dimension values
+    :param sign: -1 to summarize rows that are removed
+    :return: dataframe of the dimensions, the summed Commission_Amount and the Rows count
+    """
+    if 'Commission_Month' not in df.columns and 'Commission_Period' in df.columns:
+        df = add_commission_month(df)
+    cells = pd.DataFrame({dimension: df[dimension].astype(object) if dimension in df.columns
+                          else pd.Series(None, index=df.index, dtype=object)
+                          for dimension in ROLLUP_DIMENSIONS})
+    cells['Commission_Month'] = pd.to_numeric(cells['Commission_Month'], errors='coerce').astype('Int64')
+    amounts = pd.to_numeric(df[ROLLUP_VALUE], errors='coerce') if ROLLUP_VALUE in df.columns else 0.0
+    cells[ROLLUP_VALUE] = amounts * sign
+    cells[ROWS_COLUMN] = sign
+    return cells.groupby(ROLLUP_DIMENSIONS, dropna=False, sort=False)[[ROLLUP_VALUE, ROWS_COLUMN]].sum() \
+        .reset_index()
+
+
+class RollupCube:
+    """
+    Commissions pre-aggregated by carrier, plan, earner, earner type and month, kept in SQLite
+    next to the ingestion ledger:
+        rollup_cube   one row per combination of the dimensions: the summed Commission_Amount and the row count
+        rollup_state  the dataset version the cube reflects
+    The store applies the rows each write adds and removes, so the cube follows uploads, deletes and
+    rollbacks without reading the data again. Sums over any subset of the dimensions are then read
+    from the cube, which is orders of magnitude smaller than the rows.
+    A cube that does not reflect the dataset version, e.g. after a write that failed halfway, is
+    rebuilt from the store the next time it is read.
+    """
+    TABLE_NAME = 'rollup_cube'
+    STATE_TABLE_NAME = 'rollup_state'
+    # columns of the stored rows the cube sums
+    columns = ROLLUP_DIMENSIONS + [ROLLUP_VALUE]
+
+    def __init__(self, store, conn):
+        """
+        :param store: store the cube summarizes
+        :param conn: SQLite connection holding the cube tables
+        """
+        self.store = store
+        self.conn = conn
+        dimension_sql = ', '.join(f'"{dimension}"' for dimension in ROLLUP_DIMENSIONS)
+        with self.conn:
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.TABLE_NAME}" ("cell" TEXT PRIMARY KEY, '
+                              f'{dimension_sql}, "{ROLLUP_VALUE}" REAL, "{ROWS_COLUMN}" INTEGER)')
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.STATE_TABLE_NAME}" '
+                              f'("key" TEXT PRIMARY KEY, "value")')
+            new = self.conn.execute(f'SELECT 1 FROM "{self.STATE_TABLE_NAME}" WHERE "key" = \'version\'') \
+                .fetchone() is None
+            if new and not store.count():
+                # the empty cube of an empty store is current, the first upload maintains it
+                self._set_version(store.get_version())
+
+    def get_version(self):
+        """
+        Get the dataset version the cube reflects.
+        :return: None when the cube is stale
+        """
+        row = self.conn.execute(f'SELECT "value" FROM "{self.STATE_TABLE_NAME}" WHERE "key" = \'version\'').fetchone()
+        return row[0] if row else None
+
+    def _set_version(self, version):
+        self.conn.execute(f'INSERT OR REPLACE INTO "{self.STATE_TABLE_NAME}" VALUES (\'version\', ?)', (version,))
+
+    def is_current(self):
+        return self.get_version() == self.store.get_version()
+
+    def begin(self):
+        """
+        Start maintaining the cube through a write of the store.
+        The cube is marked stale until commit(), so a write interrupted halfway leaves it to be rebuilt.
+        Like apply() and commit(), it runs in the caller's transaction of the connection.
+        :return: whether the write should apply its rows to the cube, False when the cube is stale anyway
+        """
+        if not self.is_current():
+            return False
+        self._set_version(None)
+        return True
+
+    def commit(self, version):
+        """
+        Record that the cube reflects the dataset version written.
+        :param version:
+        :return:
+        """
+        self._set_version(version)
+
+    def apply(self, added=None, removed=None):
+        """
+        Add the rows a write stores and subtract the rows it replaces or deletes.
+        :param added: normalized rows written
+        :param removed: stored rows replaced or deleted, with at least the dimension and value columns
+        :return:
+        """
+        deltas = [summarize(df, sign) for df, sign in ((added, 1), (removed, -1)) if df is not None and not df.empty]
+        if not deltas:
+            return
+        delta = deltas[0] if len(deltas) == 1 else \
+            pd.concat(deltas).groupby(ROLLUP_DIMENSIONS, dropna=False, sort=False)[[ROLLUP_VALUE, ROWS_COLUMN]] \
+            .sum().reset_index()
+        with tracing.span('rollup.apply', cells=len(delta)):
+            columns = ['cell'] + ROLLUP_DIMENSIONS + [ROLLUP_VALUE, ROWS_COLUMN]
+            column_sql = ', '.join(f'"{col}"' for col in columns)
+            sql = (f'INSERT INTO "{self.TABLE_NAME}" ({column_sql}) VALUES ({", ".join("?" for _ in columns)}) '
+                   f'ON CONFLICT("cell") DO UPDATE SET '
+                   f'"{ROLLUP_VALUE}" = "{ROLLUP_VALUE}" + excluded."{ROLLUP_VALUE}", '
+                   f'"{ROWS_COLUMN}" = "{ROWS_COLUMN}" + excluded."{ROWS_COLUMN}"')
+            dimensions = delta[ROLLUP_DIMENSIONS].astype(object).where(delta[ROLLUP_DIMENSIONS].notna(), None)
+            records = ((json.dumps(cell, default=int), *cell, float(amount), int(rows))
+                       for cell, amount, rows in zip(map(list, dimensions.itertuples(index=False)),
+                                                     delta[ROLLUP_VALUE], delta[ROWS_COLUMN]))
+            self.conn.executemany(sql, records)
+            self.conn.execute(f'DELETE FROM "{self.TABLE_NAME}" WHERE "{ROWS_COLUMN}" <= 0')
+
+    def rebuild(self):
+        """
+        Rebuild the cube from the stored rows, streamed in chunks.
+        :return: number of cells
+        """
+        version = self.store.get_version()
+        with tracing.span('rollup.rebuild') as span:
+            with self.conn:
+                self.conn.execute(f'DELETE FROM "{self.TABLE_NAME}"')
+                for chunk in self.store.iter_chunks(columns=self.columns, chunk_size=REBUILD_CHUNK_SIZE):
+                    self.apply(added=chunk)
+                self.commit(version)
+            cells = self.conn.execute(f'SELECT COUNT(*) FROM "{self.TABLE_NAME}"').fetchone()[0]
+            span.set(cells=cells)
+        logging.info(f"Rebuilt the rollup cube of dataset version {version}: {cells} cells.")
+        return cells
+
+    def refresh(self):
+        """
+        Rebuild the cube if it does not reflect the stored rows.
+        :return:
+        """
+        if not self.is_current():
+            self.rebuild()
+
+    def load(self, filters=None):
+        """
+        Load the cells of the cube, rebuilding it first if it is stale.
+        :param filters: (column, operator, value) filters on the dimensions
+        :return: dataframe of the dimensions, Commission_Amount and Rows
+        """
+        for column, _, _ in filters or []:
+            if column not in ROLLUP_DIMENSIONS:
+                raise ValueError(f"The rollup cube cannot filter on '{column}', its dimensions are "
+                                 f"{ROLLUP_DIMENSIONS}.")
+        self.refresh()
+        column_sql = ', '.join(f'"{col}"' for col in ROLLUP_DIMENSIONS + [ROLLUP_VALUE, ROWS_COLUMN])
+        where_sql, params = where_clause(filters)
+        cells = pd.read_sql_query(f'SELECT {column_sql} FROM "{self.TABLE_NAME}"{where_sql}', self.conn,
+                                  params=params)
+        cells['Commission_Month'] = cells['Commission_Month'].astype('Int64')
+        cells[ROWS_COLUMN] = cells[ROWS_COLUMN].astype('int64')
+        return cells
+
+    def rollup(self, by=None, filters=None):
+        """
+        Sum the commissions and rows over a subset of the dimensions.
+        :param by: dimensions to group by, None for the grand total
+        :param filters: (column, operator, value) filters on the dimensions
+        :return: dataframe indexed by the dimensions, with Commission_Amount and Rows, sorted by the dimensions
+        """
+        return self.group(self.load(filters), by)
+
+    @staticmethod
+    def group(cells, by=None):
+        """
+        Sum cells of the cube over a subset of the dimensions, missing dimension values forming their own groups.
+        :param cells: dataframe of the dimensions, Commission_Amount and Rows
+        :param by: dimensions to group by, None for the grand total
+        :return: dataframe indexed by the dimensions, with Commission_Amount and Rows, sorted by the dimensions
+        """
+        if not by:
+            return pd.DataFrame({ROLLUP_VALUE: [cells[ROLLUP_VALUE].sum()], ROWS_COLUMN: [cells[ROWS_COLUMN].sum()]},
+                                index=pd.Index(['Total']))
+        return cells.groupby(list(by), dropna=False)[[ROLLUP_VALUE, ROWS_COLUMN]].sum()
+
+    def sum_by(self, keys, filters=None):
+        """
+        Sum Commission_Amount by one or more dimensions, like aggregation.sum_by on the stored rows.
+        :param keys: dimension or list of dimensions
+        :param filters: (column, operator, value) filters on the dimensions
+        :return: dataframe indexed by the keys with the summed Commission_Amount
+        """
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        return self.load(filters).groupby(keys)[[ROLLUP_VALUE]].sum()
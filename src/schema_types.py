@@ -0,0 +1,102 @@
+import logging
+
+import pandas as pd
+
+from src.date_parser import parse_dates
+
+
+def is_schema_type(series, expected_type):
+    """
+    Check whether a column already has the dtype a schema type maps to.
+    :param series:
+    :param expected_type:
+    :return:
+    """
+    if expected_type == 'datetime':
+        return pd.api.types.is_datetime64_any_dtype(series)
+    if expected_type in ('str', 'object'):
+        return pd.api.types.is_object_dtype(series)
+    if expected_type == 'float':
+        return series.dtype == 'float64'
+    if expected_type == 'int':
+        return series.dtype == 'int64'
+    return str(series.dtype) == expected_type
+
+
+def cast_to_schema_type(series, expected_type):
+    """
+    Cast a column to a type of fixed_schema_data_types.
+    Besides the numpy types this supports 'datetime', 'category', Arrow-backed strings
+    ('string[pyarrow]') and nullable or downcast numerics such as 'Int16' or 'float32'.
+    :param series:
+    :param expected_type:
+    :return:
+    """
+    if expected_type == 'datetime':
+        return parse_dates(series)
+    if expected_type == 'string[pyarrow]':
+        try:
+            return series.astype('string[pyarrow]')
+        except ImportError:
+            logging.warning("pyarrow is not installed, falling back to the 'string' dtype.")
+            return series.astype('string')
+    if expected_type == 'str':
+        # missing values stay None, stored as NULL rather than the text 'nan' or '<NA>'
+        return series.astype(str).where(series.notna(), None)
+    if pd.api.types.is_object_dtype(series) and expected_type not in ('str', 'object', 'category', 'string'):
+        # nullable and downcast numerics cannot be cast straight from mixed object values
+        series = pd.to_numeric(series)
+    return series.astype(expected_type)
+
+
+def cast_to_schema_types(df, data_types, convert_objects=True):
+    """
+    Cast the columns of a dataframe to their fixed schema types, skipping columns that
+    already have the target dtype so the types are only applied once.
+    :param df:
+    :param data_types: fixed_schema_data_types of the schema config
+    :param convert_objects: whether to convert object columns to 'str' values again;
+                            disabled when loading from a store, whose text columns are already strings
+    :return:
+    """
+    for column, expected_type in data_types.items():
+        if column not in df.columns:
+            continue
+        is_done = is_schema_type(df[column], expected_type)
+        if is_done and not (convert_objects and expected_type == 'str'):
+            continue
+        try:
+            df[column] = cast_to_schema_type(df[column], expected_type)
+            logging.info(f"Column '{column}' successfully converted to {expected_type}.")
+        except Exception as e:
+            logging.warning(f"Failed to align column '{column}' to {expected_type}: {e}")
+    return df
+
+
+def memory_report(df):
+    """
+    Report the bytes per column and per row of a dataframe, before and after the
+    compact schema types, where 'before' is the plain object/float64 representation.
+    :param df:
+    :return:
+    """
+    before = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series):
+            series = series.astype(object)
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            series = series.astype('float64')
+        before[column] = series.memory_usage(index=False, deep=True)
+    after = df.memory_usage(index=False, deep=True)
+
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'before_bytes': pd.Series(before),
+        'after_bytes': after,
+    })
+    report.loc['Total'] = ['', report['before_bytes'].sum(), report['after_bytes'].sum()]
+    rows = max(len(df), 1)
+    report['before_bytes_per_row'] = (report['before_bytes'] / rows).round(1)
+    report['after_bytes_per_row'] = (report['after_bytes'] / rows).round(1)
+    return report
@@ -0,0 +1,157 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+from src.command import run_command
+from src.results import to_json_value
+from src.schema_types import cast_to_schema_types
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# a request line holds one small JSON object, larger lines are rejected
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+class QueryServer:
+    """
+    Serve the CLI commands from a resident copy of the normalized data.
+    Requests and responses are JSON lines, e.g.
+        {"command": "find_top_k_carrier", "args": {"k": 3}}
+        {"ok": true, "version": 4, "result": {"columns": [...], "index": [...], "data": [...]}}
+    Before each request the dataset version of the store is checked, and only the rows
+    written by newer uploads are loaded and merged into the resident data.
+    Commands run quietly in worker threads on an immutable snapshot of the data,
+    so a reload never changes the data of a running command, and commands on the same
+    snapshot share their aggregations (see src/aggregation.py).
+    Reloads run in a worker thread too, so the event loop keeps answering the other clients,
+    whose requests run on the previous snapshot until the reload swaps the new one in.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.dataframe = None
+        self.version = None
+        self._reload_lock = asyncio.Lock()
+
+    def load(self):
+        """
+        Load the whole store into memory.
+        :return:
+        """
+        self.version = self.store.get_version()
+        self.dataframe = self.store.load()
+        logging.info(f"Loaded {len(self.dataframe)} rows at version {self.version}.")
+
+    def refresh(self):
+        """
+        Merge the rows of the uploads since the resident version into the resident data.
+        Falls back to a full load when the store cannot tell which rows changed or rows were removed.
+        Runs in a worker thread, holding the store's lock while it reads the store.
+        :return: whether the data changed
+        """
+        with self.store.lock:
+            return self._refresh()
+
+    def _refresh(self):
+        version = self.store.get_version()
+        if version == self.version:
+            return False
+        changes = self.store.load_changes(self.version)
+        if changes is None or self.dataframe is None:
+            self.load()
+            return True
+
+        kept = self.dataframe[~self.dataframe['Primary_Key'].isin(changes['Primary_Key'])]
+        merged = pd.concat([kept, changes], ignore_index=True)
+        if len(merged) != self.store.count():
+            self.load()
+            return True
+        # concatenating categoricals with different categories gives object columns
+        self.dataframe = cast_to_schema_types(merged, self.store.data_types, convert_objects=False)
+        self.version = version
+        logging.info(f"Merged {len(changes)} changed rows, now at version {version}.")
+        return True
+
+    async def handle_request(self, request):
+        """
+        Run one request and build its response.
+        :param request: decoded JSON request
+        :return:
+        """
+        try:
+            if not isinstance(request, dict) or 'command' not in request:
+                raise ValueError("A request must be a JSON object with a 'command'.")
+            loop = asyncio.get_running_loop()
+            if self._reload_lock.locked():
+                # another request is reloading, answer from the current snapshot meanwhile
+                dataframe, version = self.dataframe, self.version
+            else:
+                async with self._reload_lock:
+                    await loop.run_in_executor(None, self.refresh)
+                    dataframe, version = self.dataframe, self.version
+            result = await loop.run_in_executor(
+                None, run_command, request['command'], request.get('args'), dataframe, self.store)
+            return {'ok': True, 'version': version, 'result': to_json_value(result)}
+        except Exception as e:
+            logging.warning(f"Request {request!r} failed: {e}")
+            return {'ok': False, 'error': str(e)}
+
+    async def handle_client(self, reader, writer):
+        """
+        Answer the JSON line requests of one client until it disconnects.
+        :param reader:
+        :param writer:
+        :return:
+        """
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except json.JSONDecodeError as e:
+                    response = {'ok': False, 'error': f"Invalid JSON: {e}"}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logging.warning(f"Client connection closed: {e}")
+        finally:
+            writer.close()
+
+    async def start(self, socket_path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Start listening on a Unix socket, or on a TCP port.
+        :param socket_path:
+        :param host:
+        :param port:
+        :return: asyncio server
+        """
+        if self.dataframe is None:
+            self.load()
+        if socket_path:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(socket_path)
+            return await asyncio.start_unix_server(self.handle_client, path=socket_path, limit=MAX_REQUEST_BYTES)
+        return await asyncio.start_server(self.handle_client, host=host, port=port, limit=MAX_REQUEST_BYTES)
+
+
+def serve(store, socket_path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Serve queries until interrupted.
+    :param store:
+    :param socket_path: Unix socket to listen on, instead of host and port
+    :param host:
+    :param port:
+    :return:
+    """
+    async def run():
+        server = QueryServer(store)
+        async with await server.start(socket_path, host, port):
+            print(f"Serving {len(server.dataframe)} rows on {socket_path or f'{host}:{port}'}", flush=True)
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Server stopped.")
@@ -0,0 +1,578 @@
+import heapq
+import json
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from src import tracing
+
+# distinct Member_ID are counted per carrier and plan, heavy hitters are summed by commission
+DISTINCT_COLUMN = 'Member_ID'
+DISTINCT_BY = ['Carrier_Name', 'Plan_Name']
+HEAVY_HITTER_COLUMNS = ['Earner_Name', 'Agent_ID']
+WEIGHT_COLUMN = 'Commission_Amount'
+DISTINCT_COLUMN_NAME = 'Distinct_Members'
+# defaults of the 'sketches' section of the store config
+DEFAULT_PRECISION = 12
+DEFAULT_EPSILON = 0.001
+DEFAULT_DELTA = 0.01
+DEFAULT_CANDIDATES = 1000
+# rows per chunk read from the store when the sketches are rebuilt
+REBUILD_CHUNK_SIZE = 50_000
+_LOW_32 = np.uint64(0xFFFFFFFF)
+
+
+def hash_values(values):
+    """
+    Hash values to 64 bits, missing values are dropped.
+    Values are hashed as text, so the same id read as a number or as text hashes the same.
+    :param values: series or sequence
+    :return: uint64 array
+    """
+    values = pd.Series(values, dtype=object).dropna()
+    return pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+
+
+def _bit_length(values):
+    """
+    Number of significant bits of uint64 values, 0 for 0, computed exactly on 32-bit halves.
+    :param values:
+    :return:
+    """
+    high, low = values >> np.uint64(32), values & _LOW_32
+    high_bits = np.frexp(high.astype(np.float64))[1]
+    low_bits = np.frexp(low.astype(np.float64))[1]
+    return np.where(high > 0, 32 + high_bits, low_bits)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch counting distinct values in 2^precision one-byte registers, with a
+    relative standard error of about 1.04 / sqrt(2^precision), e.g. 1.6% for precision 12.
+    Sketches of the same precision merge into the sketch of the union of their values.
+    """
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 18:
+            raise ValueError("The HyperLogLog precision must be between 4 and 18.")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add_hashes(self, hashes):
+        """
+        Add hashed values: the first precision bits select a register, which keeps the
+        largest position of the first set bit of the other bits.
+        :param hashes: uint64 array
+        :return:
+        """
+        if not len(hashes):
+            return
+        suffix_bits = 64 - self.precision
+        indices = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+        suffixes = hashes & np.uint64((1 << suffix_bits) - 1)
+        ranks = (suffix_bits + 1 - _bit_length(suffixes)).astype(np.uint8)
+        np.maximum.at(self.registers, indices, ranks)
+
+    def add(self, values):
+        self.add_hashes(hash_values(values))
+
+    def merge(self, other):
+        """
+        Merge another sketch of the same precision into this one.
+        :param other:
+        :return: self
+        """
+        if other.precision != self.precision:
+            raise ValueError("Only HyperLogLog sketches of the same precision can be merged.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """
+        Estimate the number of distinct values, with linear counting for small cardinalities.
+        :return:
+        """
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, precision):
+        return cls(precision, np.frombuffer(data, dtype=np.uint8).copy())
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch of non-negative weighted values: depth rows of width counters. An estimate
+    exceeds the true sum by at most epsilon x the total weight with probability 1 - delta, where
+    width = e / epsilon and depth = ln(1 / delta).
+    The sketch is linear, so weights added before are subtracted again by adding them negated.
+    """
+    def __init__(self, width, depth, table=None, total=0.0):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float64) if table is None else table
+        self.total = total
+
+    @classmethod
+    def from_error(cls, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("The Count-Min epsilon and delta must be between 0 and 1.")
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    def _columns(self, hashes):
+        # one hash per row from two halves of the 64-bit hash (Kirsch-Mitzenmacher)
+        first, second = hashes & _LOW_32, (hashes >> np.uint64(32)) | np.uint64(1)
+        return [((first + np.uint64(row) * second) % np.uint64(self.width)).astype(np.int64)
+                for row in range(self.depth)]
+
+    def add_hashes(self, hashes, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if not len(hashes) or not weights.any():
+            return
+        for row, columns in enumerate(self._columns(hashes)):
+            self.table[row] += np.bincount(columns, weights=weights, minlength=self.width)
+        self.total += float(weights.sum())
+
+    def estimate_hashes(self, hashes):
+        if not len(hashes):
+            return np.zeros(0)
+        return np.min([self.table[row][columns] for row, columns in enumerate(self._columns(hashes))], axis=0)
+
+    def to_bytes(self):
+        return self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, width, depth, total):
+        return cls(width, depth, np.frombuffer(data, dtype=np.float64).reshape(depth, width).copy(), total)
+
+
+class HeavyHitters:
+    """
+    Values with the largest summed weights, e.g. earners by commission: Count-Min sketches of the
+    positive and of the negative weights, e.g. chargebacks, one of the row counts, and the candidates,
+    the values with the largest estimates seen so far.
+    Each sum is estimated as the positive minus the negative estimate, so it is over-estimated by at most
+    epsilon x the positive total and under-estimated by at most epsilon x the negative total.
+    Every value written is estimated again, so a value climbing into the top becomes a candidate.
+    A count is never under-estimated, so a candidate whose count estimate is 0 has no rows left and is dropped.
+    """
+    def __init__(self, sketch, counts=None, capacity=DEFAULT_CANDIDATES, candidates=(), negative=None):
+        """
+        :param sketch: Count-Min sketch of the positive weights
+        :param counts: Count-Min sketch of the row counts
+        :param capacity: number of candidates kept
+        :param candidates:
+        :param negative: Count-Min sketch of the negated negative weights
+        """
+        self.sketch = sketch
+        self.counts = counts or CountMinSketch(sketch.width, sketch.depth)
+        self.negative = negative or CountMinSketch(sketch.width, sketch.depth)
+        self.capacity = capacity
+        self.candidates = list(candidates)
+
+    def add(self, values, weights, sign=1):
+        """
+        Add weighted values and keep the candidates with the largest estimates.
+        :param values: series of values, missing values are dropped
+        :param weights: series of weights aligned with the values
+        :param sign: -1 to subtract the rows of the values again
+        :return:
+        """
+        values = pd.Series(values, dtype=object)
+        if isinstance(weights, pd.Series):
+            weights = pd.to_numeric(weights, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        else:
+            weights = np.full(len(values), weights, dtype=np.float64)
+        present = values.notna().to_numpy()
+        values, weights = values[present], weights[present]
+        if values.empty:
+            return
+        hashes = hash_values(values)
+        self.sketch.add_hashes(hashes, np.maximum(weights, 0) * sign)
+        self.negative.add_hashes(hashes, np.maximum(-weights, 0) * sign)
+        self.counts.add_hashes(hashes, np.full(len(hashes), float(sign)))
+        candidates = list(dict.fromkeys(self.candidates + values.astype(str).unique().tolist()))
+        self.candidates = [candidate for candidate, _ in self._largest(self.capacity, candidates)]
+
+    def _largest(self, k, candidates):
+        """
+        Estimate the sums of candidates and keep the k largest of those with rows.
+        Ties, up to rounding, are ordered by value, so the order does not depend on the order of the writes.
+        :param k:
+        :param candidates:
+        :return: list of (value, estimated sum), largest first
+        """
+        hashes = hash_values(candidates)
+        has_rows = self.counts.estimate_hashes(hashes) > 0.5
+        estimates = self.sketch.estimate_hashes(hashes) - self.negative.estimate_hashes(hashes)
+        pairs = [(candidate, round(estimate, 6)) for candidate, estimate, kept
+                 in zip(candidates, estimates.tolist(), has_rows.tolist()) if kept]
+        return heapq.nsmallest(k, pairs, key=lambda pair: (-pair[1], pair[0]))
+
+    def top(self, k):
+        """
+        Estimate the sums of the k largest candidates.
+        :param k:
+        :return: list of (value, estimated sum), largest first
+        """
+        return self._largest(k, self.candidates)
+
+    @property
+    def error(self):
+        """
+        Bound of the over-estimate of each sum, epsilon x the total positive weight.
+        :return:
+        """
+        return self.sketch.epsilon * self.sketch.total
+
+    @property
+    def under_error(self):
+        """
+        Bound of the under-estimate of each sum, epsilon x the total negative weight, 0 without negative weights.
+        :return:
+        """
+        return self.negative.epsilon * self.negative.total
+
+
+def _cell(key):
+    return tuple(None if pd.isna(value) else str(value) for value in key)
+
+
+def _member_hashes(df):
+    """
+    Hash the carrier, plan and Member_ID of the rows with a Member_ID, as text like hash_values.
+    :param df:
+    :return: uint64 array
+    """
+    df = df[df[DISTINCT_COLUMN].notna()]
+    cells = pd.DataFrame({column: df[column].astype(str).where(df[column].notna(), None) if column in df.columns
+                          else None for column in DISTINCT_BY + [DISTINCT_COLUMN]}, index=df.index)
+    return pd.util.hash_pandas_object(cells, index=False).to_numpy()
+
+
+def empty_sketch(kind, precision=DEFAULT_PRECISION, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA,
+                 candidates=DEFAULT_CANDIDATES):
+    """
+    Create an empty sketch of a kind.
+    :param kind: Member_ID, Earner_Name or Agent_ID
+    :return: dict of HyperLogLog by (carrier, plan) for Member_ID, else HeavyHitters
+    """
+    if kind == DISTINCT_COLUMN:
+        return {}
+    return HeavyHitters(CountMinSketch.from_error(epsilon, delta), capacity=candidates)
+
+
+def add_rows(kind, sketch, df, precision=DEFAULT_PRECISION):
+    """
+    Add rows to a sketch of a kind.
+    :param kind: Member_ID, Earner_Name or Agent_ID
+    :param sketch: sketch returned by empty_sketch
+    :param df:
+    :param precision: HyperLogLog precision of the new carrier and plan cells
+    :return:
+    """
+    if kind == DISTINCT_COLUMN:
+        _add_members(sketch, df, precision)
+    elif kind in df.columns:
+        sketch.add(df[kind], df[WEIGHT_COLUMN] if WEIGHT_COLUMN in df.columns else 0.0)
+
+
+def _add_members(sketches, df, precision):
+    """
+    Add the Member_ID of rows to the HyperLogLog of their carrier and plan.
+    :param sketches: dict of HyperLogLog by (carrier, plan)
+    :param df:
+    :param precision:
+    :return:
+    """
+    if DISTINCT_COLUMN not in df.columns:
+        return
+    df = df[df[DISTINCT_COLUMN].notna()]
+    if df.empty:
+        return
+    hashes = hash_values(df[DISTINCT_COLUMN])
+    cells = pd.DataFrame({column: df[column].astype(object) if column in df.columns else None
+                          for column in DISTINCT_BY}, index=df.index)
+    for key, positions in cells.groupby(DISTINCT_BY, dropna=False, sort=False).indices.items():
+        cell = _cell(key)
+        if cell not in sketches:
+            sketches[cell] = HyperLogLog(precision)
+        sketches[cell].add_hashes(hashes[positions])
+
+
+def build_sketches(chunks, kinds=None, precision=DEFAULT_PRECISION, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA,
+                   candidates=DEFAULT_CANDIDATES):
+    """
+    Build sketches from rows, e.g. from data that is already loaded.
+    :param chunks: iterable of dataframes
+    :param kinds: kinds of sketches to build, all kinds when None
+    :return: dict of sketches by kind
+    """
+    sketches = {kind: empty_sketch(kind, precision, epsilon, delta, candidates)
+                for kind in kinds or SketchSet.KINDS}
+    for chunk in chunks:
+        for kind, sketch in sketches.items():
+            add_rows(kind, sketch, chunk, precision)
+    return sketches
+
+
+class SketchSet:
+    """
+    Mergeable sketches of the stored rows, kept in SQLite next to the ingestion ledger:
+        sketches      one row per sketch: a HyperLogLog of the Member_ID of each carrier and plan,
+                      and a heavy-hitter sketch of the commissions of each Earner_Name and Agent_ID
+        sketch_state  the dataset version and parameters each kind of sketch reflects
+    The store applies the rows each write adds and removes, like for the rollup cube. Count-Min
+    sketches subtract removed rows; a HyperLogLog cannot forget a member, so a write removing members
+    leaves the distinct counts stale. Stale sketches, or sketches of other parameters than the config,
+    are rebuilt from the store the next time they are read.
+    """
+    TABLE_NAME = 'sketches'
+    STATE_TABLE_NAME = 'sketch_state'
+    KINDS = [DISTINCT_COLUMN] + HEAVY_HITTER_COLUMNS
+    # columns of the stored rows the sketches read
+    columns = DISTINCT_BY + [DISTINCT_COLUMN] + HEAVY_HITTER_COLUMNS + [WEIGHT_COLUMN]
+
+    def __init__(self, store, conn, precision=DEFAULT_PRECISION, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA,
+                 candidates=DEFAULT_CANDIDATES):
+        """
+        :param store: store the sketches summarize
+        :param conn: SQLite connection holding the sketch tables
+        :param precision: HyperLogLog precision, 2^precision registers per carrier and plan
+        :param epsilon: Count-Min error, as a fraction of the total commission
+        :param delta: probability of an estimate exceeding that error
+        :param candidates: number of heavy-hitter candidates kept
+        """
+        self.store = store
+        self.conn = conn
+        self.options = {'precision': precision, 'epsilon': epsilon, 'delta': delta, 'candidates': candidates}
+        # sketches of the write in progress, by kind
+        self._pending = {}
+        with self.conn:
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.TABLE_NAME}" ("kind" TEXT, "key" TEXT, '
+                              f'"data" BLOB, "meta" TEXT, PRIMARY KEY ("kind", "key"))')
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.STATE_TABLE_NAME}" '
+                              f'("kind" TEXT PRIMARY KEY, "version", "parameters" TEXT)')
+            new = self.conn.execute(f'SELECT 1 FROM "{self.STATE_TABLE_NAME}"').fetchone() is None
+            if new and not store.count():
+                # the empty sketches of an empty store are current, the first upload maintains them
+                for kind in self.KINDS:
+                    self._set_version(kind, store.get_version())
+
+    @classmethod
+    def options_from_config(cls, config):
+        """
+        Read the sketch parameters of the 'sketches' section of the store config.
+        :param config:
+        :return:
+        """
+        config = config or {}
+        return {'precision': config.get('precision', DEFAULT_PRECISION),
+                'epsilon': config.get('epsilon', DEFAULT_EPSILON),
+                'delta': config.get('delta', DEFAULT_DELTA),
+                'candidates': config.get('candidates', DEFAULT_CANDIDATES)}
+
+    def parameters(self, kind):
+        if kind == DISTINCT_COLUMN:
+            return json.dumps({'precision': self.options['precision']})
+        # sketches of the earlier layout, without separate negative sums, are rebuilt
+        return json.dumps({**{name: self.options[name] for name in ('epsilon', 'delta', 'candidates')},
+                           'signed': True})
+
+    def _set_version(self, kind, version):
+        self.conn.execute(f'INSERT OR REPLACE INTO "{self.STATE_TABLE_NAME}" VALUES (?, ?, ?)',
+                          (kind, version, self.parameters(kind)))
+
+    def is_current(self, kind):
+        """
+        Whether a kind of sketch reflects the stored rows with the configured parameters.
+        :param kind: Member_ID, Earner_Name or Agent_ID
+        :return:
+        """
+        row = self.conn.execute(f'SELECT "version", "parameters" FROM "{self.STATE_TABLE_NAME}" WHERE "kind" = ?',
+                                (kind,)).fetchone()
+        return row is not None and row[0] == self.store.get_version() and row[1] == self.parameters(kind)
+
+    def begin(self):
+        """
+        Start maintaining the current sketches through a write of the store, reading them into memory.
+        They are marked stale until commit(), in the caller's transaction of the connection.
+        :return: whether the write should apply its rows, False when every sketch is stale anyway
+        """
+        self._pending = {kind: self._read(kind) for kind in self.KINDS if self.is_current(kind)}
+        for kind in self._pending:
+            self._set_version(kind, None)
+        return bool(self._pending)
+
+    def apply(self, added=None, removed=None):
+        """
+        Add the rows a write stores and subtract the rows it replaces or deletes.
+        :param added: normalized rows written
+        :param removed: stored rows replaced or deleted, with at least the columns of the sketches
+        :return:
+        """
+        added = None if added is None or added.empty else added
+        removed = None if removed is None or removed.empty else removed
+        if DISTINCT_COLUMN in self._pending and removed is not None \
+                and not self._members_kept(added, removed):
+            # the members may be gone, the distinct counts are rebuilt when next read
+            del self._pending[DISTINCT_COLUMN]
+        for kind, sketch in self._pending.items():
+            if added is not None:
+                add_rows(kind, sketch, added, self.options['precision'])
+            if removed is not None and kind != DISTINCT_COLUMN and kind in removed.columns:
+                sketch.add(removed[kind], removed[WEIGHT_COLUMN], sign=-1)
+
+    @staticmethod
+    def _members_kept(added, removed):
+        """
+        Whether every carrier, plan and member of the removed rows is written again, e.g. when rows
+        are replaced with corrected commissions.
+        :param added:
+        :param removed:
+        :return:
+        """
+        if DISTINCT_COLUMN not in removed.columns or removed[DISTINCT_COLUMN].isna().all():
+            return True
+        if added is None or DISTINCT_COLUMN not in added.columns:
+            return False
+        return bool(np.isin(_member_hashes(removed), _member_hashes(added)).all())
+
+    def commit(self, version):
+        """
+        Write the maintained sketches and record the dataset version they reflect.
+        :param version:
+        :return:
+        """
+        for kind, sketch in self._pending.items():
+            self._write(kind, sketch)
+            self._set_version(kind, version)
+        self._pending = {}
+
+    def _read(self, kind):
+        rows = self.conn.execute(f'SELECT "key", "data", "meta" FROM "{self.TABLE_NAME}" WHERE "kind" = ?',
+                                 (kind,)).fetchall()
+        if kind == DISTINCT_COLUMN:
+            return {tuple(json.loads(key)): HyperLogLog.from_bytes(data, json.loads(meta)['precision'])
+                    for key, data, meta in rows}
+        if not rows:
+            return empty_sketch(kind, **self.options)
+        _, data, meta = rows[0]
+        meta = json.loads(meta)
+        size = len(data) // 3
+        sums, negative, counts = data[:size], data[size:2 * size], data[2 * size:]
+        return HeavyHitters(CountMinSketch.from_bytes(sums, meta['width'], meta['depth'], meta['total']),
+                            CountMinSketch.from_bytes(counts, meta['width'], meta['depth'], meta['rows']),
+                            self.options['candidates'], meta['candidates'],
+                            CountMinSketch.from_bytes(negative, meta['width'], meta['depth'], meta['negative']))
+
+    def _write(self, kind, sketch):
+        self.conn.execute(f'DELETE FROM "{self.TABLE_NAME}" WHERE "kind" = ?', (kind,))
+        if kind == DISTINCT_COLUMN:
+            meta = json.dumps({'precision': self.options['precision']})
+            records = ((kind, json.dumps(list(cell)), hll.to_bytes(), meta) for cell, hll in sketch.items())
+        else:
+            meta = json.dumps({'width': sketch.sketch.width, 'depth': sketch.sketch.depth,
+                               'total': sketch.sketch.total, 'negative': sketch.negative.total,
+                               'rows': sketch.counts.total, 'candidates': sketch.candidates})
+            # the positive sums, the negative sums and the counts, of the same size
+            records = [(kind, '', sketch.sketch.to_bytes() + sketch.negative.to_bytes() + sketch.counts.to_bytes(),
+                        meta)]
+        self.conn.executemany(f'INSERT INTO "{self.TABLE_NAME}" VALUES (?, ?, ?, ?)', records)
+
+    def rebuild(self, kinds=None):
+        """
+        Rebuild sketches from the stored rows, streamed in chunks.
+        :param kinds: kinds of sketches to rebuild, all kinds when None
+        :return:
+        """
+        kinds = kinds or self.KINDS
+        version = self.store.get_version()
+        with tracing.span('sketches.rebuild', kinds=','.join(kinds)):
+            chunks = self.store.iter_chunks(columns=self.columns, chunk_size=REBUILD_CHUNK_SIZE)
+            sketches = build_sketches(chunks, kinds, **self.options)
+            with self.conn:
+                for kind, sketch in sketches.items():
+                    self._write(kind, sketch)
+                    self._set_version(kind, version)
+        logging.info(f"Rebuilt the {kinds} sketches of dataset version {version}.")
+
+    def load(self, kind):
+        """
+        Read a kind of sketch, rebuilding it first if it is stale.
+        :param kind: Member_ID, Earner_Name or Agent_ID
+        :return:
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"No sketch of '{kind}', the sketches are {self.KINDS}.")
+        if not self.is_current(kind):
+            self.rebuild([kind])
+        return self._read(kind)
+
+
+def distinct_members(sketches, by=None, filters=None, precision=DEFAULT_PRECISION):
+    """
+    Estimate the distinct Member_ID per carrier and/or plan by merging the HyperLogLog sketches
+    of their carrier and plan cells.
+    :param sketches: dict of HyperLogLog by (carrier, plan)
+    :param by: Carrier_Name and/or Plan_Name, None for the distinct members of all rows
+    :param filters: dict of allowed values by Carrier_Name and/or Plan_Name
+    :param precision: precision of the sketches
+    :return: dataframe indexed by the by columns with the estimated Distinct_Members,
+             and their relative standard error in attrs['relative_error']
+    """
+    by = list(by or [])
+    positions = [DISTINCT_BY.index(column) for column in by]
+    merged = {}
+    for cell, sketch in sketches.items():
+        if any(cell[DISTINCT_BY.index(column)] not in values for column, values in (filters or {}).items()):
+            continue
+        group = tuple(cell[position] for position in positions)
+        merged[group] = HyperLogLog(sketch.precision).merge(sketch) if group not in merged \
+            else merged[group].merge(sketch)
+    counts = {group: round(sketch.count()) for group, sketch in merged.items()}
+    if not by:
+        result = pd.DataFrame({DISTINCT_COLUMN_NAME: [counts.get((), 0)]}, index=pd.Index(['Total']))
+    else:
+        if len(by) == 1:
+            index = pd.Index([group[0] for group in counts], name=by[0])
+        else:
+            index = pd.MultiIndex.from_tuples(list(counts), names=by)
+        result = pd.DataFrame({DISTINCT_COLUMN_NAME: list(counts.values())}, index=index, dtype='int64') \
+            .sort_index()
+    result.attrs['relative_error'] = 1.04 / math.sqrt(1 << precision)
+    return result
+
+
+def top_hitters(heavy_hitters, column, k):
+    """
+    Estimate the k values with the largest summed commissions.
+    :param heavy_hitters: HeavyHitters of the column
+    :param column: Earner_Name or Agent_ID
+    :param k:
+    :return: dataframe indexed by the column with the estimated Commission_Amount, largest first,
+             and the bounds of their over- and under-estimate in attrs['error'] and attrs['under_error']
+    """
+    top = heavy_hitters.top(k)
+    result = pd.DataFrame({WEIGHT_COLUMN: [estimate for _, estimate in top]},
+                          index=pd.Index([value for value, _ in top], name=column))
+    result.attrs['error'] = heavy_hitters.error
+    result.attrs['under_error'] = heavy_hitters.under_error
+    return result
@@ -0,0 +1,626 @@
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import pandas as pd
+import yaml
+
+from src import tracing
+from src.commission_month import add_commission_month
+from src.date_parser import DateParser
+from src.schema_types import cast_to_schema_types
+
+DEFAULT_DB_PATH = 'database/normalized.db'
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_STORE_CONFIG_PATH = 'config/store_config.yaml'
+LEGACY_CSV_PATH = 'database/normalized.csv'
+
+FILTER_OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'in')
+# keys per 'in' filter when loading rows by Primary_Key
+KEY_BATCH_SIZE = 5_000
+# dataset version of the upload that last wrote a row, only loaded when requested explicitly
+VERSION_COLUMN = '_version'
+
+
+def load_yaml(path):
+    """
+    Load a YAML file, returning an empty dict if it cannot be read.
+    :param path:
+    :return:
+    """
+    try:
+        with open(path, 'r') as file:
+            return yaml.safe_load(file) or {}
+    except Exception as e:
+        logging.error(f"Error loading YAML file: {e}")
+        return {}
+
+
+def apply_filters(df, filters):
+    """
+    Apply (column, operator, value) filters to a dataframe.
+    :param df:
+    :param filters:
+    :return:
+    """
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        series = df[column]
+        if op == 'in':
+            mask &= series.isin(value)
+        elif op == '==':
+            mask &= series == value
+        elif op == '!=':
+            mask &= series != value
+        elif op == '<':
+            mask &= series < value
+        elif op == '<=':
+            mask &= series <= value
+        elif op == '>':
+            mask &= series > value
+        elif op == '>=':
+            mask &= series >= value
+        else:
+            raise ValueError(f"Unsupported filter operator '{op}'.")
+    return df[mask.fillna(False).astype(bool)]
+
+
+def where_clause(filters):
+    """
+    Translate filters into a parameterized SQLite WHERE clause.
+    :param filters:
+    :return: (sql, params)
+    """
+    if not filters:
+        return '', []
+    conditions, params = [], []
+    for column, op, value in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator '{op}'.")
+        if op == 'in':
+            values = list(value)
+            conditions.append(f'"{column}" IN ({", ".join("?" for _ in values)})')
+            params.extend(values)
+        else:
+            conditions.append(f'"{column}" {"=" if op == "==" else op} ?')
+            params.append(value)
+    return ' WHERE ' + ' AND '.join(conditions), params
+
+
+class BaseStore(ABC):
+    """
+    Base class of the normalized data stores.
+    Filters are lists of (column, operator, value) tuples combined with AND,
+    using the operators in FILTER_OPERATORS.
+    """
+    def __init__(self, schema_config_path='config/schema_config.yaml'):
+        self.schema_config = load_yaml(schema_config_path)
+        self._ledger = None
+        self._rollup = None
+        self._sketches = None
+        # 'sketches' section of the store config, set by open_store
+        self.sketch_config = None
+        # held by the threads of the server and of a batch while they use the store's connections
+        self.lock = threading.RLock()
+
+    @property
+    def data_types(self):
+        return self.schema_config.get('fixed_schema_data_types', {})
+
+    @abstractmethod
+    def upsert_chunks(self, chunks):
+        """
+        Upsert normalized chunks on Primary_Key, later rows winning.
+        :param chunks:
+        :return: number of rows written
+        """
+        raise NotImplementedError("Each store must implement an upsert_chunks method.")
+
+    @abstractmethod
+    def load(self, columns=None, filters=None):
+        """
+        Load the normalized data.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters pushed down to the storage
+        :return:
+        """
+        raise NotImplementedError("Each store must implement a load method.")
+
+    def iter_chunks(self, columns=None, filters=None, chunk_size=DEFAULT_BATCH_SIZE):
+        """
+        Stream the normalized data in chunks, so callers need not hold it all in memory.
+        Stores without a streaming reader load it at once.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters pushed down to the storage
+        :param chunk_size: rows per chunk
+        :return: generator of dataframes
+        """
+        yield self.load(columns=columns, filters=filters)
+
+    def chunk_streams(self, columns=None, filters=None, chunk_size=DEFAULT_BATCH_SIZE, parts=1):
+        """
+        Split the normalized data into independent chunk streams, which other threads can read concurrently.
+        Stores that cannot split their data give one stream.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters pushed down to the storage
+        :param chunk_size: rows per chunk
+        :param parts: number of streams wanted
+        :return: list of generators of dataframes, together covering every matching row once
+        """
+        return [self.iter_chunks(columns=columns, filters=filters, chunk_size=chunk_size)]
+
+    @abstractmethod
+    def get_version(self):
+        """
+        Get the dataset version, bumped by every upsert so cached results of older data are not reused.
+        :return: 0 for a store that was never written
+        """
+        raise NotImplementedError("Each store must implement a get_version method.")
+
+    def get_location(self):
+        """
+        Get the location of the stored data, which tells stores of different data apart,
+        e.g. in the keys of the result cache.
+        :return:
+        """
+        return type(self).__name__
+
+    @abstractmethod
+    def count(self):
+        """
+        Count the stored rows.
+        :return:
+        """
+        raise NotImplementedError("Each store must implement a count method.")
+
+    @abstractmethod
+    def get_columns(self):
+        """
+        Get the stored columns, empty if nothing was stored yet.
+        :return:
+        """
+        raise NotImplementedError("Each store must implement a get_columns method.")
+
+    @abstractmethod
+    def delete_keys(self, keys):
+        """
+        Delete the rows of Primary_Keys, bumping the dataset version.
+        :param keys:
+        :return: number of rows deleted
+        """
+        raise NotImplementedError("Each store must implement a delete_keys method.")
+
+    def load_keys(self, keys, columns=None):
+        """
+        Load the rows of Primary_Keys.
+        :param keys:
+        :param columns: columns to read, None for all columns
+        :return:
+        """
+        keys = list(keys)
+        frames = [self.load(columns=columns, filters=[('Primary_Key', 'in', keys[start:start + KEY_BATCH_SIZE])])
+                  for start in range(0, len(keys), KEY_BATCH_SIZE)]
+        if not frames:
+            return pd.DataFrame(columns=columns or [])
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def _ledger_connection(self):
+        """
+        Open the SQLite connection holding the ingestion ledger tables.
+        :return:
+        """
+        raise NotImplementedError("This store does not keep an ingestion ledger.")
+
+    @property
+    def ledger(self):
+        """
+        The ingestion ledger of the store, see src/ledger.py.
+        :return:
+        """
+        if self._ledger is None:
+            from src.ledger import IngestionLedger
+            self._ledger = IngestionLedger(self, self._ledger_connection())
+        return self._ledger
+
+    @property
+    def rollup(self):
+        """
+        The rollup cube of the store, kept next to the ingestion ledger, see src/rollup.py.
+        :return:
+        """
+        if self._rollup is None:
+            from src.rollup import RollupCube
+            self._rollup = RollupCube(self, self._ledger_connection())
+        return self._rollup
+
+    @property
+    def sketches(self):
+        """
+        The distinct member and heavy-hitter sketches of the store, kept next to the ingestion ledger,
+        see src/sketches.py.
+        :return:
+        """
+        if self._sketches is None:
+            from src.sketches import SketchSet
+            self._sketches = SketchSet(self, self._ledger_connection(),
+                                       **SketchSet.options_from_config(self.sketch_config))
+        return self._sketches
+
+    @property
+    def summaries(self):
+        """
+        The summaries every write maintains with the rows it adds and removes: the rollup cube and the sketches.
+        Each has the columns it reads, and begin(), apply(added, removed) and commit(version) methods.
+        :return:
+        """
+        return [self.rollup, self.sketches]
+
+    @staticmethod
+    def begin_summaries(summaries):
+        """
+        Start maintaining the summaries that are current through a write.
+        :param summaries:
+        :return: (the summaries to apply the rows of the write to, the stored columns they read)
+        """
+        maintained = [summary for summary in summaries if summary.begin()]
+        columns = list(dict.fromkeys(column for summary in maintained for column in summary.columns))
+        return maintained, columns
+
+    def load_changes(self, since_version, columns=None):
+        """
+        Load the rows written by the uploads after a dataset version.
+        :param since_version:
+        :param columns: columns to read, None for all columns
+        :return: None if the stored rows do not record their version
+        """
+        if VERSION_COLUMN not in self.get_columns():
+            return None
+        return self.load(columns=columns, filters=[(VERSION_COLUMN, '>', since_version)])
+
+    def close(self):
+        pass
+
+    def query(self, sql):
+        """
+        Run a SQL query on the normalized data, exposed as the table 'df'.
+        Stores without a SQL engine copy the data into pandasql once per query.
+        :param sql:
+        :return:
+        """
+        import pandasql as psql
+        return psql.sqldf(sql, {'df': self.load()})
+
+    def upsert(self, df):
+        """
+        Upsert a single dataframe.
+        :param df:
+        :return: number of rows written
+        """
+        return self.upsert_chunks([df])
+
+    def import_csv(self, csv_path, chunk_size=DEFAULT_BATCH_SIZE):
+        """
+        Import a normalized CSV written by earlier versions into the store.
+        :param csv_path:
+        :param chunk_size:
+        :return: number of rows imported
+        """
+        chunks = pd.read_csv(csv_path, chunksize=chunk_size)
+        date_parser = DateParser()
+        rows = self.upsert_chunks(
+            chunk.assign(**{col: date_parser.parse(chunk[col], col)
+                            for col in chunk.columns if self.data_types.get(col) == 'datetime'})
+            for chunk in chunks
+        )
+        print(f"Imported {rows} rows from {csv_path}")
+        return rows
+
+
+class SQLiteStore(BaseStore):
+    """
+    SQLite storage for the normalized data.
+    Rows are upserted on a unique Primary_Key index, so the cost of an upload
+    depends on the number of rows it contains, not on the size of the history.
+    """
+    TABLE_NAME = 'normalized_data'
+    METADATA_TABLE_NAME = 'store_metadata'
+    QUERY_VIEW_NAME = 'df'
+    DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, batch_size=DEFAULT_BATCH_SIZE,
+                 schema_config_path='config/schema_config.yaml'):
+        super().__init__(schema_config_path)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        # the server reloads and reads the summaries from worker threads, taking turns through self.lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.query_conn = None
+        # columns of the normalized table the query view was created with
+        self._query_columns = None
+        self._query_lock = threading.Lock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.METADATA_TABLE_NAME}" '
+                              f'("key" TEXT PRIMARY KEY, "value")')
+            self._ensure_indexes(self.get_columns())
+
+    def close(self):
+        if self.query_conn is not None:
+            self.query_conn.close()
+        self.conn.close()
+
+    def query(self, sql):
+        """
+        Run a SQL query directly on the database, where the normalized table is exposed
+        as the view 'df' for queries written for pandasql.
+        Queries run on a separate read-only connection, which keeps its prepared statements
+        between queries, so ad-hoc SQL cannot modify the stored data.
+        Queries from several threads, e.g. of a batch, take turns on the connection.
+        :param sql:
+        :return:
+        """
+        with self._query_lock:
+            if self.query_conn is None:
+                self.query_conn = sqlite3.connect(self.db_path, cached_statements=256, check_same_thread=False)
+                self.query_conn.execute('PRAGMA query_only = ON')
+            columns = [row[1] for row in self.query_conn.execute(f'PRAGMA main.table_info("{self.TABLE_NAME}")')]
+            if columns != self._query_columns:
+                # uploads add columns, e.g. Source_Sheet, which the view only shows once it is recreated
+                column_sql = ', '.join(f'"{col}"' for col in columns if col != VERSION_COLUMN) or '*'
+                self.query_conn.execute('PRAGMA query_only = OFF')
+                self.query_conn.execute(f'DROP VIEW IF EXISTS temp."{self.QUERY_VIEW_NAME}"')
+                self.query_conn.execute(f'CREATE TEMP VIEW "{self.QUERY_VIEW_NAME}" '
+                                        f'AS SELECT {column_sql} FROM main."{self.TABLE_NAME}"')
+                self.query_conn.execute('PRAGMA query_only = ON')
+                self._query_columns = columns
+            return pd.read_sql_query(sql, self.query_conn)
+
+    def get_location(self):
+        return os.path.abspath(self.db_path)
+
+    def get_columns(self):
+        """
+        Get the columns of the normalized table, empty if it does not exist yet.
+        :return:
+        """
+        rows = self.conn.execute(f'PRAGMA table_info("{self.TABLE_NAME}")').fetchall()
+        return [row[1] for row in rows]
+
+    def _ensure_table(self, columns):
+        """
+        Create the table, its unique Primary_Key index and its Commission_Month index,
+        adding any new columns.
+        :param columns:
+        :return:
+        """
+        existing = self.get_columns()
+        if not existing:
+            column_sql = ', '.join(f'"{col}"' for col in columns)
+            self.conn.execute(f'CREATE TABLE "{self.TABLE_NAME}" ({column_sql})')
+            self.conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "idx_{self.TABLE_NAME}_primary_key" '
+                              f'ON "{self.TABLE_NAME}" ("Primary_Key")')
+        for col in columns:
+            if existing and col not in existing:
+                self.conn.execute(f'ALTER TABLE "{self.TABLE_NAME}" ADD COLUMN "{col}"')
+                if col == 'Commission_Month':
+                    # backfill the period key of rows stored before it was derived
+                    self.conn.execute(f'UPDATE "{self.TABLE_NAME}" '
+                                      f'SET "Commission_Month" = CAST(strftime(\'%Y%m\', "Commission_Period") AS INTEGER) '
+                                      f'WHERE "Commission_Period" IS NOT NULL')
+        self._ensure_indexes(columns)
+
+    def _ensure_indexes(self, columns):
+        """
+        Index Commission_Month, so period queries are index range scans,
+        and the row versions, so the rows of recent uploads are found without a scan.
+        :param columns:
+        :return:
+        """
+        if 'Commission_Month' in columns:
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.TABLE_NAME}_commission_month" '
+                              f'ON "{self.TABLE_NAME}" ("Commission_Month")')
+        if VERSION_COLUMN in columns:
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.TABLE_NAME}_version" '
+                              f'ON "{self.TABLE_NAME}" ("{VERSION_COLUMN}")')
+
+    def _to_records(self, df):
+        """
+        Convert a dataframe into rows of SQLite-compatible Python values.
+        :param df:
+        :return:
+        """
+        converted = {}
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                series = series.dt.strftime(self.DATETIME_FORMAT)
+            series = series.astype(object)
+            converted[col] = series.where(series.notna(), None)
+        return zip(*converted.values())
+
+    def upsert_chunks(self, chunks):
+        """
+        Upsert normalized chunks on Primary_Key in a single transaction.
+        Later rows win over earlier ones, both within the batch and against stored rows.
+        :param chunks: iterable of normalized dataframes
+        :return: number of rows written
+        """
+        rows_written = 0
+        summaries = self.summaries
+        with self.conn:
+            version = self.get_version() + 1
+            # the summaries are updated in the same transaction, with the rows each chunk adds and replaces
+            maintained, summary_columns = self.begin_summaries(summaries)
+            for chunk in chunks:
+                if 'Primary_Key' not in chunk.columns:
+                    raise ValueError("Merged 'Primary_Key' column not found in the dataframe.")
+                with tracing.span('store.write', rows=len(chunk)):
+                    chunk = add_commission_month(chunk).assign(**{VERSION_COLUMN: version})
+                    columns = list(chunk.columns)
+                    self._ensure_table(columns)
+                    if maintained:
+                        written = chunk.drop_duplicates(subset='Primary_Key', keep='last')
+                        replaced = self.load_keys(written['Primary_Key'], columns=summary_columns)
+                        for summary in maintained:
+                            summary.apply(added=written, removed=replaced)
+
+                    column_sql = ', '.join(f'"{col}"' for col in columns)
+                    placeholders = ', '.join('?' for _ in columns)
+                    updates = ', '.join(f'"{col}" = excluded."{col}"' for col in columns if col != 'Primary_Key')
+                    sql = (f'INSERT INTO "{self.TABLE_NAME}" ({column_sql}) VALUES ({placeholders}) '
+                           f'ON CONFLICT("Primary_Key") DO UPDATE SET {updates}')
+
+                    for start in range(0, len(chunk), self.batch_size):
+                        self.conn.executemany(sql, self._to_records(chunk.iloc[start:start + self.batch_size]))
+                rows_written += len(chunk)
+            self.conn.execute(f'INSERT OR REPLACE INTO "{self.METADATA_TABLE_NAME}" VALUES (\'version\', ?)',
+                              (version,))
+            for summary in maintained:
+                summary.commit(version)
+        return rows_written
+
+    def delete_keys(self, keys):
+        """
+        Delete rows by Primary_Key through the unique index, in a single transaction.
+        :param keys:
+        :return: number of rows deleted
+        """
+        keys = list(keys)
+        if not keys or not self.get_columns():
+            return 0
+        summaries = self.summaries
+        with self.conn:
+            version = self.get_version() + 1
+            maintained, summary_columns = self.begin_summaries(summaries)
+            if maintained:
+                removed = self.load_keys(keys, columns=summary_columns)
+                for summary in maintained:
+                    summary.apply(removed=removed)
+                    summary.commit(version)
+            before = self.conn.total_changes
+            self.conn.executemany(f'DELETE FROM "{self.TABLE_NAME}" WHERE "Primary_Key" = ?',
+                                  ((key,) for key in keys))
+            deleted = self.conn.total_changes - before
+            self.conn.execute(f'INSERT OR REPLACE INTO "{self.METADATA_TABLE_NAME}" VALUES (\'version\', ?)',
+                              (version,))
+        return deleted
+
+    def _ledger_connection(self):
+        # the ledger shares the connection, so an upload and its ledger records commit together
+        return self.conn
+
+    def get_version(self):
+        row = self.conn.execute(f'SELECT "value" FROM "{self.METADATA_TABLE_NAME}" '
+                                f'WHERE "key" = \'version\'').fetchone()
+        return row[0] if row else 0
+
+    def count(self):
+        if not self.get_columns():
+            return 0
+        return self.conn.execute(f'SELECT COUNT(*) FROM "{self.TABLE_NAME}"').fetchone()[0]
+
+    def _where_clause(self, filters):
+        return where_clause(filters)
+
+    def load(self, columns=None, filters=None):
+        """
+        Load the normalized data, pushing the column projection and filters down into SQL.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters
+        :return:
+        """
+        stored_columns = self.get_columns()
+        if not stored_columns:
+            return pd.DataFrame(columns=columns or [])
+        if columns:
+            columns = [col for col in columns if col in stored_columns]
+        else:
+            columns = [col for col in stored_columns if col != VERSION_COLUMN]
+
+        column_sql = ', '.join(f'"{col}"' for col in columns)
+        where_sql, params = self._where_clause(filters)
+        datetime_columns = [col for col in columns if self.data_types.get(col) == 'datetime']
+        df = pd.read_sql_query(f'SELECT {column_sql} FROM "{self.TABLE_NAME}"{where_sql}', self.conn,
+                               params=params,
+                               parse_dates={col: {'format': self.DATETIME_FORMAT} for col in datetime_columns})
+        return cast_to_schema_types(df, self.data_types, convert_objects=False)
+
+
+    def iter_chunks(self, columns=None, filters=None, chunk_size=DEFAULT_BATCH_SIZE):
+        """
+        Stream the normalized data from a cursor, chunk_size rows at a time.
+        Each stream reads on its own connection, so streams may run in other threads.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters
+        :param chunk_size: rows per chunk
+        :return: generator of dataframes with the schema types
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            stored_columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{self.TABLE_NAME}")')]
+            if not stored_columns:
+                return
+            if columns:
+                columns = [col for col in columns if col in stored_columns]
+            else:
+                columns = [col for col in stored_columns if col != VERSION_COLUMN]
+
+            column_sql = ', '.join(f'"{col}"' for col in columns)
+            where_sql, params = self._where_clause(filters)
+            datetime_columns = [col for col in columns if self.data_types.get(col) == 'datetime']
+            for chunk in pd.read_sql_query(f'SELECT {column_sql} FROM "{self.TABLE_NAME}"{where_sql}', conn,
+                                           params=params, chunksize=chunk_size,
+                                           parse_dates={col: {'format': self.DATETIME_FORMAT}
+                                                        for col in datetime_columns}):
+                yield cast_to_schema_types(chunk, self.data_types, convert_objects=False)
+        finally:
+            conn.close()
+
+    def chunk_streams(self, columns=None, filters=None, chunk_size=DEFAULT_BATCH_SIZE, parts=1):
+        """
+        Split the table into rowid ranges, each streamed on its own connection.
+        :param columns: columns to read, None for all columns
+        :param filters: (column, operator, value) filters
+        :param chunk_size: rows per chunk
+        :param parts: number of streams wanted
+        :return: list of generators of dataframes
+        """
+        if parts <= 1 or not self.get_columns():
+            return [self.iter_chunks(columns=columns, filters=filters, chunk_size=chunk_size)]
+        low, high = self.conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM "{self.TABLE_NAME}"').fetchone()
+        if low is None:
+            return []
+        step = -(-(high - low + 1) // parts)
+        return [self.iter_chunks(columns=columns, chunk_size=chunk_size,
+                                 filters=list(filters or []) + [('rowid', '>=', start), ('rowid', '<', start + step)])
+                for start in range(low, high + 1, step)]
+
+
+def open_store(config_path=DEFAULT_STORE_CONFIG_PATH, legacy_csv_path=LEGACY_CSV_PATH):
+    """
+    Open the store backend selected in the store config, importing the legacy
+    normalized CSV once if the store is empty.
+    :param config_path:
+    :param legacy_csv_path:
+    :return:
+    """
+    config = load_yaml(config_path)
+    backend = config.get('backend', 'sqlite')
+    if backend == 'sqlite':
+        store = SQLiteStore(config.get('sqlite', {}).get('path', DEFAULT_DB_PATH))
+    elif backend == 'parquet':
+        from src.parquet_store import ParquetStore, DEFAULT_PARQUET_PATH
+        store = ParquetStore(config.get('parquet', {}).get('path', DEFAULT_PARQUET_PATH))
+    else:
+        raise ValueError(f"Unknown store backend '{backend}'.")
+
+    store.sketch_config = config.get('sketches')
+    if not store.count() and os.path.exists(legacy_csv_path):
+        store.import_csv(legacy_csv_path)
+    return store
@@ -0,0 +1,289 @@
+"""
+Opt-in tracing of the pipeline stages and commands.
+A span records the wall time, CPU time, peak memory and row count of a stage:
+
+    with tracing.span('normalize.apply_config', rows=len(df)) as span:
+        ...
+        span.set(columns=len(df.columns))
+
+When tracing is disabled (the default) spans cost one function call. Enabled with
+`main.py --trace <prefix>`, the spans are written as JSON lines to <prefix>.jsonl and as a
+Chrome trace (chrome://tracing, https://ui.perfetto.dev) to <prefix>.trace.json.
+This module only imports the standard library, so main.py can import it at startup.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_tracer = None
+_STATUS_PATH = '/proc/self/status'
+_CLEAR_REFS_PATH = '/proc/self/clear_refs'
+
+
+def _max_rss_bytes():
+    """
+    Peak resident memory of the process since it started.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _read_rss():
+    """
+    Current and peak resident memory of the process since the peak was last reset, from /proc.
+    :return: (rss_bytes, peak_rss_bytes)
+    """
+    values = {}
+    with open(_STATUS_PATH) as status:
+        for line in status:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                values[line[:5]] = int(line.split()[1]) * 1024
+    return values['VmRSS'], values['VmHWM']
+
+
+def _reset_peak_rss():
+    with open(_CLEAR_REFS_PATH, 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def _can_reset_peak_rss():
+    try:
+        _read_rss()
+        _reset_peak_rss()
+        return True
+    except (OSError, KeyError, ValueError):
+        return False
+
+
+class Span:
+    """
+    A running span, attributes set on it are recorded when it ends.
+    """
+    __slots__ = ('name', 'attrs', 'start', 'start_wall', 'start_cpu', 'start_memory', 'peak_memory')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_memory = self.peak_memory = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Collect the spans of a process.
+    Spans nest per thread. CPU time and memory are those of the whole process: the peak memory of
+    a span is its peak resident memory above the resident memory at its start. The peak is reset
+    at the start of each span through /proc/self/clear_refs on Linux; elsewhere only the peak
+    resident memory of the process (max_rss_bytes) is recorded.
+    """
+    def __init__(self, trace_memory=True):
+        self.events = []
+        self.trace_memory = trace_memory and _can_reset_peak_rss()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        stack = self._stack()
+        span = Span(name, attrs)
+        if self.trace_memory:
+            current, peak = _read_rss()
+            if stack:
+                stack[-1].peak_memory = max(stack[-1].peak_memory, peak)
+            _reset_peak_rss()
+            span.start_memory = span.peak_memory = current
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=f'{type(e).__name__}: {e}')
+            raise
+        finally:
+            wall = time.perf_counter() - span.start_wall
+            cpu = time.process_time() - span.start_cpu
+            stack.pop()
+            event = {'name': name, 'start': span.start, 'wall_seconds': wall, 'cpu_seconds': cpu,
+                     'depth': len(stack), 'parent': stack[-1].name if stack else None,
+                     'pid': os.getpid(), 'tid': threading.get_ident()}
+            if self.trace_memory:
+                span.peak_memory = max(span.peak_memory, _read_rss()[1])
+                if stack:
+                    stack[-1].peak_memory = max(stack[-1].peak_memory, span.peak_memory)
+                event['peak_memory_bytes'] = span.peak_memory - span.start_memory
+            event['max_rss_bytes'] = _max_rss_bytes()
+            event.update(span.attrs)
+            with self._lock:
+                self.events.append(event)
+
+    def add_events(self, events):
+        """
+        Add the spans recorded by another process, e.g. an upload worker.
+        :param events:
+        :return:
+        """
+        with self._lock:
+            self.events.extend(events)
+
+    def summary(self):
+        """
+        Aggregate the spans by name.
+        :return: dict of name to count, wall and CPU seconds, rows and largest peak memory
+        """
+        totals = {}
+        for event in sorted(self.events, key=lambda event: event['start']):
+            total = totals.setdefault(event['name'], {'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                                      'rows': 0, 'peak_memory_bytes': 0})
+            total['count'] += 1
+            total['wall_seconds'] += event['wall_seconds']
+            total['cpu_seconds'] += event['cpu_seconds']
+            total['rows'] += event.get('rows') or 0
+            total['peak_memory_bytes'] = max(total['peak_memory_bytes'], event.get('peak_memory_bytes') or 0)
+        return totals
+
+    def write_jsonl(self, path):
+        """
+        Write one JSON object per span, in start order.
+        :param path:
+        :return:
+        """
+        with open(path, 'w') as file:
+            for event in sorted(self.events, key=lambda event: event['start']):
+                file.write(json.dumps(event, default=str) + '\n')
+
+    def write_chrome_trace(self, path):
+        """
+        Write the spans as complete events of the Chrome trace event format.
+        :param path:
+        :return:
+        """
+        skipped = {'name', 'start', 'wall_seconds', 'pid', 'tid'}
+        trace_events = [{'name': event['name'], 'cat': event['name'].split('.')[0], 'ph': 'X',
+                         'ts': event['start'] * 1e6, 'dur': event['wall_seconds'] * 1e6,
+                         'pid': event['pid'], 'tid': event['tid'],
+                         'args': {key: value for key, value in event.items() if key not in skipped}}
+                        for event in self.events]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file, default=str)
+
+    def write(self, prefix):
+        """
+        Write <prefix>.jsonl and <prefix>.trace.json.
+        :param prefix:
+        :return: the two paths
+        """
+        os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+        paths = (f'{prefix}.jsonl', f'{prefix}.trace.json')
+        self.write_jsonl(paths[0])
+        self.write_chrome_trace(paths[1])
+        return paths
+
+
+def enable(trace_memory=True):
+    """
+    Start recording spans in this process.
+    :param trace_memory: whether to measure the peak memory of each span
+    :return: the tracer
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(trace_memory)
+    return _tracer
+
+
+def disable():
+    """
+    Stop recording spans.
+    :return: the tracer that was recording, None if tracing was disabled
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, **attrs):
+    """
+    Record a stage when tracing is enabled.
+    :param name: stage name, e.g. 'normalize.apply_config'
+    :param attrs: attributes of the span, e.g. rows
+    :return: context manager giving the span
+    """
+    if _tracer is None:
+        return contextlib.nullcontext(_NULL_SPAN)
+    return _tracer.span(name, **attrs)
+
+
+def add_events(events):
+    """
+    Add the spans recorded by another process when tracing is enabled.
+    :param events:
+    :return:
+    """
+    if _tracer is not None:
+        _tracer.add_events(events)
+
+
+def traced_iter(name, iterable):
+    """
+    Record a span for the production of each item of an iterator, e.g. each chunk read from a file.
+    Items with a length set the rows of their span.
+    :param name:
+    :param iterable:
+    :return: generator of the items
+    """
+    if _tracer is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with span(name) as item_span:
+            item = next(iterator, StopIteration)
+            if item is not StopIteration and hasattr(item, '__len__'):
+                item_span.set(rows=len(item))
+        if item is StopIteration:
+            return
+        yield item
+
+
+def run_traced(func, *args, **kwargs):
+    """
+    Call a function with tracing enabled, in a worker process of a traced parent.
+    :param func:
+    :return: (result, recorded spans)
+    """
+    tracer = enable()
+    try:
+        return func(*args, **kwargs), list(tracer.events)
+    finally:
+        disable()
@@ -0,0 +1,103 @@
+import gc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import aggregation
+from src.aggregation import sum_by, stream_sum_by, top_k
+from src.command import FindTopKCarrier, FindTopKPlan, FindTopKEarnerByCommissionPeriod
+from src.store import SQLiteStore
+
+
+def _commissions():
+    return pd.DataFrame({
+        'Carrier_Name': pd.Categorical(['emblem', 'centene', 'emblem', 'healthfirst']),
+        'Commission_Amount': [1.0, 2.0, 3.0, 0.5],
+    })
+
+
+def test_sum_by_is_computed_once_per_dataframe(monkeypatch):
+    df = _commissions()
+    groupby = pd.DataFrame.groupby
+    calls = []
+    monkeypatch.setattr(pd.DataFrame, 'groupby', lambda self, *args, **kwargs: calls.append(args)
+                        or groupby(self, *args, **kwargs))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: sum_by(df, 'Carrier_Name'), range(16)))
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert top_k(results[0], 2)['Commission_Amount'].to_dict() == {'emblem': 4.0, 'centene': 2.0}
+    # another dataframe with the same keys is aggregated separately
+    assert sum_by(_commissions(), ['Carrier_Name']) is not results[0]
+    assert len(calls) == 2
+
+
+def test_sums_are_dropped_with_their_dataframe():
+    df = _commissions()
+    sum_by(df, 'Carrier_Name')
+    frame_id = id(df)
+
+    del df
+    gc.collect()
+
+    assert not any(entry[0] == frame_id for entry in aggregation._sums)
+    assert not any(entry[0] == frame_id for entry in aggregation._key_locks)
+
+
+def _store(tmp_path, backend, n_rows=500):
+    rng = np.random.default_rng(7)
+    rows = pd.DataFrame({
+        'Primary_Key': [f'key {i}' for i in range(n_rows)],
+        'Earner_Name': [f'Earner {i % 37}' for i in range(n_rows)],
+        'Commission_Amount': rng.integers(1, 500, n_rows) / 4,
+        'Commission_Period': pd.to_datetime([f'2024-{i % 6 + 1:02d}-01' for i in range(n_rows)]),
+        'Carrier_Name': [('emblem', 'centene', 'healthfirst')[i % 3] for i in range(n_rows)],
+        'Plan_Name': [f'Plan {i % 11}' if i % 13 else None for i in range(n_rows)],
+    })
+    if backend == 'parquet':
+        pytest.importorskip('pyarrow')
+        from src.parquet_store import ParquetStore
+        store = ParquetStore(str(tmp_path / 'parquet'))
+    else:
+        store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(rows)
+    return store
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_stream_sum_by_matches_sum_by(tmp_path, backend, workers):
+    store = _store(tmp_path, backend)
+    loaded = store.load()
+
+    for keys in ('Plan_Name', ['Commission_Month', 'Earner_Name']):
+        streamed = stream_sum_by(store, keys, chunk_size=40, workers=workers)
+        expected = sum_by(loaded, keys)
+        pd.testing.assert_frame_equal(streamed, expected, check_index_type=False, check_categorical=False)
+
+    filtered = stream_sum_by(store, 'Carrier_Name', filters=[('Carrier_Name', '==', 'nobody')], workers=workers)
+    assert filtered.empty and filtered.index.name == 'Carrier_Name'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+def test_top_k_commands_stream_the_store(tmp_path, backend, monkeypatch):
+    store = _store(tmp_path, backend)
+    # without a rollup cube, the sums are streamed from the store
+    monkeypatch.setattr(type(store), 'rollup', property(lambda self: None))
+    loaded = store.load()
+    commands = [(FindTopKCarrier(quiet=True), {'k': 2}), (FindTopKPlan(quiet=True), {'k': 4}),
+                (FindTopKEarnerByCommissionPeriod(quiet=True), {'k': 5, 'from': '2024-02', 'to': '2024-04'})]
+    expected = [command.execute(loaded, **parameters) for command, parameters in commands]
+
+    def load(*args, **kwargs):
+        raise AssertionError('the store was loaded into memory')
+    monkeypatch.setattr(type(store), 'load', load)
+
+    for (command, parameters), result in zip(commands, expected):
+        pd.testing.assert_frame_equal(command.run(store, **parameters), result,
+                                      check_index_type=False, check_categorical=False)
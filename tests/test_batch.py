@@ -0,0 +1,70 @@
+import json
+
+import pandas as pd
+import yaml
+
+from src.command import load_command
+from src.store import SQLiteStore
+
+
+def _store(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(pd.DataFrame({
+        'Primary_Key': ['a', 'b', 'c', 'd'],
+        'Earner_Name': ['Earner a', 'Earner b', 'Earner a', 'Earner c'],
+        'Commission_Amount': [1.0, 2.0, 3.0, 4.0],
+        'Commission_Period': pd.to_datetime(['2024-05-01', '2024-05-31', '2024-06-01', '2024-06-30']),
+        'Carrier_Name': ['emblem', 'centene', 'emblem', 'healthfirst'],
+        'Plan_Name': ['p1', 'p2', 'p1', 'p2'],
+    }))
+    return store
+
+
+def _batch(tmp_path, invocations, output='results.json'):
+    batch_file = tmp_path / 'nightly.yaml'
+    batch_file.write_text(yaml.safe_dump(invocations))
+    command_cls = load_command('batch')
+    return command_cls.get_parameters({'file': str(batch_file), 'output': str(tmp_path / output),
+                                       'workers': None})
+
+
+def test_batch_runs_every_command_and_writes_the_results(tmp_path):
+    store = _store(tmp_path)
+    parameters = _batch(tmp_path, [
+        {'command': 'find_top_k_carrier', 'args': {'k': 1}},
+        {'name': 'june', 'command': 'find_top_k_earner', 'args': {'k': 2, 'period': '2024-06'}},
+        {'name': 'may', 'command': 'find_top_k_earner', 'args': {'k': 2, 'period': '2024-05'}},
+        {'command': 'sql_query', 'args': {'query': 'SELECT COUNT(*) AS n FROM df'}},
+        {'command': 'find_top_k_plan', 'args': {'k': 0}},
+        {'command': 'missing'},
+    ])
+
+    load_command('batch')().run(store, **parameters)
+
+    output = json.loads((tmp_path / 'results.json').read_text())
+    assert output['version'] == 1
+    results = {entry['name']: entry for entry in output['results']}
+    assert list(results) == ['0:find_top_k_carrier', 'june', 'may', '3:sql_query', '4:find_top_k_plan',
+                             '5:missing']
+    assert results['0:find_top_k_carrier']['result']['index'] == ['emblem']
+    assert results['june']['result']['index'] == ['Earner c', 'Earner a']
+    assert results['may']['result']['data'] == [[2.0], [1.0]]
+    assert results['3:sql_query']['result']['data'] == [[4]]
+    assert not results['4:find_top_k_plan']['ok'] and not results['5:missing']['ok']
+    assert all(entry['seconds'] >= 0 for entry in output['results'] if entry['ok'])
+
+
+def test_batch_loads_the_data_once(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    parameters = _batch(tmp_path, [{'command': 'find_top_k_earner', 'args': {'k': 1, 'period': f'2024-0{month}'}}
+                                   for month in range(1, 10)] + [{'command': 'list_carriers'}])
+    load = store.load
+    loaded_columns = []
+    monkeypatch.setattr(store, 'load', lambda columns=None, filters=None: loaded_columns.append(columns)
+                        or load(columns, filters))
+
+    entries = load_command('batch')(quiet=True).run(store, **parameters)
+
+    assert loaded_columns == [['Carrier_Name', 'Commission_Amount', 'Commission_Month', 'Earner_Name']]
+    assert [entry['ok'] for entry in entries] == [True] * 10
+    assert entries[7]['result'].empty
@@ -0,0 +1,58 @@
+import json
+
+import pandas as pd
+
+from benchmarks.run import find_regressions, main, stage_tolerance
+from benchmarks.synthetic import write_carrier_workbook
+from src.excel_reader import ExcelReader
+
+THRESHOLDS = {'tolerance': 0.25, 'min_seconds': 0.05, 'stages': {'command.*': 0.5}}
+
+
+def test_synthetic_workbooks_are_reproducible(tmp_path):
+    first = write_carrier_workbook(str(tmp_path / 'emblem%20a.xlsx'), 'emblem', 30, seed=7)
+    second = write_carrier_workbook(str(tmp_path / 'emblem%20b.xlsx'), 'emblem', 30, seed=7)
+
+    df = pd.concat(ExcelReader(first, chunk_size=8).iter_chunks(), ignore_index=True)
+
+    pd.testing.assert_frame_equal(df, pd.concat(ExcelReader(second, chunk_size=8).iter_chunks(),
+                                                ignore_index=True))
+    assert len(df) == 30
+    assert set(df['Carrier']) == {'emblem'}
+    assert pd.api.types.is_datetime64_any_dtype(df['Effective Date'])
+    assert not df[['Member ID', 'Effective Date']].duplicated().any()
+
+
+def test_find_regressions():
+    baseline = {'results': [
+        {'rows': 10, 'carrier': 'emblem', 'stage': 'read', 'seconds': 1.0},
+        {'rows': 10, 'carrier': 'all', 'stage': 'command.list_carriers', 'seconds': 1.0},
+        {'rows': 10, 'carrier': 'emblem', 'stage': 'normalize', 'seconds': 0.01},
+    ]}
+    results = [
+        {'rows': 10, 'carrier': 'emblem', 'stage': 'read', 'seconds': 1.3},
+        {'rows': 10, 'carrier': 'all', 'stage': 'command.list_carriers', 'seconds': 1.3},
+        {'rows': 10, 'carrier': 'emblem', 'stage': 'normalize', 'seconds': 0.05},
+        {'rows': 20, 'carrier': 'emblem', 'stage': 'read', 'seconds': 9.0},
+    ]
+
+    regressions = find_regressions(results, baseline, THRESHOLDS)
+
+    assert stage_tolerance('command.sql_query', THRESHOLDS) == 0.5
+    assert [(regression['stage'], regression['ratio']) for regression in regressions] == [('read', 1.3)]
+
+
+def test_suite_writes_every_stage(tmp_path):
+    output = tmp_path / 'results.json'
+
+    status = main(['--rows', '40', '--carriers', 'healthfirst', 'centene', '--repeat', '1',
+                   '--data_dir', str(tmp_path / 'data'), '--output', str(output)])
+
+    report = json.loads(output.read_text())
+    assert status == 0
+    assert report['parameters']['rows'] == [40]
+    stages = {(record['carrier'], record['stage']) for record in report['results']}
+    for carrier in ('healthfirst', 'centene'):
+        assert {(carrier, stage) for stage in ('read', 'normalize.apply_config', 'store_write', 'upload')} <= stages
+    assert ('all', 'command.find_top_k_earner') in stages
+    assert all(record['seconds'] >= 0 for record in report['results'])
@@ -0,0 +1,33 @@
+import importlib
+import pkgutil
+
+import src.command
+from src.command import COMMAND_MANIFEST, CommandMeta, load_command
+
+
+def test_manifest_matches_the_command_classes():
+    for name, info in COMMAND_MANIFEST.items():
+        command_cls = load_command(name)
+
+        assert command_cls.get_name() == name
+        assert command_cls.get_help_info() == info['help'], name
+        assert command_cls.get_args() == info['args'], name
+
+
+def test_every_command_is_in_the_manifest():
+    for module in pkgutil.iter_modules(src.command.__path__):
+        importlib.import_module(f'src.command.{module.name}')
+
+    registered = {cls.get_name() for cls in CommandMeta.get_commands().values()}
+
+    assert registered <= set(COMMAND_MANIFEST), \
+        f"add {sorted(registered - set(COMMAND_MANIFEST))} to src/command/manifest.py"
+
+
+def test_lazy_attributes():
+    from src.command import FindTopKPlan
+    from src import Normalizer
+
+    assert FindTopKPlan.get_name() == 'find_top_k_plan'
+    assert Normalizer.__name__ == 'Normalizer'
+    assert load_command('missing') is None
@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+
+from src.commission_month import parse_period, month_bounds
+
+
+def test_parse_period():
+    assert parse_period('2024-06') == 202406
+    assert parse_period('2024-6-30') == 202406
+    with pytest.raises(ValueError):
+        parse_period('2024-13')
+    with pytest.raises(ValueError):
+        parse_period('June 2024')
+
+
+def test_month_bounds():
+    months = pd.array([202401, 202403, 202403, 202406], dtype='Int32')
+
+    assert month_bounds(months, 202402, 202403) == (1, 3)
+    assert month_bounds(months, 202401, 202406) == (0, 4)
+    assert month_bounds(months, 202404, 202405) == (3, 3)
+    assert month_bounds(months, 202407, 202412) == (4, 4)
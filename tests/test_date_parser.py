@@ -0,0 +1,68 @@
+import datetime
+import warnings
+
+import pandas as pd
+
+from src.date_parser import DateParser, detect_format, parse_dates
+from src.normalizer import Normalizer
+from tests.test_excel_reader import HEALTHFIRST_CONFIG
+
+
+def test_detect_format():
+    assert detect_format(['06/2024', '12/2023']) == '%m/%Y'
+    assert detect_format(['2024-06-30 00:00:00']) == '%Y-%m-%d %H:%M:%S'
+    assert detect_format(['2024-06', 'invalid_date']) == '%Y-%m'
+    assert detect_format(['someday']) is None
+
+
+def test_parse_distinct_values_once_across_chunks(monkeypatch):
+    parser = DateParser()
+    parsed_values = []
+    parse_distinct = parser._parse_distinct
+    monkeypatch.setattr(parser, '_parse_distinct', lambda values, column: parsed_values.extend(values)
+                        or parse_distinct(values, column))
+
+    first = parser.parse(pd.Series(['2024-06-01', '2024-05-01', None, '2024-06-01']), 'Pay Period')
+    second = parser.parse(pd.Series(['2024-05-01', '2024-04-01']), 'Pay Period')
+
+    assert first.tolist() == [pd.Timestamp('2024-06-01'), pd.Timestamp('2024-05-01'), pd.NaT,
+                              pd.Timestamp('2024-06-01')]
+    assert second.tolist() == [pd.Timestamp('2024-05-01'), pd.Timestamp('2024-04-01')]
+    assert parsed_values == ['2024-06-01', '2024-05-01', '2024-04-01']
+
+
+def test_mixed_values():
+    values = pd.Series([datetime.datetime(2024, 1, 2), 'June 3, 2024', '2024-06-01', 'n/a', None], dtype=object)
+
+    assert parse_dates(values).tolist() == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-06-03'),
+                                            pd.Timestamp('2024-06-01'), pd.NaT, pd.NaT]
+
+
+def test_formats_from_carrier_config():
+    config = {'mappings': {'Commission_Period': 'Period', 'Effective_Date': 'Start'},
+              'date_formats': {'Commission_Period': '%d/%m/%Y'}}
+
+    parser = DateParser.from_config(config, {'Commission_Period': 'datetime', 'Effective_Date': 'datetime'})
+
+    assert parser.formats == {'Period': '%d/%m/%Y'}
+    assert parser.is_date_column('Start') and not parser.is_date_column('Member ID')
+    # day first, which format inference would read as month first
+    assert parser.parse(pd.Series(['01/02/2024', '13/02/2024']), 'Period').tolist() == \
+        [pd.Timestamp('2024-02-01'), pd.Timestamp('2024-02-13')]
+
+
+def test_normalize_chunks_parses_dates_once():
+    config = dict(HEALTHFIRST_CONFIG, date_formats={'Period': '%m/%Y'})
+    chunks = [pd.DataFrame({'Member ID': [1, 2], 'Member Name': ['a', 'b'],
+                            'Member Effective Date': ['2023-01-01', '2023-02-01'], 'Period': ['06/2024', '05/2024'],
+                            'Product': ['p', 'p'], 'Enrollment Type': ['e', 'e'], 'Producer Type': ['Agent', 'FMO'],
+                            'Producer Name': ['x', 'y'], 'Amount': [1.0, 2.0], 'Carrier': ['healthfirst'] * 2})
+              for _ in range(2)]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        normalized = [chunk for chunk, _ in Normalizer(None).normalize_chunks(iter(chunks), config)]
+
+    for chunk in normalized:
+        assert chunk['Commission_Period'].tolist() == [pd.Timestamp('2024-06-01'), pd.Timestamp('2024-05-01')]
+        assert pd.api.types.is_datetime64_any_dtype(chunk['Effective_Date'])
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from src.earner_classifier import EarnerTypeClassifier
+from src.normalizer import Normalizer
+
+
+def test_classify_by_lookup_order_and_default():
+    classifier = EarnerTypeClassifier({
+        'FMO': ['Delta Care', 'Senior Services'],
+        'Agency': ['Agency', 'Senior'],
+        'Empty': [],
+    })
+    names = pd.Series(['  DELTA CARE Corporation', 'Good Senior Services Corp', 'Smith Agency LLC',
+                       'John Doe', None, 'delta care'])
+
+    earner_types = classifier.classify(names)
+
+    assert earner_types.tolist() == ['FMO', 'FMO', 'Agency', 'Agent', 'Agent', 'FMO']
+    assert list(earner_types.cat.categories) == ['FMO', 'Agency', 'Agent']
+
+
+def test_names_are_literal_and_memoized():
+    classifier = EarnerTypeClassifier({'FMO': ['A.B. Corp']})
+    names = pd.Series(['a.b. corp', 'AxBx Corp', 'a.b. corp'] * 100)
+
+    assert classifier.classify(names).tolist()[:3] == ['FMO', 'Agent', 'FMO']
+    assert classifier.classify_name.cache_info().currsize == 2
+
+
+def test_load_is_cached_per_file(tmp_path):
+    path = tmp_path / 'earner_type_dict.yaml'
+    path.write_text("earner_type_lookup:\n  FMO:\n    - Delta Care\ndefault_earner_type: Producer\n")
+
+    classifier = EarnerTypeClassifier.load(str(path))
+
+    assert EarnerTypeClassifier.load(str(path)) is classifier
+    assert classifier.classify(pd.Series(['Delta Care', 'Jane'])).tolist() == ['FMO', 'Producer']
+
+
+def test_match_earner_type():
+    df = pd.DataFrame({'Earner_Name': ['Delta Care Corporation', 'Laurie Lee'], 'Earner_Type': pd.NA})
+
+    matched = Normalizer(df).match_earner_type(df)
+
+    assert matched['Earner_Type'].tolist() == ['FMO', 'Agent']
@@ -0,0 +1,263 @@
+import os
+import subprocess
+import sys
+import zipfile
+from xml.sax.saxutils import escape
+
+import pandas as pd
+import pytest
+
+from src.excel_reader import ExcelReader
+from src.normalizer import Normalizer
+
+HEALTHFIRST_COLUMNS = ['Member ID', 'Member Name', 'Member Effective Date', 'Period', 'Product',
+                       'Enrollment Type', 'Producer Type', 'Producer Name', 'Amount']
+
+HEALTHFIRST_CONFIG = {
+    'mappings': {
+        'Primary_Key': None,
+        'Earner_Name': 'Producer Name',
+        'Commission_Amount': 'Amount',
+        'Commission_Period': 'Period',
+        'Carrier_Name': 'Carrier',
+        'Enrollment_Type': 'Enrollment Type',
+        'Plan_Name': 'Product',
+        'Member_Name': 'Member Name',
+        'Member_ID': 'Member ID',
+        'Effective_Date': 'Member Effective Date',
+        'Earner_Type': 'Producer Type',
+    }
+}
+
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+
+
+def _workbook_parts(sheets):
+    numbered = list(enumerate(sheets, start=1))
+    return {
+        '[Content_Types].xml':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                      for i, _ in numbered)
+            + '</Types>',
+        '_rels/.rels':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>',
+        'xl/workbook.xml':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>' for i, name in numbered)
+            + '</sheets></workbook>',
+        'xl/_rels/workbook.xml.rels':
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(f'<Relationship Id="rId{i}" '
+                      'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                      f'Target="worksheets/sheet{i}.xml"/>' for i, _ in numbered)
+            + '</Relationships>',
+    }
+
+
+def _cell(value):
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def write_synthetic_workbook(path, n_rows, sheets=('Sheet1',)):
+    """
+    Write a Healthfirst-shaped workbook by streaming the sheet XML directly,
+    which is orders of magnitude faster than building it through openpyxl.
+    :param path:
+    :param n_rows: rows per sheet, numbered on from the rows of the previous sheets
+    :param sheets: sheet names, a dict gives the header of each sheet
+    :return:
+    """
+    headers = sheets if isinstance(sheets, dict) else dict.fromkeys(sheets, HEALTHFIRST_COLUMNS)
+    start = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _workbook_parts(headers).items():
+            workbook.writestr(name, content)
+        for number, header in enumerate(headers.values()):
+            with workbook.open(f'xl/worksheets/sheet{number + 1}.xml', 'w', force_zip64=True) as sheet:
+                sheet.write(_SHEET_HEAD.encode())
+                sheet.write(('<row>' + ''.join(map(_cell, header)) + '</row>').encode())
+                if header != HEALTHFIRST_COLUMNS:
+                    sheet.write(b'</sheetData></worksheet>')
+                    continue
+                for i in range(start, start + n_rows):
+                    row = [10_000_000 + i, f'Member {i}', f'2023-{i % 12 + 1:02d}-01', f'2024-{i % 6 + 1:02d}-01',
+                           f'Plan {i % 17}', 'Monthly Renewal', 'Agent', f'Producer {i % 911}', 25.5 + i % 7]
+                    sheet.write(('<row>' + ''.join(map(_cell, row)) + '</row>').encode())
+                sheet.write(b'</sheetData></worksheet>')
+                start += n_rows
+
+
+def test_iter_chunks_matches_read_excel():
+    file_path = 'data/Emblem%2006.2024%20Commission.xlsx'
+    expected = ExcelReader(file_path).dataframe
+
+    chunks = list(ExcelReader(file_path, chunk_size=5).iter_chunks())
+
+    assert [len(chunk) for chunk in chunks] == [5, 5, 3]
+    streamed = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(streamed, expected)
+
+
+def test_iter_chunks_reads_only_used_columns(tmp_path):
+    file_path = str(tmp_path / 'healthfirst.xlsx')
+    write_synthetic_workbook(file_path, 12)
+    usecols = ['Member ID', 'Period', 'Amount', 'Not In Sheet']
+
+    chunks = list(ExcelReader(file_path, chunk_size=5, usecols=usecols).iter_chunks())
+
+    expected = pd.concat(ExcelReader(file_path, chunk_size=5).iter_chunks(), ignore_index=True)
+    streamed = pd.concat(chunks, ignore_index=True)
+    assert list(streamed.columns) == ['Member ID', 'Period', 'Amount', 'Source_Sheet', 'Carrier']
+    pd.testing.assert_frame_equal(streamed, expected[list(streamed.columns)])
+    pd.testing.assert_frame_equal(ExcelReader(file_path, usecols=usecols).dataframe, streamed)
+
+
+def test_normalize_chunks(tmp_path):
+    file_path = str(tmp_path / 'healthfirst.xlsx')
+    write_synthetic_workbook(file_path, 25)
+
+    reader = ExcelReader(file_path, chunk_size=10)
+    normalized = list(Normalizer(None).normalize_chunks(reader.iter_chunks(), HEALTHFIRST_CONFIG))
+
+    assert [len(chunk) for chunk, _ in normalized] == [10, 10, 5]
+    for chunk, primary_key in normalized:
+        assert 'Primary_Key' in chunk.columns
+        assert 'Member_ID' in primary_key
+        assert pd.api.types.is_datetime64_any_dtype(chunk['Commission_Period'])
+
+
+def test_every_sheet_with_configured_columns_is_read(tmp_path):
+    file_path = str(tmp_path / 'healthfirst.xlsx')
+    write_synthetic_workbook(file_path, 7, {'Medicare': HEALTHFIRST_COLUMNS, 'Summary': ['Total'],
+                                            'Medicaid': HEALTHFIRST_COLUMNS})
+    usecols = ['Member ID', 'Amount']
+
+    serial = pd.concat(ExcelReader(file_path, chunk_size=5, usecols=usecols, workers=1).iter_chunks(),
+                       ignore_index=True)
+    concurrent = pd.concat(ExcelReader(file_path, chunk_size=5, usecols=usecols, workers=2).iter_chunks(),
+                           ignore_index=True)
+
+    assert serial['Source_Sheet'].tolist() == ['Medicare'] * 7 + ['Medicaid'] * 7
+    assert serial['Member ID'].tolist() == list(range(10_000_000, 10_000_014))
+    pd.testing.assert_frame_equal(concurrent, serial)
+    pd.testing.assert_frame_equal(ExcelReader(file_path, usecols=usecols).dataframe, serial)
+
+
+def test_configured_sheets_are_read_in_config_order(tmp_path):
+    file_path = str(tmp_path / 'healthfirst.xlsx')
+    write_synthetic_workbook(file_path, 3, ('January', 'February', 'March'))
+
+    reader = ExcelReader(file_path, chunk_size=5, sheets=['March', 0])
+    assert reader.sheet_names() == ['March', 'January']
+    assert pd.concat(reader.iter_chunks())['Source_Sheet'].tolist() == ['March'] * 3 + ['January'] * 3
+    with pytest.raises(ValueError, match='April'):
+        ExcelReader(file_path, chunk_size=5, sheets=['April']).sheet_names()
+
+
+def test_source_sheet_is_kept_out_of_the_primary_key(tmp_path):
+    single, split = str(tmp_path / 'single.xlsx'), str(tmp_path / 'split.xlsx')
+    write_synthetic_workbook(single, 10)
+    write_synthetic_workbook(split, 5, ('First', 'Second'))
+
+    normalized = {}
+    for file_path in (single, split):
+        chunks = ExcelReader(file_path, chunk_size=4, carrier='healthfirst').iter_chunks()
+        normalized[file_path] = [chunk for chunk, _ in Normalizer(None).normalize_chunks(chunks, HEALTHFIRST_CONFIG)]
+
+    assert all(isinstance(chunk['Source_Sheet'].dtype, pd.CategoricalDtype) for chunk in normalized[split])
+    single_rows, split_rows = pd.concat(normalized[single]), pd.concat(normalized[split])
+    assert split_rows['Primary_Key'].tolist() == single_rows['Primary_Key'].tolist()
+    assert split_rows['Source_Sheet'].astype(str).tolist() == ['First'] * 5 + ['Second'] * 5
+
+
+_PEAK_RSS_SCRIPT = """
+import resource, sys
+from src.excel_reader import ExcelReader
+from src.normalizer import Normalizer
+from tests.test_excel_reader import HEALTHFIRST_CONFIG
+reader = ExcelReader(sys.argv[1], chunk_size=20_000, workers=int(sys.argv[2]))
+rows = sum(len(chunk) for chunk, _ in Normalizer(None).normalize_chunks(reader.iter_chunks(), HEALTHFIRST_CONFIG))
+# the sheet worker processes have exited, their largest peak is counted with the children
+print(rows, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+"""
+
+
+def _streaming_peak_rss_kb(file_path, workers=1):
+    """
+    :return: rows, peak RSS in KB of the reading process and of its largest worker process
+    """
+    output = subprocess.run([sys.executable, '-c', _PEAK_RSS_SCRIPT, file_path, str(workers)],
+                            capture_output=True, text=True, check=True).stdout
+    rows, peak_kb, worker_peak_kb = output.strip().splitlines()[-1].split()
+    return int(rows), int(peak_kb), int(worker_peak_kb)
+
+
+@pytest.mark.skipif(not os.environ.get('RUN_SLOW_TESTS'),
+                    reason='multi-million-row workbook; set RUN_SLOW_TESTS=1 to run')
+def test_streaming_upload_memory_ceiling(tmp_path):
+    """
+    Peak memory of the streaming read + normalize path must not grow with the file size.
+    """
+    n_rows = int(os.environ.get('MEMORY_TEST_ROWS', 2_000_000))
+    small_path, large_path = str(tmp_path / 'small.xlsx'), str(tmp_path / 'large.xlsx')
+    write_synthetic_workbook(small_path, 40_000)
+    write_synthetic_workbook(large_path, n_rows)
+
+    _, small_peak_kb, _ = _streaming_peak_rss_kb(small_path)
+    large_rows, large_peak_kb, _ = _streaming_peak_rss_kb(large_path)
+
+    assert large_rows == n_rows
+    assert large_peak_kb - small_peak_kb < 64 * 1024, \
+        f"peak RSS grew from {small_peak_kb} KB to {large_peak_kb} KB"
+
+
+@pytest.mark.skipif(not os.environ.get('RUN_SLOW_TESTS'),
+                    reason='large multi-sheet workbook; set RUN_SLOW_TESTS=1 to run')
+def test_concurrent_sheets_memory_ceiling(tmp_path):
+    """
+    Sheets parsed in worker processes stream their chunks, so neither the reader nor a worker
+    holds a whole sheet and peak memory does not grow with the size of the sheets.
+    """
+    n_rows = int(os.environ.get('MEMORY_TEST_ROWS', 2_000_000)) // 4
+    sheets = ('Q1', 'Q2', 'Q3', 'Q4')
+    small_path, large_path = str(tmp_path / 'small.xlsx'), str(tmp_path / 'large.xlsx')
+    write_synthetic_workbook(small_path, 40_000, sheets)
+    write_synthetic_workbook(large_path, n_rows, sheets)
+
+    _, small_peak_kb, small_worker_kb = _streaming_peak_rss_kb(small_path, workers=2)
+    large_rows, large_peak_kb, large_worker_kb = _streaming_peak_rss_kb(large_path, workers=2)
+
+    assert large_rows == n_rows * len(sheets)
+    assert large_peak_kb - small_peak_kb < 64 * 1024, \
+        f"peak RSS grew from {small_peak_kb} KB to {large_peak_kb} KB"
+    assert large_worker_kb - small_worker_kb < 64 * 1024, \
+        f"peak RSS of the sheet workers grew from {small_worker_kb} KB to {large_worker_kb} KB"
+
+
+def test_stopping_early_releases_the_sheet_workers(tmp_path):
+    file_path = str(tmp_path / 'healthfirst.xlsx')
+    write_synthetic_workbook(file_path, 50, ('First', 'Second', 'Third'))
+
+    chunks = ExcelReader(file_path, chunk_size=5, workers=2).iter_chunks()
+    first = next(chunks)
+    # the workers wait on their full queues until the reader closes them
+    chunks.close()
+
+    assert first['Source_Sheet'].tolist() == ['First'] * 5
@@ -0,0 +1,84 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.command import ExportCsv
+from src.store import SQLiteStore
+
+
+def _store(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(pd.DataFrame({
+        'Primary_Key': ['a', 'b', 'c', 'd', 'e'],
+        'Earner_Name': ['Ann', 'Bob', 'Cid', 'Dan', 'Eve'],
+        'Commission_Amount': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'Commission_Period': pd.to_datetime(['2024-05-01', '2024-06-01', '2024-06-01', '2024-07-01', '2024-06-01']),
+        'Carrier_Name': ['emblem', 'emblem', 'centene', 'emblem', 'healthfirst'],
+    }))
+    return store
+
+
+def _export(store, **args):
+    command_args = {arg['name']: None for arg in ExportCsv.get_args()}
+    command_args.update(args)
+    return ExportCsv().run(store, **ExportCsv.get_parameters(command_args))
+
+
+def test_iter_chunks_streams_the_filtered_rows(tmp_path):
+    store = _store(tmp_path)
+
+    chunks = list(store.iter_chunks(columns=['Primary_Key'], filters=[('Carrier_Name', '==', 'emblem')],
+                                    chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks)['Primary_Key'].tolist() == ['a', 'b', 'd']
+    store.close()
+
+
+def test_export_filtered_gzip_csv(tmp_path):
+    store = _store(tmp_path)
+    path = str(tmp_path / 'out' / 'june.csv.gz')
+
+    rows = _export(store, path=path, compression='gzip', carrier='emblem,centene', columns='Primary_Key,Earner_Name',
+                   chunk_size=1, **{'from': '2024-06', 'to': '2024-06'})
+
+    exported = pd.read_csv(path)
+    assert rows == 2
+    assert list(exported.columns) == ['Primary_Key', 'Earner_Name']
+    assert exported['Primary_Key'].tolist() == ['b', 'c']
+    store.close()
+
+
+def test_export_parquet_zstd(tmp_path):
+    pytest.importorskip('pyarrow')
+    store = _store(tmp_path)
+
+    rows = _export(store, path=str(tmp_path), format='parquet', compression='zstd', chunk_size=2)
+
+    exported = pd.read_parquet(tmp_path / 'exported_data.parquet')
+    assert rows == 5
+    assert exported['Commission_Amount'].sum() == 15.0
+    assert pd.api.types.is_datetime64_any_dtype(exported['Commission_Period'])
+    store.close()
+
+
+def test_export_partitioned_part_files(tmp_path):
+    store = _store(tmp_path)
+    path = tmp_path / 'parts'
+
+    rows = _export(store, path=str(path), partition_by='Carrier_Name', compression='gzip', workers=2)
+
+    assert rows == 5
+    assert sorted(os.listdir(path)) == ['Carrier_Name=centene', 'Carrier_Name=emblem', 'Carrier_Name=healthfirst']
+    emblem = pd.read_csv(path / 'Carrier_Name=emblem' / 'data.csv.gz')
+    assert emblem['Primary_Key'].tolist() == ['a', 'b', 'd']
+    assert 'Carrier_Name' not in emblem.columns
+    store.close()
+
+
+def test_export_rejects_unknown_formats():
+    with pytest.raises(ValueError):
+        ExportCsv.get_parameters({'path': 'out.csv', 'format': 'xlsx'})
+    with pytest.raises(ValueError):
+        ExportCsv.get_parameters({'path': 'out.csv', 'compression': 'bz2'})
@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+from src.store import SQLiteStore
+
+
+def _normalized_rows(keys, amounts, carriers=None):
+    return pd.DataFrame({
+        'Primary_Key': keys,
+        'Earner_Name': [f'Earner {key}' for key in keys],
+        'Commission_Amount': amounts,
+        'Commission_Period': pd.to_datetime(['2024-06-01'] * len(keys)),
+        'Carrier_Name': carriers or ['emblem'] * len(keys),
+    })
+
+
+def _amounts(store):
+    return store.load().set_index('Primary_Key')['Commission_Amount'].to_dict()
+
+
+def _stores(tmp_path):
+    yield SQLiteStore(str(tmp_path / 'normalized.db'))
+    pytest.importorskip('pyarrow')
+    from src.parquet_store import ParquetStore
+    yield ParquetStore(str(tmp_path / 'parquet'))
+
+
+def test_reupload_applies_only_the_delta(tmp_path):
+    for store in _stores(tmp_path):
+        first = store.ledger.ingest([_normalized_rows(['a', 'b', 'c'], [1.0, 2.0, 3.0])], 'data/june.xlsx')
+        assert (first['inserted'], first['changed'], first['deleted']) == (3, 0, 0)
+
+        version = store.get_version()
+        same = store.ledger.ingest([_normalized_rows(['a', 'b', 'c'], [1.0, 2.0, 3.0])], 'data/june.xlsx')
+        assert (same['inserted'], same['changed'], same['unchanged'], same['deleted']) == (0, 0, 3, 0)
+        assert store.load_changes(version).empty
+
+        corrected = store.ledger.ingest([_normalized_rows(['a', 'b'], [1.0, 20.0]),
+                                         _normalized_rows(['d'], [4.0])], 'june.xlsx')
+        assert (corrected['inserted'], corrected['changed'], corrected['unchanged'], corrected['deleted']) \
+            == (1, 1, 1, 1)
+        assert _amounts(store) == {'a': 1.0, 'b': 20.0, 'd': 4.0}
+        store.close()
+
+
+def test_uploads_of_other_files_keep_each_others_rows(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.ledger.ingest([_normalized_rows(['a', 'b'], [1.0, 2.0])], 'emblem.xlsx')
+    store.ledger.ingest([_normalized_rows(['c'], [3.0], carriers=['centene'])], 'centene.xlsx')
+
+    assert store.count() == 3
+    assert list(store.ledger.uploads()['source']) == ['centene.xlsx', 'emblem.xlsx']
+    store.close()
+
+
+def test_rollback_restores_the_previous_rows(tmp_path):
+    for store in _stores(tmp_path):
+        first = store.ledger.ingest([_normalized_rows(['a', 'b', 'c'], [1.0, 2.0, 3.0])], 'june.xlsx')
+        second = store.ledger.ingest([_normalized_rows(['a', 'b', 'd'], [1.0, 20.0, 4.0])], 'june.xlsx')
+        assert _amounts(store) == {'a': 1.0, 'b': 20.0, 'd': 4.0}
+
+        result = store.ledger.rollback(second['upload_id'])
+        assert (result['deleted'], result['restored']) == (1, 2)
+        assert _amounts(store) == {'a': 1.0, 'b': 2.0, 'c': 3.0}
+        with pytest.raises(ValueError):
+            store.ledger.rollback(second['upload_id'])
+
+        store.ledger.rollback(first['upload_id'])
+        assert store.count() == 0
+        assert list(store.ledger.uploads()['status']) == ['rolled_back', 'rolled_back']
+        store.close()
+
+
+def test_rollback_waits_for_later_uploads_of_the_same_rows(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    first = store.ledger.ingest([_normalized_rows(['a', 'b'], [1.0, 2.0])], 'june.xlsx')
+    second = store.ledger.ingest([_normalized_rows(['a', 'b'], [1.0, 20.0])], 'june.xlsx')
+
+    with pytest.raises(ValueError, match='roll those back first'):
+        store.ledger.rollback(first['upload_id'])
+
+    store.ledger.rollback(second['upload_id'])
+    store.ledger.rollback(first['upload_id'])
+    assert store.count() == 0
+    store.close()
+
+
+def test_rows_stored_without_the_ledger_are_tracked_as_a_baseline(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_normalized_rows(['a', 'b'], [1.0, 2.0]))
+
+    upload = store.ledger.ingest([_normalized_rows(['b', 'c'], [20.0, 3.0])], 'june.xlsx')
+    assert (upload['inserted'], upload['changed'], upload['deleted']) == (1, 1, 0)
+    assert 'baseline' in set(store.ledger.uploads()['status'])
+
+    store.ledger.rollback(upload['upload_id'])
+    assert _amounts(store) == {'a': 1.0, 'b': 2.0}
+    store.close()
@@ -57,3 +57,15 @@ def test_load_config_file():
 
 def test_main():
     assert True
+
+
+def test_arguments_have_their_own_help():
+    import argparse
+    from main import add_command_argument
+
+    parser = argparse.ArgumentParser()
+    add_command_argument(parser, {'name': 'k', 'type': 'int', 'help': 'Only show the k largest groups'}, 'Summary')
+    add_command_argument(parser, {'name': 'carrier', 'type': 'str'}, 'Summary')
+
+    help_text = parser.format_help()
+    assert 'Only show the k largest groups' in help_text and 'Summary' in help_text
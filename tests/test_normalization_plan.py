@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from src.normalization_plan import NormalizationPlan, config_hash
+from src.normalizer import Normalizer
+
+SCHEMA_CONFIG = {
+    'fixed_schema': ['Primary_Key', 'Earner_Name', 'Commission_Amount', 'Member_Name', 'Member_ID', 'Cycle_Year',
+                     'Earner_Type'],
+    'fixed_schema_data_types': {'Primary_Key': 'object', 'Earner_Name': 'category', 'Commission_Amount': 'float',
+                                'Member_Name': 'string[pyarrow]', 'Member_ID': 'string[pyarrow]',
+                                'Cycle_Year': 'Int16', 'Earner_Type': 'category'},
+}
+CONFIG = {
+    'mappings': {
+        'Primary_Key': None,
+        'Earner_Name': 'Payee Name',
+        'Commission_Amount': 'Payment',
+        'Member_Name': ['Member First Name', 'Member Last Name'],
+        'Member_ID': 'Member ID',
+        'Earner_Type': 'Payee Type',
+    }
+}
+
+
+def test_plans_are_cached_by_config_hash():
+    plan = NormalizationPlan.compile(CONFIG, SCHEMA_CONFIG)
+
+    assert NormalizationPlan.compile({'mappings': dict(CONFIG['mappings'])}, SCHEMA_CONFIG) is plan
+    assert plan.hash == config_hash(CONFIG, SCHEMA_CONFIG)
+    other = {'mappings': dict(CONFIG['mappings'], Commission_Amount='Amount')}
+    assert NormalizationPlan.compile(other, SCHEMA_CONFIG) is not plan
+
+
+def test_source_columns_and_projection():
+    plan = NormalizationPlan.compile(CONFIG, SCHEMA_CONFIG)
+
+    # the Earner_Type mapping is not read, earner types are classified from the names
+    assert {'Payee Name', 'Payment', 'Member First Name', 'Member Last Name', 'Member ID'} <= set(plan.source_columns)
+    assert 'Payee Type' not in plan.source_columns
+    columns = ['Payee Name', 'Member First Name', 'Member Last Name', 'Member ID', 'Cycle_Year', 'Unused']
+    assert plan.resolve(columns) == {'Earner_Name': 'Payee Name', 'Commission_Amount': None,
+                                     'Member_Name': ['Member First Name', 'Member Last Name'],
+                                     'Member_ID': 'Member ID', 'Cycle_Year': 'Cycle_Year', 'Earner_Type': None}
+    with pytest.raises(KeyError):
+        plan.resolve(['Payee Name', 'Member First Name'])
+
+
+def test_apply_config_projects_and_casts():
+    df = pd.DataFrame({'Payee Name': ['Delta Care', 'John Doe'], 'Payment': [10.0, -2.5],
+                       'Member First Name': ['Ann', 'Bo'], 'Member Last Name': ['Lee', 'Ray'],
+                       'Member ID': [101, 102], 'Payee Type': ['FMO', 'Agent'], 'Unused': [1, 2]})
+    normalizer = Normalizer(df)
+    normalizer.config = SCHEMA_CONFIG
+
+    normalized, primary_key = normalizer.apply_config(CONFIG)
+
+    assert list(normalized.columns) == ['Primary_Key', 'Earner_Name', 'Commission_Amount', 'Member_Name',
+                                        'Member_ID', 'Earner_Type']
+    assert primary_key == ['Earner_Name', 'Commission_Amount', 'Member_Name', 'Member_ID', 'Earner_Type']
+    assert normalized['Primary_Key'].tolist() == ['Delta Care 10.0 Ann Lee 101 <NA>', 'John Doe -2.5 Bo Ray 102 <NA>']
+    assert normalized['Member_Name'].tolist() == ['Ann Lee', 'Bo Ray']
+    assert normalized['Earner_Name'].dtype == 'category'
+    assert normalized['Member_ID'].tolist() == ['101', '102']
+    assert normalized['Earner_Type'].isna().all()
@@ -1,3 +1,4 @@
+import pytest
 import pandas as pd
 from src.normalizer import Normalizer
 from src.excel_reader import ExcelReader
@@ -65,10 +66,43 @@ def test_convert_to_datetime_on_real_data():
     assert df_converted_emblem['Payee Name'].dtype == 'object'
 
 
+def _key_frame():
+    return pd.DataFrame({
+        'Earner_Name': ['Delta Care', 'John Doe', 'Delta Care', None],
+        'Commission_Amount': [116.67, -87.5, 116.67, 10.0],
+        'Commission_Period': pd.to_datetime(['2024-06-01', None, '2024-06-01', '2024-05-31']),
+        'Earner_Type': pd.NA,
+    })
 
 
+def test_concat_columns_matches_row_wise_join():
+    df = _key_frame()
+    columns = list(df.columns)
 
+    expected = df[columns].astype(str).agg(' '.join, axis=1).str.strip()
+    pd.testing.assert_series_equal(Normalizer.concat_columns(df, columns), expected)
 
 
+def test_build_primary_key_hash_modes():
+    normalizer = Normalizer(_key_frame())
+    columns = list(normalizer.df.columns)
 
+    normalizer.config['primary_key_mode'] = 'hash64'
+    keys64 = normalizer.build_primary_key(columns)
+    assert keys64.dtype == 'int64'
+    assert keys64[0] == keys64[2] and keys64.nunique() == 3
 
+    normalizer.config['primary_key_mode'] = 'hash128'
+    keys128 = normalizer.build_primary_key(columns)
+    assert keys128.str.len().eq(32).all()
+    assert keys128[0] == keys128[2] and keys128.nunique() == 3
+
+
+def test_build_primary_key_detects_hash_collisions(monkeypatch):
+    normalizer = Normalizer(_key_frame())
+    normalizer.config['primary_key_mode'] = 'hash64'
+    monkeypatch.setattr(Normalizer, 'hash_key_text',
+                        staticmethod(lambda key_text, mode: pd.Series(0, index=key_text.index)))
+
+    with pytest.raises(ValueError, match='collision'):
+        normalizer.build_primary_key(list(normalizer.df.columns))
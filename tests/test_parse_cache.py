@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+
+from src.excel_reader import ExcelReader
+from src.parse_cache import ParseCache
+from tests.test_excel_reader import write_synthetic_workbook
+
+
+def _workbook(tmp_path, name='healthfirst.xlsx', n_rows=25):
+    file_path = str(tmp_path / name)
+    write_synthetic_workbook(file_path, n_rows)
+    return file_path
+
+
+def test_unchanged_workbook_is_read_from_the_cache(tmp_path, monkeypatch):
+    file_path = _workbook(tmp_path)
+    cache = ParseCache(str(tmp_path / 'parse_cache'))
+    parsed = pd.concat(ExcelReader(file_path, chunk_size=10, parse_cache=cache).iter_chunks(), ignore_index=True)
+
+    def parse_again(*args, **kwargs):
+        raise AssertionError('the workbook was parsed again')
+    monkeypatch.setattr(ExcelReader, '_parse_chunks', parse_again)
+    chunks = list(ExcelReader(file_path, chunk_size=10, parse_cache=cache).iter_chunks())
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), parsed)
+    # smaller chunks and fewer columns than when the workbook was cached
+    usecols = ['Member ID', 'Amount']
+    projected = list(ExcelReader(file_path, chunk_size=4, usecols=usecols, parse_cache=cache).iter_chunks())
+    assert max(len(chunk) for chunk in projected) == 4
+    pd.testing.assert_frame_equal(pd.concat(projected, ignore_index=True), parsed[usecols + ['Source_Sheet', 'Carrier']])
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['rows']) == (2, 1, 1, 25)
+    assert cache.entries()[0]['source'] == file_path
+
+
+def test_least_recently_used_workbooks_are_evicted(tmp_path):
+    cache = ParseCache(str(tmp_path / 'parse_cache'), max_entries=1)
+    first, second = _workbook(tmp_path, 'first.xlsx', 5), _workbook(tmp_path, 'second.xlsx', 6)
+
+    for file_path in (first, second):
+        list(ExcelReader(file_path, chunk_size=10, parse_cache=cache).iter_chunks())
+
+    first_key = ParseCache.make_key(first, *ExcelReader(first, chunk_size=10).sheet_names())
+    second_key = ParseCache.make_key(second, *ExcelReader(second, chunk_size=10).sheet_names())
+    assert cache.get(first_key) is None
+    assert cache.get(second_key) is not None
+    assert cache.stats()['evictions'] == 1
+    assert sorted(entry.name for entry in os.scandir(cache.path) if entry.is_dir()) == [second_key]
+
+    assert cache.clear() == 1
+    assert cache.stats()['entries'] == 0 and not any(entry.is_dir() for entry in os.scandir(cache.path))
+
+
+def test_incomplete_or_unstorable_workbooks_are_not_cached(tmp_path):
+    cache = ParseCache(str(tmp_path / 'parse_cache'))
+    mixed = [pd.DataFrame({'Member ID': [1, 'A2']}), pd.DataFrame({'Member ID': [3, 4]})]
+
+    assert [len(chunk) for chunk in cache.write_through('mixed', iter(mixed))] == [2, 2]
+    chunks = cache.write_through('partial', iter(mixed[1:] * 2))
+    next(chunks)
+    chunks.close()
+
+    assert cache.stats()['entries'] == 0
+    assert not any(entry.is_dir() for entry in os.scandir(cache.path))
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+import yaml
+
+from src.pipeline import parse_upload_targets, normalize_files_by_target
+from src.store import SQLiteStore
+from tests.test_excel_reader import HEALTHFIRST_CONFIG, write_synthetic_workbook
+
+
+def test_parse_upload_targets(tmp_path):
+    manifest = tmp_path / 'manifest.yaml'
+    manifest.write_text("files:\n  - file: c.xlsx\n    config: c.yaml\n  - file: d.xlsx\n")
+
+    targets = parse_upload_targets(['a.xlsx:a.yaml', 'b.xlsx'], 'default.yml', str(manifest))
+
+    assert targets == [('a.xlsx', 'a.yaml'), ('b.xlsx', 'default.yml'),
+                       (str(tmp_path / 'c.xlsx'), str(tmp_path / 'c.yaml')),
+                       (str(tmp_path / 'd.xlsx'), 'default.yml')]
+
+
+def test_parse_upload_targets_requires_a_config():
+    with pytest.raises(ValueError):
+        parse_upload_targets(['a.xlsx'])
+    with pytest.raises(ValueError):
+        parse_upload_targets([], 'a.yaml')
+
+
+def _write_files(tmp_path, sizes):
+    config_path = tmp_path / 'healthfirst.yaml'
+    config_path.write_text(yaml.safe_dump(HEALTHFIRST_CONFIG))
+    targets = []
+    for i, n_rows in enumerate(sizes):
+        file_path = str(tmp_path / f'healthfirst_{i}.xlsx')
+        write_synthetic_workbook(file_path, n_rows)
+        targets.append((file_path, str(config_path)))
+    return targets
+
+
+def test_normalize_files_by_target_keeps_file_order(tmp_path):
+    targets = _write_files(tmp_path, [30, 5, 12])
+
+    parallel = [df for _, df in normalize_files_by_target(targets, workers=3)]
+    serial = [df for _, df in normalize_files_by_target(targets, workers=1)]
+
+    assert [len(df) for df in parallel] == [30, 5, 12]
+    for parallel_df, serial_df in zip(parallel, serial):
+        pd.testing.assert_frame_equal(parallel_df, serial_df)
+
+
+def test_repeated_files_are_upserted_once(tmp_path):
+    targets = _write_files(tmp_path, [8]) * 2
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+
+    rows = store.upsert_chunks(df for _, df in normalize_files_by_target(targets, workers=2))
+
+    assert rows == 16
+    assert store.count() == 8
+
+
+def test_only_one_file_per_worker_is_normalized_ahead(tmp_path, monkeypatch):
+    import concurrent.futures
+
+    submitted = []
+
+    class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            submitted.append(args[1])
+            return super().submit(*args, **kwargs)
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', CountingExecutor)
+    targets = _write_files(tmp_path, [3, 4, 5, 6, 7])
+
+    files = normalize_files_by_target(targets, workers=2)
+    assert len(next(files)[1]) == 3
+    assert len(submitted) == 3
+    assert [len(df) for _, df in files] == [4, 5, 6, 7]
+    assert submitted == targets
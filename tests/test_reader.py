@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from src.pipeline import normalize_file_chunks
+from src.reader import ExcelReader, CsvReader, reader_for, open_reader
+from tests.test_excel_reader import HEALTHFIRST_CONFIG, write_synthetic_workbook
+
+
+def _workbook_rows(tmp_path, n_rows=40):
+    file_path = str(tmp_path / 'Healthfirst%2006.2024.xlsx')
+    write_synthetic_workbook(file_path, n_rows)
+    rows = pd.concat(ExcelReader(file_path, chunk_size=50).iter_chunks(), ignore_index=True).drop(columns='Carrier')
+    # missing text and number cells
+    rows.loc[3, 'Product'] = np.nan
+    rows.loc[5, 'Amount'] = np.nan
+    return rows
+
+
+def test_readers_are_picked_by_file_type():
+    assert reader_for('data/Emblem%2006.2024%20Commission.xlsx') is ExcelReader
+    assert reader_for('exports/emblem.CSV') is CsvReader
+    assert reader_for('exports/emblem.csv.gz') is CsvReader
+    assert reader_for('exports/emblem.jsonl').get_extensions()[0] == '.jsonl'
+    with pytest.raises(ValueError, match='supported file types'):
+        reader_for('emblem.txt')
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.csv.gz', '.jsonl', '.parquet'])
+def test_readers_produce_the_excel_frame(tmp_path, extension):
+    pytest.importorskip('pyarrow')
+    rows = _workbook_rows(tmp_path)
+    file_path = str(tmp_path / f'healthfirst{extension}')
+    if extension.startswith('.csv'):
+        rows.to_csv(file_path, index=False)
+    elif extension == '.jsonl':
+        rows.to_json(file_path, orient='records', lines=True)
+    else:
+        rows.to_parquet(file_path, index=False)
+
+    reader = open_reader(file_path, chunk_size=7, carrier='healthfirst')
+    chunks = list(reader.iter_chunks())
+
+    assert [len(chunk) for chunk in chunks] == [7] * 5 + [5]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  rows.assign(Carrier='healthfirst'))
+
+
+def test_csv_upload_takes_the_carrier_from_the_config(tmp_path):
+    pytest.importorskip('pyarrow')
+    file_path = str(tmp_path / 'statement.csv')
+    _workbook_rows(tmp_path).to_csv(file_path, index=False)
+    config_path = str(tmp_path / 'config.yaml')
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(dict(HEALTHFIRST_CONFIG, carrier='healthfirst'), file)
+
+    normalized = pd.concat(normalize_file_chunks(file_path, config_path, chunk_size=16, display=False))
+
+    assert len(normalized) == 40
+    assert set(normalized['Carrier_Name']) == {'healthfirst'}
+    assert normalized['Primary_Key'].is_unique
+
+
+def test_csv_keys_do_not_depend_on_the_chunk_size(tmp_path):
+    pytest.importorskip('pyarrow')
+    rows = _workbook_rows(tmp_path, n_rows=10)
+    rows['Member ID'] = [f'{1000 + i}' for i in range(9)] + [np.nan]
+    rows.loc[2, 'Member ID'] = '00123'
+    rows['Amount'] = [f'{0.5 + i:.2f}' for i in range(10)]
+    file_path = str(tmp_path / 'statement.csv')
+    rows.to_csv(file_path, index=False)
+    config_path = str(tmp_path / 'config.yaml')
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(dict(HEALTHFIRST_CONFIG, carrier='healthfirst'), file)
+
+    keys = {chunk_size: pd.concat(normalize_file_chunks(file_path, config_path, chunk_size=chunk_size,
+                                                        display=False))['Primary_Key'].tolist()
+            for chunk_size in (3, 5, 10)}
+
+    assert keys[3] == keys[5] == keys[10]
+    assert all('1000.0' not in key for key in keys[10])
+    assert any(' 00123 ' in key for key in keys[10])
+
+
+def test_json_lines_keys_do_not_depend_on_the_chunk_size(tmp_path):
+    pytest.importorskip('pyarrow')
+    rows = _workbook_rows(tmp_path, n_rows=10)
+    # integers and fractions as the file writes them, e.g. 1000, null and 2.5
+    rows['Member ID'] = pd.Series([1000 + i for i in range(9)] + [None], dtype=object)
+    rows['Amount'] = pd.Series([0.5 + i if i % 2 else i for i in range(10)], dtype=object)
+    file_path = str(tmp_path / 'statement.jsonl')
+    rows.to_json(file_path, orient='records', lines=True)
+    config_path = str(tmp_path / 'config.yaml')
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(dict(HEALTHFIRST_CONFIG, carrier='healthfirst'), file)
+
+    keys = {chunk_size: pd.concat(normalize_file_chunks(file_path, config_path, chunk_size=chunk_size,
+                                                        display=False))['Primary_Key'].tolist()
+            for chunk_size in (2, 5, 10)}
+
+    assert keys[2] == keys[5] == keys[10]
+    assert all('1000.0' not in key and ' 2.0 ' not in key for key in keys[10])
+
+
+def test_excel_keys_do_not_depend_on_the_chunk_size(tmp_path):
+    from src.normalizer import Normalizer
+    from src.parse_cache import ParseCache
+
+    rows = _workbook_rows(tmp_path, n_rows=10).drop(columns='Source_Sheet')
+    rows['Member ID'] = [1000 + i for i in range(9)] + [np.nan]
+    rows['Amount'] = [0.5 + i if i % 2 else float(i) for i in range(10)]
+    file_path = str(tmp_path / 'Healthfirst%2006.2024.xlsx')
+    rows.to_excel(file_path, index=False)
+    cache = ParseCache(str(tmp_path / 'parse_cache'))
+
+    def keys(chunk_size, parse_cache=None):
+        chunks = ExcelReader(file_path, chunk_size=chunk_size, parse_cache=parse_cache).iter_chunks()
+        return pd.concat(chunk for chunk, _ in Normalizer(None).normalize_chunks(chunks, HEALTHFIRST_CONFIG)
+                         )['Primary_Key'].tolist()
+
+    expected = keys(2)
+    assert keys(5) == keys(10) == expected
+    # the cached chunks are typed again when read back
+    assert keys(10, cache) == keys(4, cache) == expected
+    assert cache.stats()['hits'] == 1
+    assert all('1000.0' not in key and ' 2.0 ' not in key for key in expected)
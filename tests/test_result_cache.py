@@ -0,0 +1,85 @@
+import pandas as pd
+
+from src.command import FindTopKCarrier
+from src.result_cache import ResultCache
+from src.store import SQLiteStore
+
+
+def _rows(amounts):
+    return pd.DataFrame({
+        'Primary_Key': [f'key {i}' for i in range(len(amounts))],
+        'Carrier_Name': [f'carrier {i % 2}' for i in range(len(amounts))],
+        'Commission_Amount': amounts,
+    })
+
+
+def test_get_put_and_stats_persist(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResultCache(path)
+    key = ResultCache.make_key('find_top_k_plan', {'k': 3}, 1)
+
+    assert cache.get(key) is None
+    cache.put(key, 'find_top_k_plan', _rows([1.0, 2.0]))
+    cache.close()
+
+    reopened = ResultCache(path)
+    pd.testing.assert_frame_equal(reopened.get(key), _rows([1.0, 2.0]))
+    assert reopened.stats()['hits'] == 1
+    assert reopened.stats()['misses'] == 1
+    assert reopened.stats()['entries'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.put('a', 'command', 1)
+    cache.put('b', 'command', 2)
+    cache.get('a')
+
+    cache.put('c', 'command', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_are_bounded_by_bytes(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'), max_bytes=1500)
+    cache.put('a', 'command', b'x' * 1000)
+    cache.put('b', 'command', b'y' * 1000)
+
+    assert cache.get('a') is None
+    assert cache.get('b') == b'y' * 1000
+
+
+def test_upload_invalidates_cached_results(tmp_path, capsys):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    store.upsert(_rows([1.0, 2.0, 3.0]))
+    version = store.get_version()
+
+    first = FindTopKCarrier().run(store, cache=cache, k=1)
+    second = FindTopKCarrier().run(store, cache=cache, k=1)
+    store.upsert(_rows([10.0]))
+    third = FindTopKCarrier().run(store, cache=cache, k=1)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert store.get_version() == version + 1
+    assert third['Commission_Amount'].iloc[0] == 13.0
+    assert cache.stats()['hits'] == 1
+    assert capsys.readouterr().out.count('Top 1 carriers') == 3
+
+
+def test_stores_at_the_same_version_do_not_share_results(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    test_store = SQLiteStore(str(tmp_path / 'test.db'))
+    prod_store = SQLiteStore(str(tmp_path / 'prod.db'))
+    test_store.upsert(_rows([1.0, 2.0]))
+    prod_store.upsert(_rows([5.0, 7.0]))
+    assert test_store.get_version() == prod_store.get_version()
+
+    FindTopKCarrier(quiet=True).run(test_store, cache=cache, k=1)
+    result = FindTopKCarrier(quiet=True).run(prod_store, cache=cache, k=1)
+
+    assert result['Commission_Amount'].iloc[0] == 7.0
+    assert cache.stats()['hits'] == 0
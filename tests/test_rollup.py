@@ -0,0 +1,129 @@
+import pandas as pd
+import pytest
+
+from src.command import FindTopKCarrier, FindTopKPlan, FindTopKEarnerByCommissionPeriod, Rollup
+from src.rollup import ROLLUP_DIMENSIONS
+from tests.test_aggregation import _store
+
+
+def _cells(store):
+    return store.rollup.rollup(ROLLUP_DIMENSIONS)
+
+
+def _assert_cube_matches_the_rows(store):
+    maintained = _cells(store)
+    store.rollup.rebuild()
+    pd.testing.assert_frame_equal(maintained, _cells(store), check_index_type=False)
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+def test_cube_follows_uploads_deletes_and_rollbacks(tmp_path, backend):
+    store = _store(tmp_path, backend, n_rows=300)
+    assert store.rollup.is_current()
+    _assert_cube_matches_the_rows(store)
+    assert _cells(store)['Rows'].sum() == 300
+
+    # rows replaced on Primary_Key move their commissions to their new cells
+    changed = store.load(filters=[('Carrier_Name', '==', 'emblem')]).head(40)
+    changed['Commission_Amount'] += 1000
+    changed['Plan_Name'] = 'Plan moved'
+    store.upsert(changed)
+    _assert_cube_matches_the_rows(store)
+
+    store.delete_keys(list(changed['Primary_Key'][:15]))
+    _assert_cube_matches_the_rows(store)
+    assert _cells(store)['Rows'].sum() == 285
+
+    rows = store.load(filters=[('Carrier_Name', '==', 'centene')])
+    upload = store.ledger.ingest([rows.assign(Commission_Amount=rows['Commission_Amount'] * 2)], 'centene.xlsx')
+    _assert_cube_matches_the_rows(store)
+    before = store.rollup.rollup(['Carrier_Name'])
+    store.ledger.rollback(upload['upload_id'])
+    assert store.rollup.is_current()
+    after = store.rollup.rollup(['Carrier_Name'])
+    assert after.loc['centene', 'Commission_Amount'] == pytest.approx(before.loc['centene', 'Commission_Amount'] / 2)
+    _assert_cube_matches_the_rows(store)
+    store.close()
+
+
+def test_stale_cube_is_rebuilt_when_read(tmp_path, monkeypatch):
+    store = _store(tmp_path, 'sqlite')
+    expected = _cells(store)
+    with store.conn:
+        store.rollup.begin()  # a write interrupted after marking the cube stale
+    assert not store.rollup.is_current()
+    # the next write does not maintain a stale cube
+    applied = []
+    monkeypatch.setattr(type(store.rollup), 'apply', lambda self, *args, **kwargs: applied.append(args))
+    store.delete_keys(['no such key'])
+    assert not applied and not store.rollup.is_current()
+    monkeypatch.undo()
+
+    pd.testing.assert_frame_equal(_cells(store), expected, check_index_type=False)
+    assert store.rollup.is_current()
+    store.close()
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+def test_top_k_commands_answer_from_the_cube(tmp_path, backend, monkeypatch):
+    store = _store(tmp_path, backend)
+    loaded = store.load()
+    commands = [(FindTopKCarrier(quiet=True), {'k': 2}), (FindTopKPlan(quiet=True), {'k': 4}),
+                (FindTopKEarnerByCommissionPeriod(quiet=True), {'k': 5, 'from': '2024-02', 'to': '2024-04'})]
+    expected = [command.execute(loaded, **parameters) for command, parameters in commands]
+
+    def read(*args, **kwargs):
+        raise AssertionError('the rows of the store were read')
+    for method in ('load', 'iter_chunks', 'chunk_streams'):
+        monkeypatch.setattr(type(store), method, read)
+
+    for (command, parameters), result in zip(commands, expected):
+        pd.testing.assert_frame_equal(command.run(store, **parameters), result,
+                                      check_index_type=False, check_categorical=False)
+    store.close()
+
+
+def test_rollup_command_groups_and_filters_the_cube(tmp_path):
+    store = _store(tmp_path, 'sqlite')
+    loaded = store.load()
+    command = Rollup(quiet=True)
+
+    parameters = Rollup.get_parameters({'by': 'Carrier_Name, Commission_Month', 'earner': 'Earner 1,Earner 2',
+                                        'from': '2024-02', 'to': '2024-05'})
+    result = command.run(store, **parameters)
+    pd.testing.assert_frame_equal(result, command.execute(loaded, **parameters), check_index_type=False)
+    rows = loaded[loaded['Earner_Name'].isin(['Earner 1', 'Earner 2'])
+                  & loaded['Commission_Period'].between('2024-02-01', '2024-05-01')]
+    assert result['Commission_Amount'].sum() == pytest.approx(rows['Commission_Amount'].sum())
+    assert result['Rows'].sum() == len(rows)
+
+    # plans are missing on some rows, which are kept as their own group
+    top = command.run(store, **Rollup.get_parameters({'by': 'Plan_Name', 'k': 3}))
+    assert len(top) == 3 and top['Commission_Amount'].is_monotonic_decreasing
+    total = command.run(store, **Rollup.get_parameters({'rebuild': True}))
+    assert total.loc['Total', 'Commission_Amount'] == pytest.approx(loaded['Commission_Amount'].sum())
+
+    with pytest.raises(ValueError, match='Cannot group by'):
+        Rollup.get_parameters({'by': 'Member_ID'})
+    with pytest.raises(ValueError, match='from must not be after to'):
+        Rollup.get_parameters({'from': '2024-05', 'to': '2024-02'})
+    store.close()
+
+
+def test_loaded_rollup_reads_the_cube_from_worker_threads(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    import src.rollup
+    from src.command import run_command
+
+    store = _store(tmp_path, 'sqlite')
+    loaded = store.load()
+    args = [{'by': 'Carrier_Name'}, {'by': 'Plan_Name', 'k': 2}, {'by': 'Earner_Name', 'from': '2024-02'}]
+    expected = [Rollup(quiet=True).execute(loaded, **Rollup.get_parameters(arg)) for arg in args]
+    monkeypatch.setattr(src.rollup, 'summarize', lambda *args, **kwargs: pytest.fail('the loaded rows were summed'))
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lambda arg: run_command('rollup', arg, loaded, store), args * 4))
+
+    for result, expected_result in zip(results, expected * 4):
+        pd.testing.assert_frame_equal(result, expected_result, check_index_type=False)
+    store.close()
@@ -0,0 +1,89 @@
+import pandas as pd
+
+from src.schema_types import cast_to_schema_types, memory_report
+from src.store import SQLiteStore
+
+DATA_TYPES = {
+    'Carrier_Name': 'category',
+    'Member_ID': 'string[pyarrow]',
+    'Cycle_Year': 'Int16',
+    'Commission_Amount': 'float32',
+    'Commission_Period': 'datetime',
+}
+
+
+def _frame():
+    return pd.DataFrame({
+        'Primary_Key': ['a', 'b', 'c'],
+        'Carrier_Name': ['emblem', 'emblem', 'centene'],
+        'Member_ID': [95817026, 37760834, None],
+        'Cycle_Year': [5.0, None, 3.0],
+        'Commission_Amount': [116.67, -87.5, 10.0],
+        'Commission_Period': ['2024-06-01', None, '2024-05-31'],
+    })
+
+
+def test_cast_to_schema_types():
+    df = cast_to_schema_types(_frame(), DATA_TYPES)
+
+    assert isinstance(df['Carrier_Name'].dtype, pd.CategoricalDtype)
+    assert str(df['Member_ID'].dtype) == 'string'
+    assert df['Member_ID'].isna().tolist() == [False, False, True]
+    assert str(df['Cycle_Year'].dtype) == 'Int16'
+    assert str(df['Commission_Amount'].dtype) == 'float32'
+    assert pd.api.types.is_datetime64_any_dtype(df['Commission_Period'])
+
+
+def test_categorical_carriers_list_like_object_carriers(capsys):
+    from src.command import ListAllCarriersCommand
+
+    carriers = ListAllCarriersCommand().execute(cast_to_schema_types(_frame(), DATA_TYPES))
+
+    assert carriers.tolist() == ['emblem', 'centene']
+    assert 'Categories' not in capsys.readouterr().out
+
+
+def test_cast_keeps_columns_that_cannot_be_converted():
+    df = pd.DataFrame({'Cycle_Year': [1, 'Pending']})
+
+    assert cast_to_schema_types(df, {'Cycle_Year': 'Int16'})['Cycle_Year'].tolist() == [1, 'Pending']
+
+
+def test_types_survive_the_store_round_trip(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.schema_config['fixed_schema_data_types'] = DATA_TYPES
+    store.upsert(cast_to_schema_types(_frame(), DATA_TYPES))
+
+    loaded = store.load()
+
+    for column, expected_type in DATA_TYPES.items():
+        if expected_type != 'datetime':
+            assert str(loaded[column].dtype) == str(pd.api.types.pandas_dtype(expected_type)), column
+    assert pd.api.types.is_datetime64_any_dtype(loaded['Commission_Period'])
+
+
+def test_memory_report():
+    df = _frame()
+    df['Carrier_Name'] = pd.Series(['emblem'] * 3).astype('category')
+
+    report = memory_report(df)
+
+    assert report.loc['Carrier_Name', 'after_bytes'] < report.loc['Carrier_Name', 'before_bytes']
+    assert report.loc['Total', 'after_bytes'] == report['after_bytes'].iloc[:-1].sum()
+    assert report.loc['Total', 'after_bytes_per_row'] == round(report.loc['Total', 'after_bytes'] / 3, 1)
+
+
+def test_blank_text_ids_are_stored_as_null(tmp_path):
+    df = pd.DataFrame({'Primary_Key': ['a', 'b', 'c'], 'Agent_ID': ['1001', None, float('nan')],
+                       'Earner_ID': ['E1', pd.NA, 'None']})
+    df = cast_to_schema_types(df, {'Agent_ID': 'str', 'Earner_ID': 'str'})
+    assert df['Agent_ID'].tolist() == ['1001', None, None]
+    assert df['Earner_ID'].tolist() == ['E1', None, 'None']
+
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(df)
+
+    result = store.query('SELECT COUNT(*) AS missing, COUNT(Agent_ID) AS agents, COUNT(Earner_ID) AS earners '
+                         'FROM df WHERE Agent_ID IS NULL')
+    assert result.values.tolist() == [[2, 0, 1]]
+    assert store.load()['Agent_ID'].isna().tolist() == [False, True, True]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pandas as pd
+
+from src.server import QueryServer
+from src.store import SQLiteStore
+
+
+def _rows(keys, amounts, carriers):
+    return pd.DataFrame({
+        'Primary_Key': keys,
+        'Earner_Name': [f'Earner {key}' for key in keys],
+        'Commission_Amount': amounts,
+        'Commission_Period': pd.to_datetime(['2024-06-01'] * len(keys)),
+        'Carrier_Name': carriers,
+    })
+
+
+async def _ask(socket_path, *requests):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    responses = []
+    for request in requests:
+        writer.write((request if isinstance(request, str) else json.dumps(request)).encode() + b'\n')
+        await writer.drain()
+        responses.append(json.loads(await reader.readline()))
+    writer.close()
+    return responses
+
+
+def test_server_answers_concurrent_clients_and_reloads(tmp_path):
+    db_path = str(tmp_path / 'normalized.db')
+    socket_path = str(tmp_path / 'query.sock')
+    store = SQLiteStore(db_path)
+    store.upsert(_rows(['a', 'b', 'c'], [1.0, 2.0, 3.0], ['emblem', 'centene', 'emblem']))
+    top_carrier = {'command': 'find_top_k_carrier', 'args': {'k': 1}}
+
+    async def scenario():
+        server = QueryServer(SQLiteStore(db_path))
+        async with await server.start(socket_path=socket_path):
+            clients = await asyncio.gather(*(_ask(socket_path, top_carrier, {'command': 'list_carriers'})
+                                             for _ in range(8)))
+            # another process uploads while the server is running
+            store.upsert(_rows(['b', 'd'], [10.0, 1.0], ['centene', 'healthfirst']))
+            after_upload = await _ask(socket_path, top_carrier, 'not json', {'command': 'missing'})
+            return clients, after_upload, server
+
+    clients, after_upload, server = asyncio.run(scenario())
+
+    for carrier_response, list_response in clients:
+        assert carrier_response == {'ok': True, 'version': 1,
+                                    'result': {'columns': ['Commission_Amount'], 'index': ['emblem'],
+                                               'data': [[4.0]]}}
+        assert sorted(list_response['result']) == ['centene', 'emblem']
+    assert after_upload[0]['version'] == 2
+    assert after_upload[0]['result']['index'] == ['centene']
+    assert after_upload[0]['result']['data'] == [[10.0]]
+    assert not after_upload[1]['ok'] and not after_upload[2]['ok']
+    assert len(server.dataframe) == 4
+    assert isinstance(server.dataframe['Carrier_Name'].dtype, pd.CategoricalDtype)
+
+
+def test_refresh_only_loads_changed_rows(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_rows(['a', 'b'], [1.0, 2.0], ['emblem', 'emblem']))
+    server = QueryServer(store)
+    server.load()
+    store.upsert(_rows(['b'], [5.0], ['emblem']))
+    load = store.load
+    load_filters = []
+    monkeypatch.setattr(store, 'load', lambda columns=None, filters=None: load_filters.append(filters)
+                        or load(columns, filters))
+
+    assert server.refresh()
+
+    assert load_filters == [[('_version', '>', 1)]]
+    assert server.dataframe.set_index('Primary_Key')['Commission_Amount'].to_dict() == {'a': 1.0, 'b': 5.0}
+    assert not server.refresh()
+
+
+def test_clients_are_answered_during_a_reload(tmp_path, monkeypatch):
+    import threading
+
+    db_path = str(tmp_path / 'normalized.db')
+    socket_path = str(tmp_path / 'query.sock')
+    store = SQLiteStore(db_path)
+    store.upsert(_rows(['a', 'b'], [1.0, 2.0], ['emblem', 'centene']))
+    top_carrier = {'command': 'find_top_k_carrier', 'args': {'k': 1}}
+    reloading, release = threading.Event(), threading.Event()
+
+    async def scenario():
+        server = QueryServer(SQLiteStore(db_path))
+        refresh = server.refresh
+
+        def slow_refresh():
+            reloading.set()
+            release.wait(10)
+            return refresh()
+        monkeypatch.setattr(server, 'refresh', slow_refresh)
+        async with await server.start(socket_path=socket_path):
+            store.upsert(_rows(['a'], [10.0], ['emblem']))
+            reloader = asyncio.create_task(_ask(socket_path, top_carrier))
+            await asyncio.get_running_loop().run_in_executor(None, reloading.wait, 10)
+            during = await asyncio.wait_for(_ask(socket_path, top_carrier), 10)
+            release.set()
+            return during, await reloader
+
+    during, after = asyncio.run(scenario())
+
+    assert during[0]['version'] == 1 and during[0]['result']['index'] == ['centene']
+    assert after[0]['version'] == 2 and after[0]['result']['index'] == ['emblem']
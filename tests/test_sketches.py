@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.command import CountDistinctMembers, FindHeavyHitters
+from src.sketches import CountMinSketch, HeavyHitters, HyperLogLog, build_sketches, distinct_members, top_hitters
+from src.store import SQLiteStore
+
+
+def _rows(n_rows=600, start=0, amount=1.0):
+    keys = range(start, start + n_rows)
+    return pd.DataFrame({
+        'Primary_Key': [f'key {i}' for i in keys],
+        'Earner_Name': [f'Earner {i % 7 if i % 3 else 0}' for i in keys],
+        'Agent_ID': [str(1000 + i % 5) for i in keys],
+        'Member_ID': [f'M{i % 250}' if i % 17 else None for i in keys],
+        'Commission_Amount': [amount * (1 + i % 4) for i in keys],
+        'Commission_Period': pd.to_datetime(['2024-06-01'] * n_rows),
+        'Carrier_Name': [('emblem', 'centene')[i % 2] for i in keys],
+        'Plan_Name': [f'Plan {i % 3}' for i in keys],
+    })
+
+
+def _open(tmp_path, backend):
+    if backend == 'parquet':
+        pytest.importorskip('pyarrow')
+        from src.parquet_store import ParquetStore
+        return ParquetStore(str(tmp_path / 'parquet'))
+    return SQLiteStore(str(tmp_path / 'normalized.db'))
+
+
+def _rebuilt(store):
+    return build_sketches([store.load()], **store.sketches.options)
+
+
+def test_hyperloglog_estimates_and_merges_distinct_counts():
+    first, second = HyperLogLog(12), HyperLogLog(12)
+    first.add([f'member {i}' for i in range(60_000)])
+    second.add([f'member {i}' for i in range(40_000, 100_000)] + [None])
+    assert first.count() == pytest.approx(60_000, rel=4 * first.relative_error)
+
+    restored = HyperLogLog.from_bytes(first.to_bytes(), 12)
+    assert restored.merge(second).count() == pytest.approx(100_000, rel=4 * first.relative_error)
+    small = HyperLogLog(12)
+    small.add(['a', 'b', 'b', 'c', 3, '3'])
+    assert round(small.count()) == 4
+    with pytest.raises(ValueError):
+        first.merge(HyperLogLog(10))
+
+
+def test_heavy_hitters_find_the_largest_sums_and_forget_subtracted_weights():
+    rng = np.random.default_rng(3)
+    names = pd.Series([f'earner {value % 3000}' for value in rng.zipf(1.3, 100_000)])
+    weights = pd.Series(rng.random(100_000) * 50)
+    heavy_hitters = HeavyHitters(CountMinSketch.from_error(0.001, 0.01), capacity=50)
+    for start in range(0, len(names), 20_000):
+        heavy_hitters.add(names[start:start + 20_000], weights[start:start + 20_000])
+
+    exact = weights.groupby(names).sum().nlargest(5)
+    top = heavy_hitters.top(5)
+    assert [value for value, _ in top] == list(exact.index)
+    for (_, estimate), total in zip(top, exact):
+        assert total <= estimate + 1e-6 <= total + heavy_hitters.error + 1e-6
+
+    leader = exact.index[0]
+    heavy_hitters.add(names[names == leader], weights[names == leader], sign=-1)
+    assert leader not in [value for value, _ in heavy_hitters.top(50)]
+
+
+def test_heavy_hitters_skip_missing_keys_and_bound_chargebacks():
+    rng = np.random.default_rng(5)
+    names = pd.Series([f'agent {value % 500}' for value in rng.zipf(1.5, 20_000)], dtype=object)
+    names[:3000] = [None, np.nan, pd.NA] * 1000
+    # an agent whose ID reads like a missing value is still an agent
+    names[3000:6000] = 'None'
+    weights = pd.Series(rng.normal(20, 40, 20_000))
+    heavy_hitters = HeavyHitters(CountMinSketch.from_error(0.001, 0.01), capacity=50)
+    heavy_hitters.add(names, weights)
+
+    top = heavy_hitters.top(10)
+    exact = weights[3000:].groupby(names[3000:]).sum()
+    assert 'None' in exact.nlargest(3).index
+    assert 'None' in [value for value, _ in top]
+    assert heavy_hitters.under_error > 0
+    for value, estimate in top:
+        assert exact[value] - heavy_hitters.under_error - 1e-6 <= estimate <= exact[value] + heavy_hitters.error + 1e-6
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+def test_uploads_maintain_the_sketches(tmp_path, backend):
+    store = _open(tmp_path, backend)
+    store.upsert(_rows())
+    store.upsert(_rows(300, start=600))
+    sketches = store.sketches
+    assert all(sketches.is_current(kind) for kind in sketches.KINDS)
+
+    expected = _rebuilt(store)
+    for by in ([], ['Carrier_Name'], ['Carrier_Name', 'Plan_Name']):
+        pd.testing.assert_frame_equal(distinct_members(sketches.load('Member_ID'), by),
+                                      distinct_members(expected['Member_ID'], by))
+    for column in ('Earner_Name', 'Agent_ID'):
+        pd.testing.assert_frame_equal(top_hitters(sketches.load(column), column, 3),
+                                      top_hitters(expected[column], column, 3))
+
+    # corrected commissions of the same members keep the distinct counts current
+    corrected = _rows(100, amount=3.0)
+    store.upsert(corrected)
+    assert all(sketches.is_current(kind) for kind in sketches.KINDS)
+    pd.testing.assert_frame_equal(top_hitters(sketches.load('Agent_ID'), 'Agent_ID', 5),
+                                  top_hitters(_rebuilt(store)['Agent_ID'], 'Agent_ID', 5))
+    store.close()
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+def test_removing_members_leaves_the_distinct_counts_stale(tmp_path, backend):
+    store = _open(tmp_path, backend)
+    store.upsert(_rows())
+    upload = store.ledger.ingest([_rows(400, start=1000)], 'july.xlsx')
+    sketches = store.sketches
+
+    store.ledger.rollback(upload['upload_id'])
+    assert not sketches.is_current('Member_ID')
+    assert sketches.is_current('Earner_Name') and sketches.is_current('Agent_ID')
+    pd.testing.assert_frame_equal(top_hitters(sketches.load('Earner_Name'), 'Earner_Name', 4),
+                                  top_hitters(_rebuilt(store)['Earner_Name'], 'Earner_Name', 4))
+
+    # the stale sketches are rebuilt when read
+    counts = distinct_members(sketches.load('Member_ID'), ['Carrier_Name'])
+    assert sketches.is_current('Member_ID')
+    pd.testing.assert_frame_equal(counts, distinct_members(_rebuilt(store)['Member_ID'], ['Carrier_Name']))
+    store.close()
+
+
+def test_sketch_commands_match_the_loaded_data(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_rows())
+    loaded = store.load()
+
+    def read(*args, **kwargs):
+        raise AssertionError('the rows of the store were read')
+    for method in ('load', 'iter_chunks'):
+        setattr(store, method, read)
+
+    command = CountDistinctMembers(quiet=True)
+    parameters = CountDistinctMembers.get_parameters({'by': 'Plan_Name', 'carrier': 'emblem'})
+    result = command.run(store, **parameters)
+    pd.testing.assert_frame_equal(result, command.execute(loaded, **parameters))
+    exact = loaded[loaded['Carrier_Name'] == 'emblem'].groupby('Plan_Name', observed=True)['Member_ID'].nunique()
+    assert (result['Distinct_Members'] - exact).abs().max() <= 0.05 * exact.max()
+
+    command = FindHeavyHitters(quiet=True)
+    parameters = FindHeavyHitters.get_parameters({'k': 2, 'column': 'Earner_Name'})
+    result = command.run(store, **parameters)
+    pd.testing.assert_frame_equal(result, command.execute(loaded, **parameters))
+    assert list(result.index) == list(loaded.groupby('Earner_Name', observed=True)['Commission_Amount'].sum()
+                                      .nlargest(2).index)
+
+    with pytest.raises(ValueError, match='Cannot count distinct members'):
+        CountDistinctMembers.get_parameters({'by': 'Earner_Name'})
+    with pytest.raises(ValueError, match='No heavy-hitter sketch'):
+        FindHeavyHitters.get_parameters({'k': 2, 'column': 'Member_ID'})
+    store.close()
+
+
+def test_loaded_sketch_commands_read_the_store_sketches_from_worker_threads(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    import src.sketches
+    from src.command import run_command
+
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_rows())
+    loaded = store.load()
+    requests = [('distinct_members', {'by': 'Carrier_Name'}), ('heavy_hitters', {'k': 3, 'column': 'Agent_ID'})]
+    expected = [run_command(name, args, loaded) for name, args in requests]
+    monkeypatch.setattr(src.sketches, 'build_sketches',
+                        lambda *args, **kwargs: pytest.fail('the loaded rows were sketched'))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda request: run_command(*request, loaded, store), requests * 4))
+
+    for result, expected_result in zip(results, expected * 4):
+        pd.testing.assert_frame_equal(result, expected_result)
+    store.close()
@@ -0,0 +1,41 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('pandas', 'numpy', 'pandasql', 'openpyxl', 'pyarrow', 'yaml')
+# cold start of 'main.py --help'; importing pandas alone takes several times this long
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 0.5))
+
+_IMPORTED_MODULES_SCRIPT = f"""
+import runpy, sys
+sys.argv = ['main.py', '--help']
+try:
+    runpy.run_path('main.py', run_name='__main__')
+except SystemExit:
+    pass
+print(sorted(module for module in {HEAVY_MODULES!r} if module in sys.modules))
+"""
+
+
+def test_help_does_not_import_heavy_modules():
+    output = subprocess.run([sys.executable, '-c', _IMPORTED_MODULES_SCRIPT], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert output.strip().splitlines()[-1] == '[]'
+
+
+@pytest.mark.skipif(os.environ.get('SKIP_STARTUP_BENCHMARK'), reason='startup benchmark disabled')
+def test_cold_start_time():
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'main.py', '--help'], cwd=ROOT, capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+
+    assert statistics.median(timings) < STARTUP_BUDGET_SECONDS, \
+        f"cold start took {statistics.median(timings):.3f}s, budget is {STARTUP_BUDGET_SECONDS}s"
@@ -0,0 +1,157 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.command import FindTopKEarnerByCommissionPeriod, SqlQuery
+from src.store import SQLiteStore
+
+
+def _normalized_rows(keys, amounts, periods=None, carriers=None):
+    return pd.DataFrame({
+        'Primary_Key': keys,
+        'Earner_Name': [f'Earner {key}' for key in keys],
+        'Commission_Amount': amounts,
+        'Commission_Period': pd.to_datetime(periods or ['2024-06-01'] * len(keys)),
+        'Carrier_Name': carriers or ['emblem'] * len(keys),
+    })
+
+
+def _multi_partition_rows():
+    return _normalized_rows(['a', 'b', 'c', 'd'], [1.0, 2.0, 3.0, 4.0],
+                            periods=['2024-05-01', '2024-06-01', '2024-06-15', '2024-06-01'],
+                            carriers=['emblem', 'emblem', 'emblem', 'centene'])
+
+
+def test_upsert_and_load(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'), batch_size=2)
+    assert store.count() == 0
+
+    rows = store.upsert(_normalized_rows(['a', 'b', 'c'], [1.0, 2.0, 3.0]))
+    assert rows == 3
+
+    loaded = store.load()
+    assert store.count() == 3
+    assert list(loaded['Primary_Key']) == ['a', 'b', 'c']
+    assert pd.api.types.is_datetime64_any_dtype(loaded['Commission_Period'])
+    assert loaded['Commission_Amount'].sum() == 6.0
+
+
+def test_upsert_keeps_last_row_per_primary_key(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_normalized_rows(['a', 'b'], [1.0, 2.0]))
+    store.upsert_chunks([_normalized_rows(['b', 'c'], [20.0, 3.0]), _normalized_rows(['c'], [30.0])])
+
+    loaded = store.load().set_index('Primary_Key')
+    assert store.count() == 3
+    assert loaded.loc['b', 'Commission_Amount'] == 20.0
+    assert loaded.loc['c', 'Commission_Amount'] == 30.0
+
+
+def test_wal_mode_and_unique_index(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_normalized_rows(['a'], [1.0]))
+
+    assert store.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    indexes = store.conn.execute(f'PRAGMA index_list("{SQLiteStore.TABLE_NAME}")').fetchall()
+    assert any(index[2] == 1 for index in indexes)
+    plan = store.conn.execute(f'EXPLAIN QUERY PLAN SELECT * FROM "{SQLiteStore.TABLE_NAME}" '
+                              f'WHERE "Commission_Month" >= 202401 AND "Commission_Month" <= 202406').fetchall()
+    assert 'idx_normalized_data_commission_month' in plan[0][-1]
+
+
+def test_import_csv(tmp_path):
+    csv_path = tmp_path / 'normalized.csv'
+    _normalized_rows(['a', 'b'], [1.0, 2.0]).to_csv(csv_path, index=False)
+
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    assert store.import_csv(str(csv_path)) == 2
+    assert pd.api.types.is_datetime64_any_dtype(store.load()['Commission_Period'])
+
+
+def test_sqlite_load_pushes_down_columns_and_filters(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_multi_partition_rows())
+
+    loaded = store.load(columns=['Primary_Key', 'Commission_Amount'],
+                        filters=[('Carrier_Name', '==', 'emblem'), ('Commission_Month', '==', 202406)])
+
+    assert list(loaded.columns) == ['Primary_Key', 'Commission_Amount']
+    assert sorted(loaded['Primary_Key']) == ['b', 'c']
+
+
+def test_parquet_store_partitions_and_pushdown(tmp_path):
+    pytest.importorskip('pyarrow')
+    from src.parquet_store import ParquetStore
+
+    root = str(tmp_path / 'parquet')
+    store = ParquetStore(root)
+    store.upsert(_multi_partition_rows())
+    store.upsert(_normalized_rows(['b'], [20.0]))
+
+    assert store.count() == 4
+    assert store.get_version() == 2
+    assert os.path.exists(os.path.join(root, 'Carrier_Name=emblem', 'Commission_Month=202406', 'data.parquet'))
+    assert os.path.exists(os.path.join(root, 'Carrier_Name=centene', 'Commission_Month=202406', 'data.parquet'))
+
+    loaded = store.load(columns=['Primary_Key', 'Commission_Amount'],
+                        filters=[('Carrier_Name', '==', 'emblem'), ('Commission_Month', '==', 202406)])
+    assert list(loaded.columns) == ['Primary_Key', 'Commission_Amount']
+    assert loaded.set_index('Primary_Key')['Commission_Amount'].to_dict() == {'b': 20.0, 'c': 3.0}
+
+
+def test_command_run_reads_only_its_slice(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_multi_partition_rows())
+    command = FindTopKEarnerByCommissionPeriod()
+    parameters = {'k': 5, 'period': '2024-06'}
+
+    assert command.get_filters(parameters) == [('Commission_Month', '==', 202406)]
+    top_earners = command.run(store, **parameters)
+    assert list(top_earners.index) == ['Earner d', 'Earner c', 'Earner b']
+
+
+def test_command_run_with_a_period_range(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_multi_partition_rows())
+    command = FindTopKEarnerByCommissionPeriod()
+    parameters = command.get_parameters({'k': 5, 'period': None, 'from': '2024-05', 'to': '2024-06'})
+
+    assert command.get_filters(parameters) == [('Commission_Month', '>=', 202405), ('Commission_Month', '<=', 202406)]
+    top_earners = command.run(store, **parameters)
+    assert list(top_earners.index) == ['Earner d', 'Earner c', 'Earner b', 'Earner a']
+
+
+def test_sql_query_runs_on_the_database(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+    store.upsert(_multi_partition_rows())
+    monkeypatch.setattr(store, 'load', lambda *args, **kwargs: pytest.fail('sql_query must not load the data'))
+
+    result = SqlQuery().run(store, query='SELECT Carrier_Name, SUM(Commission_Amount) AS total FROM df '
+                                         'GROUP BY Carrier_Name ORDER BY total DESC')
+
+    assert result.values.tolist() == [['emblem', 6.0], ['centene', 4.0]]
+    with pytest.raises(Exception):
+        store.query('DELETE FROM normalized_data')
+    assert store.count() == 4
+
+    # columns added by later uploads show up in the view of the open query connection
+    monkeypatch.undo()
+    store.upsert(_normalized_rows(['e'], [5.0]).assign(Source_Sheet='June'))
+    result = store.query("SELECT Primary_Key FROM df WHERE Source_Sheet = 'June'")
+    assert result['Primary_Key'].tolist() == ['e']
+    with pytest.raises(Exception):
+        store.query('DELETE FROM normalized_data')
+
+
+def test_parquet_store_sql_query(tmp_path):
+    pytest.importorskip('pyarrow')
+    pytest.importorskip('pandasql')
+    from src.parquet_store import ParquetStore
+
+    store = ParquetStore(str(tmp_path / 'parquet'))
+    store.upsert(_multi_partition_rows())
+
+    result = SqlQuery().run(store, query="SELECT COUNT(*) AS n FROM df WHERE Carrier_Name = 'emblem'")
+
+    assert result['n'].tolist() == [3]
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from src import tracing
+from src.pipeline import normalize_file_chunks
+from src.store import SQLiteStore
+from tests.test_excel_reader import write_synthetic_workbook
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.enable()
+    yield tracer
+    tracing.disable()
+
+
+def test_spans_are_free_when_disabled():
+    assert not tracing.enabled()
+    with tracing.span('stage', rows=3) as span:
+        span.set(rows=4)
+    assert list(tracing.traced_iter('read', [1, 2])) == [1, 2]
+
+
+def test_nested_spans(tracer, tmp_path):
+    with tracing.span('upload') as upload:
+        with tracing.span('read', rows=10):
+            buffer = bytearray(32 * 2 ** 20)
+        upload.set(rows=10)
+        del buffer
+    with pytest.raises(ValueError):
+        with tracing.span('execute'):
+            raise ValueError('bad')
+
+    events = {event['name']: event for event in tracer.events}
+    assert events['read']['parent'] == 'upload' and events['read']['depth'] == 1
+    assert events['upload']['rows'] == 10
+    assert events['execute']['error'] == 'ValueError: bad'
+    for event in tracer.events:
+        assert event['wall_seconds'] >= 0 and event['cpu_seconds'] >= 0
+    if tracer.trace_memory:
+        assert events['read']['peak_memory_bytes'] >= 16 * 2 ** 20
+        assert events['upload']['peak_memory_bytes'] >= events['read']['peak_memory_bytes']
+
+    jsonl_path, chrome_path = tracer.write(str(tmp_path / 'traces' / 'run'))
+    lines = [json.loads(line) for line in open(jsonl_path)]
+    assert [line['name'] for line in lines] == ['upload', 'read', 'execute']
+    chrome = json.load(open(chrome_path))
+    assert {event['ph'] for event in chrome['traceEvents']} == {'X'}
+    assert tracer.summary()['read']['rows'] == 10
+
+
+def test_traced_upload_records_each_stage(tracer, tmp_path):
+    file_path = str(tmp_path / 'healthfirst.xlsx')
+    write_synthetic_workbook(file_path, 25)
+    config_path = tmp_path / 'healthfirst.yaml'
+    config_path.write_text(open('yaml/healthfirst_config.yaml').read())
+    store = SQLiteStore(str(tmp_path / 'normalized.db'))
+
+    store.upsert_chunks(normalize_file_chunks(file_path, str(config_path), chunk_size=10, display=False))
+
+    summary = tracer.summary()
+    for stage in ('read', 'normalize', 'normalize.convert_to_datetime', 'normalize.apply_config',
+                  'normalize.match_earner_type', 'normalize.align_data_types', 'store.write'):
+        assert summary[stage]['rows'] == 25, stage
+    assert summary['store.write']['count'] == 3
+
+
+def test_run_traced_returns_the_worker_spans():
+    def work(value):
+        with tracing.span('work', rows=value):
+            return value * 2
+
+    result, events = tracing.run_traced(work, 3)
+
+    assert result == 6
+    assert [(event['name'], event['rows']) for event in events] == [('work', 3)]
+    assert not tracing.enabled()